@@ -0,0 +1,47 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:34
+
+from django.db import migrations, models
+
+from inventario.db import RunSQLSegunMotor
+from inventario.text import normalizar
+
+
+def poblar_busqueda(apps, schema_editor):
+    Cliente = apps.get_model('clientes', 'Cliente')
+    lote = []
+    for cliente in Cliente.objects.only('pk', 'nombre', 'apellido', 'documento').iterator(chunk_size=2000):
+        cliente.busqueda = normalizar(f"{cliente.apellido} {cliente.nombre} {cliente.documento}")
+        lote.append(cliente)
+        if len(lote) == 2000:
+            Cliente.objects.bulk_update(lote, ['busqueda'])
+            lote = []
+    Cliente.objects.bulk_update(lote, ['busqueda'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='busqueda',
+            field=models.CharField(default='', editable=False, max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['documento'], name='cliente_documento_prefijo', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(poblar_busqueda, migrations.RunPython.noop),
+        # LIKE '%texto%' sobre la columna normalizada, indexado con trigramas
+        RunSQLSegunMotor(
+            'postgresql',
+            sql=[
+                "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+                "CREATE INDEX cliente_busqueda_trgm ON clientes_cliente USING gin (busqueda gin_trgm_ops)",
+            ],
+            reverse_sql=["DROP INDEX IF EXISTS cliente_busqueda_trgm"],
+        ),
+    ]
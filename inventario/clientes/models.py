@@ -1,5 +1,7 @@
 from django.db import models
 
+from inventario.text import normalizar
+
 class Cliente(models.Model):
     nombre = models.CharField(max_length=50)
     apellido = models.CharField(max_length=50)
@@ -7,11 +9,26 @@ class Cliente(models.Model):
     email = models.EmailField(blank=True, null=True)
     telefono = models.CharField(max_length=30, blank=True, null=True)
     direccion = models.CharField(max_length=200, blank=True, null=True)
+    # "apellido nombre documento" normalizado (ver clientes.search); se
+    # recalcula en save()
+    busqueda = models.CharField(max_length=200, editable=False, default='')
 
     class Meta:
         verbose_name = 'Cliente'
         verbose_name_plural = 'Clientes'
         ordering = ['apellido', 'nombre']
+        indexes = [
+            # Búsqueda por prefijo de documento (LIKE 'abc%'). En PostgreSQL
+            # el índice único no sirve para LIKE salvo con collation "C".
+            models.Index(fields=['documento'], name='cliente_documento_prefijo', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return f"{self.apellido}, {self.nombre} ({self.documento})"
+
+    def save(self, *args, **kwargs):
+        self.busqueda = normalizar(f"{self.apellido} {self.nombre} {self.documento}")
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'nombre', 'apellido', 'documento'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'busqueda'}
+        super().save(*args, **kwargs)
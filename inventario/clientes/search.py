@@ -0,0 +1,35 @@
+"""Búsqueda de clientes sobre la columna normalizada ``Cliente.busqueda``.
+
+Cada palabra buscada debe aparecer en ``busqueda`` (``LIKE '%palabra%'``,
+índice trigram en PostgreSQL) o el texto debe ser prefijo del documento
+(``LIKE 'texto%'``, índice ``cliente_documento_prefijo``). Como la columna ya
+está en minúsculas y sin acentos, "jose" encuentra a "José".
+"""
+from django.db.models import Case, Q, Value, When
+
+from inventario.text import normalizar
+
+# Documento exacto, luego coincidencias al comienzo, luego alfabético
+ORDEN_BUSQUEDA = ('prioridad', 'apellido', 'nombre', 'id')
+
+
+def buscar_clientes(queryset, q):
+    """Filtra ``queryset`` por ``q`` y anota ``prioridad`` (0 = documento exacto).
+
+    Ordenar el resultado por ``ORDEN_BUSQUEDA``.
+    """
+    q = q.strip()
+    termino = normalizar(q)
+    if not termino:
+        return queryset.annotate(prioridad=Value(2))
+
+    por_nombre = Q()
+    for palabra in termino.split():
+        por_nombre &= Q(busqueda__contains=palabra)
+    return queryset.filter(Q(documento__startswith=q) | por_nombre).annotate(
+        prioridad=Case(
+            When(documento=q, then=Value(0)),
+            When(busqueda__startswith=termino, then=Value(1)),
+            default=Value(2),
+        )
+    )
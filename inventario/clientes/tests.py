@@ -0,0 +1,37 @@
+from django.contrib.auth.models import Permission, User
+from django.test import TestCase
+from django.urls import reverse
+
+from .models import Cliente
+
+
+class BusquedaClientesTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='view_cliente'))
+        self.client.force_login(user)
+        self.jose = Cliente.objects.create(nombre='José', apellido='Núñez', documento='30111222')
+        self.ana = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='30999888')
+        self.otra = Cliente.objects.create(nombre='Ana', apellido='Gómez', documento='27000111')
+
+    def test_columna_normalizada_se_actualiza(self):
+        self.assertEqual(self.jose.busqueda, 'nunez jose 30111222')
+        self.jose.apellido = 'Ibáñez'
+        self.jose.save(update_fields=['apellido'])
+        self.assertEqual(Cliente.objects.get(pk=self.jose.pk).busqueda, 'ibanez jose 30111222')
+
+    def test_lista_sin_acentos_y_por_prefijo_de_documento(self):
+        url = reverse('clientes:cliente_list')
+        response = self.client.get(url, {'q': 'jose nunez'})
+        self.assertEqual([c.pk for c in response.context['clientes']], [self.jose.pk])
+        response = self.client.get(url, {'q': '30'})
+        self.assertEqual([c.pk for c in response.context['clientes']], [self.jose.pk, self.ana.pk])
+
+    def test_autocompletado_con_limite_y_cursor(self):
+        url = reverse('clientes:cliente_buscar')
+        data = self.client.get(url, {'q': 'ana', 'limite': 1}).json()
+        self.assertEqual([r['id'] for r in data['results']], [self.otra.pk])
+        self.assertEqual(data['results'][0]['text'], str(self.otra))
+        data = self.client.get(url, {'q': 'ana', 'limite': 1, 'cursor': data['next']}).json()
+        self.assertEqual([r['id'] for r in data['results']], [self.ana.pk])
+        self.assertIsNone(data['next'])
@@ -5,6 +5,7 @@ app_name = 'clientes'
 
 urlpatterns = [
     path('', views.ClienteListView.as_view(), name='cliente_list'),
+    path('buscar/', views.ClienteBuscarView.as_view(), name='cliente_buscar'),
     path('nuevo/', views.ClienteCreateView.as_view(), name='cliente_create'),
     path('<int:pk>/', views.ClienteDetailView.as_view(), name='cliente_detail'),
     path('<int:pk>/editar/', views.ClienteUpdateView.as_view(), name='cliente_update'),
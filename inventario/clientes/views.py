@@ -1,35 +1,69 @@
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from inventario.mixins import FriendlyPermissionRequiredMixin
+from inventario.pagination import KeysetPaginationMixin
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.db.models import Q
+from django.http import JsonResponse
 from .models import Cliente
 from .forms import ClienteForm
+from .search import ORDEN_BUSQUEDA, buscar_clientes
 
-class ClienteListView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, ListView):
+class ClienteListView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, KeysetPaginationMixin, ListView):
     permission_required = 'clientes.view_cliente'
     model = Cliente
     template_name = 'clientes/cliente_list.html'
     context_object_name = 'clientes'
     paginate_by = 5
+    keyset_ordering = ('apellido', 'nombre', 'id')
 
     def get_queryset(self):
         qs = super().get_queryset()
-        q = self.request.GET.get('q')
+        q = self.request.GET.get('q', '').strip()
         if q:
-            qs = qs.filter(Q(nombre__icontains=q) | Q(apellido__icontains=q) | Q(documento__icontains=q))
+            qs = buscar_clientes(qs, q)
         return qs
 
+    def get_keyset_ordering(self):
+        if self.request.GET.get('q', '').strip():
+            return ORDEN_BUSQUEDA
+        return super().get_keyset_ordering()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        params = self.request.GET.copy()
-        if 'page' in params:
-            params.pop('page')
-        context['querystring'] = params.urlencode()
         context['q'] = self.request.GET.get('q', '')
         return context
 
+class ClienteBuscarView(ClienteListView):
+    """Autocompletado de clientes en JSON.
+
+    GET ``q`` (nombre, apellido o documento), ``limite`` (por defecto 10, máximo 50)
+    y ``cursor`` para pedir la página siguiente. Responde
+    ``{"results": [{"id", "text", "documento"}], "next": cursor | null}``.
+    """
+    paginate_by = 10
+    limite_maximo = 50
+
+    def get_queryset(self):
+        return super().get_queryset().only('pk', 'nombre', 'apellido', 'documento')
+
+    def get_paginate_by(self, queryset):
+        try:
+            limite = int(self.request.GET.get('limite', self.paginate_by))
+        except ValueError:
+            limite = self.paginate_by
+        return max(1, min(limite, self.limite_maximo))
+
+    def render_to_response(self, context, **response_kwargs):
+        page = context['page_obj']
+        return JsonResponse({
+            'results': [
+                {'id': c.pk, 'text': str(c), 'documento': c.documento}
+                for c in page
+            ],
+            'next': page.next_cursor,
+        })
+
 class ClienteDetailView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, DetailView):
     permission_required = 'clientes.view_cliente'
     model = Cliente
@@ -0,0 +1,27 @@
+"""Configuración de gunicorn (se lee sola desde el directorio de trabajo).
+
+Prepara el directorio compartido de métricas de ``prometheus_client`` para
+que ``/metrics`` sume los valores de todos los workers (ver
+``inventario.metricas``).
+"""
+import os
+import shutil
+
+# Debe estar definida antes de que los workers importen prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/inventario-metricas')
+
+
+def on_starting(server):
+    # Los archivos de una ejecución anterior darían contadores inflados
+    directorio = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directorio, ignore_errors=True)
+    os.makedirs(directorio, exist_ok=True)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    # Los gauges del worker que terminó dejan de sumarse
+    multiprocess.mark_process_dead(worker.pid)
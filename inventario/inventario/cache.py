@@ -0,0 +1,116 @@
+"""Claves de caché versionadas.
+
+En lugar de borrar entradas una por una, cada grupo de datos (p. ej. el
+catálogo de productos) tiene un número de versión en la caché que forma parte
+de todas sus claves. Invalidar es incrementar ese número: las entradas viejas
+dejan de leerse y expiran solas.
+
+La versión vive en la caché configurada; con varios workers tiene que ser una
+caché compartida (``CACHE_BACKEND=file`` o un backend externo) para que todos
+vean el mismo número.
+
+``obtener_o_calcular`` evita que varios workers calculen a la vez el mismo
+valor ausente y ``respuesta_json_cacheada`` lo aplica a vistas JSON con ETag.
+"""
+import hashlib
+import json
+import time
+
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+
+def _clave_version(nombre):
+    return f'version:{nombre}'
+
+
+def version(nombre):
+    """Versión vigente del grupo ``nombre``."""
+    clave = _clave_version(nombre)
+    valor = cache.get(clave)
+    if valor is None:
+        # Arranca en un valor basado en la hora para no reutilizar versiones
+        # viejas si la clave se perdió (reinicio, desalojo)
+        cache.add(clave, time.time_ns(), None)
+        valor = cache.get(clave)
+    return valor
+
+
+def _incrementar(nombre):
+    clave = _clave_version(nombre)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        cache.set(clave, time.time_ns(), None)
+
+
+def invalidar(nombre):
+    """Invalida todas las entradas del grupo ``nombre``.
+
+    Se incrementa la versión ahora y otra vez al confirmar la transacción: la
+    segunda descarta lo que otro request haya cacheado leyendo datos previos
+    al commit.
+    """
+    _incrementar(nombre)
+    transaction.on_commit(lambda: _incrementar(nombre))
+
+
+def clave_versionada(nombre, *partes):
+    """Clave ``<nombre>:<versión>:<hash de partes>`` para el grupo ``nombre``."""
+    resumen = hashlib.md5(repr(partes).encode(), usedforsecurity=False).hexdigest()
+    return f'{nombre}:{version(nombre)}:{resumen}'
+
+
+def obtener_o_calcular(clave, calcular, timeout=DEFAULT_TIMEOUT, espera=5.0):
+    """``cache.get`` o, si falta, ``calcular()`` y guardar, de a un worker por vez.
+
+    Si varios requests piden la misma clave a la vez, sólo el que toma el
+    candado (``cache.add``) calcula; los demás esperan el resultado hasta
+    ``espera`` segundos y, si no llega, calculan por su cuenta.
+    """
+    valor = cache.get(clave)
+    if valor is not None:
+        return valor
+
+    candado = f'{clave}:calculando'
+    limite = time.monotonic() + espera
+    # El candado expira solo por si el worker que lo tomó muere
+    propio = cache.add(candado, 1, int(espera * 2) + 1)
+    while not propio and time.monotonic() < limite:
+        time.sleep(0.05)
+        valor = cache.get(clave)
+        if valor is not None:
+            return valor
+        propio = cache.add(candado, 1, int(espera * 2) + 1)
+
+    try:
+        valor = calcular()
+        cache.set(clave, valor, timeout)
+    finally:
+        if propio:
+            cache.delete(candado)
+    return valor
+
+
+def respuesta_json_cacheada(request, clave, calcular):
+    """``HttpResponse`` JSON de ``calcular()`` cacheada en ``clave``, con ETag.
+
+    Se guarda el JSON ya serializado junto con su ETag; si el navegador
+    manda ``If-None-Match`` con el mismo valor responde 304 sin cuerpo.
+    """
+    def serializar():
+        contenido = json.dumps(calcular(), cls=DjangoJSONEncoder).encode()
+        return '"%s"' % hashlib.md5(contenido, usedforsecurity=False).hexdigest(), contenido
+
+    etag, contenido = obtener_o_calcular(clave, serializar)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(contenido, content_type='application/json')
+    response['ETag'] = etag
+    # El navegador puede guardarla pero revalida siempre (barato gracias al ETag)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
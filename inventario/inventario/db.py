@@ -0,0 +1,101 @@
+"""Utilidades de base de datos compartidas por las aplicaciones."""
+from django.db import NotSupportedError, connection, migrations
+
+
+def acumular(modelo, claves, filas, campos):
+    """Suma valores a tablas de resumen con un solo INSERT ... ON CONFLICT.
+
+    ``claves`` son los campos de la restricción única, ``campos`` los que se
+    acumulan y ``filas`` una lista de dicts con todos ellos (``campo`` puede ser
+    el nombre del campo o de su columna, p. ej. ``cliente`` o ``cliente_id``).
+    Si la fila no existe se inserta; si existe se le suman los valores. La
+    sintaxis es la misma en PostgreSQL y SQLite (>= 3.24), y la operación es
+    atómica aunque varios workers escriban la misma fila a la vez.
+    """
+    if not filas:
+        return
+    qn = connection.ops.quote_name
+    meta = modelo._meta
+    tabla = qn(meta.db_table)
+    campos_modelo = [meta.get_field(nombre) for nombre in [*claves, *campos]]
+    columnas = [campo.column for campo in campos_modelo]
+    placeholders = '(' + ', '.join(['%s'] * len(columnas)) + ')'
+    actualizaciones = ', '.join(
+        f'{qn(col)} = {tabla}.{qn(col)} + EXCLUDED.{qn(col)}'
+        for col in columnas[len(claves):]
+    )
+    # PostgreSQL no permite que un mismo INSERT toque dos veces la misma fila:
+    # las filas con igual clave se suman antes de enviarlas.
+    agrupadas = {}
+    for fila in filas:
+        valores = [fila[c.name] if c.name in fila else fila[c.column] for c in campos_modelo]
+        valores = [getattr(v, 'pk', v) for v in valores]
+        clave = tuple(valores[:len(claves)])
+        if clave in agrupadas:
+            agrupadas[clave] = [a + b for a, b in zip(agrupadas[clave], valores[len(claves):])]
+        else:
+            agrupadas[clave] = valores[len(claves):]
+    params = []
+    # Orden fijo de claves: dos transacciones nunca bloquean filas en orden cruzado
+    for clave, sumas in sorted(agrupadas.items()):
+        for campo, valor in zip(campos_modelo, [*clave, *sumas]):
+            params.append(campo.get_db_prep_save(valor, connection))
+    sql = (
+        f"INSERT INTO {tabla} ({', '.join(qn(c) for c in columnas)}) "
+        f"VALUES {', '.join([placeholders] * len(agrupadas))} "
+        f"ON CONFLICT ({', '.join(qn(c) for c in columnas[:len(claves)])}) "
+        f"DO UPDATE SET {actualizaciones}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+class RunSQLSegunMotor(migrations.RunSQL):
+    """``RunSQL`` que sólo se ejecuta en el motor indicado (``'postgresql'``,
+    ``'sqlite'``, ...). Permite que una migración use índices o tablas propias
+    de cada base sin romper la otra."""
+
+    def __init__(self, vendor, sql, reverse_sql=None, **kwargs):
+        self.vendor = vendor
+        super().__init__(sql, reverse_sql, **kwargs)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        return name, [self.vendor, *args], kwargs
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+    def describe(self):
+        return f"SQL sólo para {self.vendor}"
+
+
+class AgregarIndiceConcurrente(migrations.AddIndex):
+    """``AddIndex`` que en PostgreSQL usa ``CREATE INDEX CONCURRENTLY`` para no
+    bloquear escrituras mientras se construye; en otros motores es un
+    ``AddIndex`` común. La migración debe declarar ``atomic = False``."""
+
+    def _concurrente(self, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return {}
+        if schema_editor.connection.in_atomic_block:
+            raise NotSupportedError(
+                f"{self.__class__.__name__} no puede ejecutarse dentro de una "
+                "transacción (declarar atomic = False en la migración)."
+            )
+        return {'concurrently': True}
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, **self._concurrente(schema_editor))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, **self._concurrente(schema_editor))
@@ -0,0 +1,201 @@
+"""Exportación de listados a CSV o XLSX sin cargarlos en memoria.
+
+Las vistas pasan las filas como un iterable perezoso, normalmente
+``queryset.values_list(...).iterator(chunk_size=EXPORTAR_LOTE)``: la base
+entrega las filas por lotes (cursor del lado del servidor en PostgreSQL),
+no se instancian modelos y cada lote se envía al cliente con
+``StreamingHttpResponse`` apenas se escribe. La memoria usada es la de un
+lote, sean 100 filas o 10 millones.
+
+El XLSX se arma a mano (un zip con una sola hoja de strings en línea) para no
+depender de una librería que construya el libro completo antes de enviarlo.
+Excel admite hasta 1.048.576 filas por hoja: las que excedan ese límite se
+omiten, así que para exportaciones enormes conviene CSV.
+"""
+import csv
+import datetime
+import io
+import re
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+# Filas por lote de la base y por bloque enviado al cliente
+EXPORTAR_LOTE = 2000
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+MAX_FILAS_XLSX = 1048576
+
+# Caracteres de control que no se pueden escribir en XML
+_INVALIDOS_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+# Un texto que empieza así Excel lo abre como fórmula desde un CSV
+_INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime.datetime):
+        if timezone.is_aware(valor):
+            valor = timezone.localtime(valor)
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    return str(valor)
+
+
+def _texto_csv(valor):
+    """Como ``_texto`` pero con ``'`` delante de los textos que Excel tomaría
+    como fórmula (un cliente llamado ``=HYPERLINK(...)``). Los números
+    negativos quedan como están."""
+    texto = _texto(valor)
+    if isinstance(valor, str) and texto.startswith(_INICIO_FORMULA):
+        return "'" + texto
+    return texto
+
+
+def en_lotes(filas, tamano=EXPORTAR_LOTE):
+    """Agrupa un iterable en listas de ``tamano`` elementos."""
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) == tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def filas_csv(columnas, filas):
+    """Genera el CSV en bloques de bytes (UTF-8 con BOM para Excel)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(columnas)
+    for lote in en_lotes(filas):
+        writer.writerows([_texto_csv(valor) for valor in fila] for fila in lote)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _Salida:
+    """Destino de ``ZipFile`` que acumula lo escrito hasta que se lo retira.
+
+    No tiene ``seek``: ``zipfile`` escribe entonces los tamaños en un
+    descriptor después de cada archivo y no necesita volver atrás.
+    """
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def _celda(valor):
+    if isinstance(valor, bool):
+        valor = 'Sí' if valor else 'No'
+    elif isinstance(valor, (int, float, Decimal)):
+        return f'<c><v>{valor}</v></c>'
+    texto = escape(_INVALIDOS_XML.sub('', _texto(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xml(valores):
+    return '<row>' + ''.join(_celda(v) for v in valores) + '</row>'
+
+
+_XLSX_FIJOS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Datos" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    ),
+}
+
+
+def filas_xlsx(columnas, filas):
+    """Genera un XLSX de una hoja en bloques de bytes."""
+    salida = _Salida()
+    with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED) as libro:
+        for nombre, contenido in _XLSX_FIJOS.items():
+            libro.writestr(nombre, contenido)
+        with libro.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja:
+            hoja.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            hoja.write(_fila_xml(columnas).encode('utf-8'))
+            restantes = MAX_FILAS_XLSX - 1
+            for lote in en_lotes(filas):
+                lote = lote[:restantes]
+                restantes -= len(lote)
+                hoja.write(''.join(_fila_xml(fila) for fila in lote).encode('utf-8'))
+                yield salida.retirar()
+                if not restantes:
+                    break
+            hoja.write(b'</sheetData></worksheet>')
+    yield salida.retirar()
+
+
+def respuesta_exportacion(request, nombre, columnas, filas):
+    """``StreamingHttpResponse`` con ``filas`` en el formato pedido.
+
+    ``?formato=xlsx`` para Excel; por defecto CSV. ``nombre`` es el nombre
+    del archivo sin extensión.
+    """
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS:
+        formato = 'csv'
+    generador = filas_xlsx if formato == 'xlsx' else filas_csv
+    response = StreamingHttpResponse(generador(columnas, filas), content_type=FORMATOS[formato])
+    fecha = timezone.localdate().strftime('%Y%m%d')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}-{fecha}.{formato}"'
+    return response
@@ -0,0 +1,134 @@
+"""Vista para servir MEDIA_ROOT cuando no hay un servidor web delante.
+
+Reemplaza a ``django.views.static.serve`` con lo necesario para que el
+navegador y los proxies cacheen bien las imágenes:
+
+- ETag fuerte y ``Last-Modified``; responde 304 a ``If-None-Match`` /
+  ``If-Modified-Since``.
+- Los archivos nombrados por su hash (``productos.storage``) no cambian
+  nunca: ``Cache-Control: public, max-age=31536000, immutable``.
+- ``Range: bytes=a-b`` (un solo rango) con 206 y 416.
+- Con ``MEDIA_ENVIO = 'x-accel'`` o ``'x-sendfile'`` Django sólo resuelve el
+  archivo y los encabezados; los bytes los envía nginx (``X-Accel-Redirect``
+  a ``MEDIA_ACCEL_PREFIJO``) o Apache/lighttpd (``X-Sendfile``), y el worker
+  de gunicorn queda libre.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+_NOMBRE_HASH = re.compile(r'^[0-9a-f]{64}(\.\w+)?$')
+_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+UN_ANIO = 365 * 24 * 60 * 60
+_BLOQUE = 64 * 1024
+
+
+def _leer_rango(ruta, inicio, largo):
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(inicio)
+        while largo > 0:
+            bloque = archivo.read(min(_BLOQUE, largo))
+            if not bloque:
+                break
+            largo -= len(bloque)
+            yield bloque
+
+
+def _rango_pedido(request, etag, tamano):
+    """``(inicio, fin)`` del header Range, ``None`` si hay que enviar todo o
+    ``False`` si el rango no se puede satisfacer."""
+    rango = request.headers.get('Range', '')
+    # If-Range con otro ETag: el archivo cambió, se envía completo
+    if not rango or request.headers.get('If-Range', etag) != etag:
+        return None
+    coincidencia = _RANGO.match(rango.strip())
+    if not coincidencia or coincidencia.groups() == ('', ''):
+        return None
+    desde, hasta = coincidencia.groups()
+    if desde == '':
+        # bytes=-N: los últimos N bytes
+        inicio, fin = max(tamano - int(hasta), 0), tamano - 1
+    else:
+        inicio = int(desde)
+        fin = min(int(hasta), tamano - 1) if hasta else tamano - 1
+    if inicio >= tamano or inicio > fin:
+        return False
+    return inicio, fin
+
+
+@require_safe
+def servir_media(request, path):
+    try:
+        ruta = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(ruta)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(ruta):
+        raise Http404
+
+    nombre = os.path.basename(ruta)
+    inmutable = bool(_NOMBRE_HASH.match(nombre))
+    # El nombre ya es el hash del contenido; si no, tamaño + fecha de modificación
+    etag = '"%s"' % (os.path.splitext(nombre)[0] if inmutable else f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+    encabezados = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': (
+            f'public, max-age={UN_ANIO}, immutable' if inmutable
+            else f"public, max-age={getattr(settings, 'MEDIA_CACHE_SEGUNDOS', 3600)}"
+        ),
+    }
+
+    condicional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if condicional is not None:
+        for clave, valor in encabezados.items():
+            condicional[clave] = valor
+        return condicional
+
+    tipo, codificacion = mimetypes.guess_type(ruta)
+    tipo = tipo or 'application/octet-stream'
+
+    envio = getattr(settings, 'MEDIA_ENVIO', None)
+    if envio in ('x-accel', 'x-sendfile'):
+        # El proxy atiende Range y envía el cuerpo
+        response = HttpResponse(content_type=tipo)
+        if envio == 'x-accel':
+            prefijo = getattr(settings, 'MEDIA_ACCEL_PREFIJO', '/media-interna/')
+            response['X-Accel-Redirect'] = prefijo.rstrip('/') + '/' + quote(path.lstrip('/'))
+        else:
+            response['X-Sendfile'] = ruta
+    else:
+        rango = _rango_pedido(request, etag, stat.st_size)
+        if rango is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif rango:
+            inicio, fin = rango
+            response = StreamingHttpResponse(
+                _leer_rango(ruta, inicio, fin - inicio + 1), status=206, content_type=tipo,
+            )
+            response['Content-Range'] = f'bytes {inicio}-{fin}/{stat.st_size}'
+            response['Content-Length'] = str(fin - inicio + 1)
+        else:
+            response = FileResponse(open(ruta, 'rb'), content_type=tipo)
+            response['Content-Length'] = str(stat.st_size)
+    if codificacion:
+        response['Content-Encoding'] = codificacion
+
+    for clave, valor in encabezados.items():
+        response[clave] = valor
+    return response
@@ -0,0 +1,117 @@
+"""Métricas en formato Prometheus (``/metrics``).
+
+Con gunicorn cada worker es un proceso con sus propios contadores. Si está
+definida ``PROMETHEUS_MULTIPROC_DIR`` (lo hace ``gunicorn.conf.py``),
+``prometheus_client`` guarda los valores de cada proceso en archivos mmap de
+ese directorio y ``/metrics`` los suma al leerlos. Incrementar una métrica
+es escribir en memoria del propio proceso: no hay bloqueos entre workers ni
+consultas a la base en el camino del request. Los productos con stock bajo
+se cuentan con una consulta al momento del scrape.
+
+``prometheus_client`` es opcional (igual que whitenoise): sin el paquete las
+funciones de este módulo no hacen nada y ``/metrics`` no se publica.
+"""
+import hmac
+import os
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+from .rendimiento import medir
+
+try:
+    import prometheus_client
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # pragma: no cover - dependencia opcional
+    prometheus_client = None
+
+
+if prometheus_client is not None:
+    REQUEST_SEGUNDOS = Histogram(
+        'inventario_request_segundos', 'Duración de los requests por vista.',
+        ['vista', 'metodo'],
+        buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    )
+    CONSULTAS_SQL = Counter(
+        'inventario_consultas_sql', 'Consultas SQL ejecutadas por los requests, por vista.', ['vista'],
+    )
+    VENTAS_CONFIRMADAS = Counter('inventario_ventas', 'Ventas confirmadas.')
+    MOVIMIENTOS_STOCK = Counter('inventario_movimientos_stock', 'Movimientos de stock confirmados.', ['tipo'])
+
+
+def _al_confirmar(incrementar):
+    # Sólo cuenta lo que efectivamente se confirmó en la base
+    if prometheus_client is not None:
+        transaction.on_commit(incrementar)
+
+
+def contar_ventas(cantidad):
+    _al_confirmar(lambda: VENTAS_CONFIRMADAS.inc(cantidad))
+
+
+def contar_movimientos(tipo, cantidad=1):
+    _al_confirmar(lambda: MOVIMIENTOS_STOCK.labels(tipo=tipo).inc(cantidad))
+
+
+class _StockBajoCollector:
+    def collect(self):
+        from django.db.models import F
+        from productos.models import Producto
+
+        metrica = GaugeMetricFamily('inventario_productos_stock_bajo', 'Productos con stock menor al mínimo.')
+        metrica.add_metric([], Producto.objects.filter(stock__lt=F('stock_minimo')).count())
+        yield metrica
+
+
+class _Proceso:
+    """Expone las métricas del registro global sin registrarlas dos veces."""
+
+    def collect(self):
+        return prometheus_client.REGISTRY.collect()
+
+
+def _registro():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        # Un solo proceso (runserver, tests)
+        registro = CollectorRegistry()
+        registro.register(_Proceso())
+    registro.register(_StockBajoCollector())
+    return registro
+
+
+def metricas_view(request):
+    """Texto para Prometheus. Exige ``Authorization: Bearer <METRICAS_TOKEN>``.
+    Sin token configurado solo responde con ``DEBUG``: en producción la URL no
+    pide login y publicaría los nombres de las vistas y el volumen de ventas."""
+    token = getattr(settings, 'METRICAS_TOKEN', '')
+    if not token and not settings.DEBUG:
+        raise Http404
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(_registro()), content_type=CONTENT_TYPE_LATEST)
+
+
+class MetricasMiddleware:
+    """Duración y consultas SQL de cada request, etiquetadas por nombre de
+    vista (``app:nombre``). Las rutas que no resuelven se agrupan en
+    ``sin_vista`` para no crear una serie por URL."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with medir() as medicion:
+            response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        vista = (match.view_name or match._func_path) if match else 'sin_vista'
+        REQUEST_SEGUNDOS.labels(vista=vista, metodo=request.method).observe(medicion.total_segundos)
+        if medicion.consultas:
+            CONSULTAS_SQL.labels(vista=vista).inc(medicion.consultas)
+        return response
@@ -1,6 +1,13 @@
+import json
+import logging
+
 from django.conf import settings
 from django.shortcuts import redirect, resolve_url
 
+from .rendimiento import instrumentar_plantillas, medir
+
+logger_rendimiento = logging.getLogger('inventario.rendimiento')
+
 
 class LoginRequiredMiddleware:
     """Require login for all views except a small whitelist.
@@ -44,6 +51,7 @@ class LoginRequiredMiddleware:
         exemptions.update(_variants('/accounts/logout/'))
         exemptions.update(_variants('/accounts/'))
         exemptions.update(_variants('/admin/'))
+        exemptions.update(_variants('/metrics'))
         exemptions.update(_variants(static_prefix))
         exemptions.update(_variants(media_prefix))
 
@@ -52,13 +60,6 @@ class LoginRequiredMiddleware:
 
     def __call__(self, request):
         path = request.path
-        # Debug info when running in development
-        if getattr(settings, 'DEBUG', False):
-            try:
-                print("[LoginRequiredMiddleware] request.path=", path)
-                print("[LoginRequiredMiddleware] exempt_prefixes=", self.exempt_prefixes)
-            except Exception:
-                pass
         # allow if request is for an exempt prefix
         if any(path.startswith(p) for p in self.exempt_prefixes):
             return self.get_response(request)
@@ -77,11 +78,76 @@ class LoginRequiredMiddleware:
             # Defensive: if the request is already the login URL, allow it through
             if path == target or path == target[:-1]:
                 return self.get_response(request)
-            if getattr(settings, 'DEBUG', False):
-                try:
-                    print("[LoginRequiredMiddleware] redirecting anonymous to:", target)
-                except Exception:
-                    pass
             return redirect(target)
 
         return self.get_response(request)
+
+
+class RendimientoMiddleware:
+    """Mide cada request: tiempo total, consultas SQL y su tiempo, y render
+    de plantillas (ver ``inventario.rendimiento``).
+
+    - Agrega ``Server-Timing`` (visible en las herramientas del navegador).
+    - Los requests que superan ``RENDIMIENTO_UMBRAL_MS`` se registran como
+      una línea JSON en el logger ``inventario.rendimiento``, con el nombre
+      de la vista resuelta para poder agrupar por vista.
+
+    Se activa con ``RENDIMIENTO=1``; conviene ponerlo primero en
+    ``MIDDLEWARE`` para que el tiempo incluya al resto.
+
+    Las respuestas streaming (exportaciones, ``FileResponse``) generan el
+    cuerpo después de salir de la vista: la medición sigue mientras se envía
+    y el log se escribe al terminar, con el cuerpo incluido. ``Server-Timing``
+    viaja en los encabezados, así que en ellas sólo cubre hasta la respuesta.
+    Las respuestas streaming asíncronas no se siguen midiendo.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.umbral = getattr(settings, 'RENDIMIENTO_UMBRAL_MS', 500) / 1000
+        self.server_timing = getattr(settings, 'RENDIMIENTO_SERVER_TIMING', True)
+        instrumentar_plantillas()
+
+    def __call__(self, request):
+        with medir() as medicion:
+            response = self.get_response(request)
+
+        if self.server_timing:
+            response['Server-Timing'] = ', '.join([
+                f'sql;dur={medicion.sql_segundos * 1000:.1f};desc="{medicion.consultas} consultas"',
+                f'tpl;dur={medicion.plantillas_segundos * 1000:.1f}',
+                f'total;dur={medicion.total_segundos * 1000:.1f}',
+            ])
+        if response.streaming and not response.is_async:
+            response.streaming_content = self.medir_cuerpo(request, response, response.streaming_content, medicion)
+        else:
+            self.registrar(request, response, medicion)
+        return response
+
+    def medir_cuerpo(self, request, response, contenido, medicion):
+        try:
+            with medir(medicion):
+                yield from contenido
+        finally:
+            self.registrar(request, response, medicion)
+
+    def registrar(self, request, response, medicion):
+        if medicion.total_segundos >= self.umbral:
+            logger_rendimiento.warning(json.dumps({
+                'evento': 'request_lento',
+                'vista': self.nombre_vista(request),
+                'metodo': request.method,
+                'ruta': request.path,
+                'estado': response.status_code,
+                'total_ms': round(medicion.total_segundos * 1000, 1),
+                'consultas': medicion.consultas,
+                'sql_ms': round(medicion.sql_segundos * 1000, 1),
+                'plantillas_ms': round(medicion.plantillas_segundos * 1000, 1),
+            }, ensure_ascii=False))
+
+    @staticmethod
+    def nombre_vista(request):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            return None
+        return match.view_name or match._func_path
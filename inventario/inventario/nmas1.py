@@ -0,0 +1,162 @@
+"""Detector de consultas N+1 para desarrollo y tests.
+
+Mientras está activo (``detectar()``), cada SELECT se agrupa por sentencia
+normalizada (sin valores ni largo de las listas ``IN``) y por el lugar que
+la disparó: la línea de plantilla que se estaba renderizando o, si no, la
+primera línea de código del proyecto en la pila. Si el mismo par se repite
+``NMAS1_UMBRAL`` veces o más, casi siempre es una relación que se carga de a
+una fila por vez (``{{ venta.cliente }}`` dentro de un ``for``) y se arregla
+con ``select_related``/``prefetch_related``. Cuando la consulta viene de un
+descriptor de relación se informa cuál (p. ej. ``Venta.cliente``).
+
+``NMas1Middleware`` lo aplica a cada request según ``NMAS1``: ``'log'``
+(advertencia JSON en el logger ``inventario.nmas1``), ``'error'`` (lanza
+``ConsultasNMas1Error``; el runner de tests lo usa para que un N+1 haga
+fallar la suite) o vacío (desactivado, sin costo).
+"""
+import json
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('inventario.nmas1')
+
+_IN_LISTA = re.compile(r'IN \((?:%s, )*%s\)')
+_ESPACIOS = re.compile(r'\s+')
+_LITERALES = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+# La propia instrumentación (execute_wrapper de medición) no es un "lugar"
+_INSTRUMENTACION = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), nombre)
+    for nombre in ('nmas1.py', 'rendimiento.py')
+}
+
+
+class ConsultasNMas1Error(AssertionError):
+    """Se detectaron consultas repetidas (N+1)."""
+
+    def __init__(self, repetidas, contexto=''):
+        self.repetidas = repetidas
+        detalle = '\n'.join(
+            f"  {r['veces']}x {r['sitio']}"
+            + (f" [{r['relacion']}]" if r['relacion'] else '')
+            + f": {r['sql'][:200]}"
+            for r in repetidas
+        )
+        super().__init__(f"Consultas N+1{' en ' + contexto if contexto else ''}:\n{detalle}")
+
+
+def normalizar_sql(sql):
+    sql = _IN_LISTA.sub('IN (...)', sql)
+    sql = _LITERALES.sub('?', sql)
+    return _ESPACIOS.sub(' ', sql).strip()
+
+
+def _es_del_proyecto(archivo):
+    raiz = str(settings.BASE_DIR)
+    return (
+        archivo.startswith(raiz)
+        and 'site-packages' not in archivo
+        and os.path.abspath(archivo) not in _INSTRUMENTACION
+    )
+
+
+def _origen(frame):
+    """``(sitio, relacion)`` de la consulta que se está ejecutando."""
+    relacion = None
+    while frame is not None:
+        codigo = frame.f_code
+        archivo = codigo.co_filename
+        if relacion is None and archivo.endswith('related_descriptors.py'):
+            campo = getattr(frame.f_locals.get('self'), 'field', None)
+            if campo is not None and hasattr(campo, 'model'):
+                relacion = f'{campo.model.__name__}.{campo.name}'
+        if codigo.co_name == 'render_annotated' and archivo.endswith(os.path.join('template', 'base.py')):
+            nodo = frame.f_locals.get('self')
+            origen = getattr(nodo, 'origin', None)
+            token = getattr(nodo, 'token', None)
+            if origen is not None and token is not None:
+                return f'{origen.template_name}:{token.lineno}', relacion
+        if _es_del_proyecto(archivo):
+            return f'{os.path.relpath(archivo, settings.BASE_DIR)}:{frame.f_lineno}', relacion
+        frame = frame.f_back
+    return '?', relacion
+
+
+class Registro:
+    def __init__(self):
+        self.consultas = Counter()
+        self.relaciones = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip()[:6].upper() == 'SELECT':
+            sitio, relacion = _origen(sys._getframe(1))
+            clave = (normalizar_sql(sql), sitio)
+            self.consultas[clave] += 1
+            if relacion:
+                self.relaciones[clave] = relacion
+        return execute(sql, params, many, context)
+
+    def repetidas(self, umbral=None):
+        umbral = umbral or getattr(settings, 'NMAS1_UMBRAL', 3)
+        return [
+            {'sql': sql, 'sitio': sitio, 'relacion': self.relaciones.get((sql, sitio)), 'veces': veces}
+            for (sql, sitio), veces in self.consultas.most_common()
+            if veces >= umbral
+        ]
+
+
+@contextmanager
+def detectar(umbral=None, contexto=''):
+    """Registra las consultas del bloque y lanza ``ConsultasNMas1Error`` si
+    alguna se repite ``umbral`` veces o más. Para usar en tests::
+
+        with detectar():
+            self.client.get(url)
+    """
+    with registrar() as registro:
+        yield registro
+    repetidas = registro.repetidas(umbral)
+    if repetidas:
+        raise ConsultasNMas1Error(repetidas, contexto)
+
+
+@contextmanager
+def registrar():
+    registro = Registro()
+    with ExitStack() as stack:
+        for conexion in connections.all():
+            stack.enter_context(conexion.execute_wrapper(registro))
+        yield registro
+
+
+class NMas1Middleware:
+    """Aplica el detector a cada request según ``NMAS1`` (ver el módulo)."""
+
+    def __init__(self, get_response):
+        from django.core.exceptions import MiddlewareNotUsed
+
+        self.modo = getattr(settings, 'NMAS1', '')
+        if self.modo not in ('log', 'error'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with registrar() as registro:
+            response = self.get_response(request)
+        repetidas = registro.repetidas()
+        if repetidas:
+            match = getattr(request, 'resolver_match', None)
+            vista = match.view_name if match else request.path
+            if self.modo == 'error':
+                raise ConsultasNMas1Error(repetidas, f'{request.method} {request.path} ({vista})')
+            logger.warning(json.dumps({
+                'evento': 'consultas_nmas1', 'vista': vista, 'ruta': request.path, 'repetidas': repetidas,
+            }, ensure_ascii=False))
+        return response
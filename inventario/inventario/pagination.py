@@ -0,0 +1,166 @@
+"""Paginación por cursor (keyset) para las vistas de listado.
+
+En lugar de ``OFFSET`` + ``COUNT(*)``, cada página busca a partir de los
+valores de orden de la última fila vista (``WHERE (nombre, id) > (...)``), así
+que el costo es el mismo en la página 1 que en la 10.000 y no hace falta
+contar la tabla. A cambio no hay números de página: sólo anterior/siguiente.
+"""
+import base64
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    """Como DjangoJSONEncoder pero sin truncar microsegundos: el cursor se
+    compara por igualdad y tiene que reproducir el valor exacto."""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _encode_cursor(direccion, valores):
+    data = json.dumps({'d': direccion, 'v': valores}, cls=_CursorEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor):
+    """Devuelve ``(direccion, valores)`` o ``None`` si el cursor no es válido."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        direccion, valores = data['d'], data['v']
+    except (ValueError, TypeError, KeyError):
+        return None
+    if direccion not in ('n', 'p') or not isinstance(valores, list):
+        return None
+    return direccion, valores
+
+
+def _convertir_valores(queryset, ordering, valores):
+    """Convierte los valores del cursor al tipo de cada campo de orden.
+
+    Devuelve ``None`` si alguno no es válido: el cursor viaja en la URL y un
+    valor adulterado no debe llegar al ``WHERE``.
+    """
+    convertidos = []
+    for (campo, _), valor in zip(ordering, valores):
+        if campo in queryset.query.annotations:
+            field = queryset.query.annotations[campo].output_field
+        elif campo == 'pk':
+            field = queryset.model._meta.pk
+        else:
+            field = queryset.model._meta.get_field(campo)
+        try:
+            valor = field.to_python(valor)
+        except (ValidationError, ValueError, TypeError):
+            return None
+        if valor is None:
+            return None
+        convertidos.append(valor)
+    return convertidos
+
+
+class KeysetPage:
+    """Página de resultados con la interfaz mínima que usan las plantillas."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginationMixin:
+    """Reemplaza la paginación por número de página de ``ListView``.
+
+    La vista declara ``keyset_ordering`` con los campos de orden; el último
+    debe ser único (normalmente ``id``) para que el orden sea total, p. ej.
+    ``('nombre', 'id')`` o ``('-fecha', 'id')``. El cursor viaja en el
+    parámetro GET ``cursor``; ``page_obj`` expone ``has_next``/``has_previous``
+    y ``next_cursor``/``previous_cursor``, y ``querystring`` conserva los
+    filtros sin el cursor.
+    """
+    keyset_ordering = None
+    cursor_param = 'cursor'
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        ordering = [
+            (campo.lstrip('-'), campo.startswith('-'))
+            for campo in self.get_keyset_ordering()
+        ]
+        decoded = _decode_cursor(self.request.GET.get(self.cursor_param, ''))
+        direccion, valores = decoded if decoded and len(decoded[1]) == len(ordering) else ('n', None)
+        if valores is not None:
+            valores = _convertir_valores(queryset, ordering, valores)
+            # Cursor inválido: primera página
+            if valores is None:
+                direccion = 'n'
+        hacia_atras = direccion == 'p'
+
+        # Al retroceder se recorre el orden invertido y luego se da vuelta la página
+        queryset = queryset.order_by(*[
+            ('-' if desc != hacia_atras else '') + campo for campo, desc in ordering
+        ])
+        if valores is not None:
+            queryset = queryset.filter(self._keyset_filter(ordering, valores, hacia_atras))
+
+        rows = list(queryset[:page_size + 1])
+        hay_mas = len(rows) > page_size
+        rows = rows[:page_size]
+        if hacia_atras:
+            rows.reverse()
+
+        def cursor(direccion, obj):
+            return _encode_cursor(direccion, [getattr(obj, campo) for campo, _ in ordering])
+
+        # Si se llegó con un cursor, del otro lado hay al menos una fila (la del cursor)
+        vino_de_otra_pagina = valores is not None
+        hay_siguiente, hay_anterior = (
+            (vino_de_otra_pagina, hay_mas) if hacia_atras else (hay_mas, vino_de_otra_pagina)
+        )
+        next_cursor = cursor('n', rows[-1]) if rows and hay_siguiente else None
+        previous_cursor = cursor('p', rows[0]) if rows and hay_anterior else None
+
+        page = KeysetPage(rows, next_cursor, previous_cursor)
+        return (None, page, rows, page.has_other_pages())
+
+    @staticmethod
+    def _keyset_filter(ordering, valores, hacia_atras):
+        """``(a, b, id) > (va, vb, vid)`` expandido para columnas asc/desc mixtas."""
+        condicion = Q()
+        for i, (campo, desc) in enumerate(ordering):
+            mayor = desc == hacia_atras
+            paso = Q(**{ordering[j][0]: valores[j] for j in range(i)})
+            paso &= Q(**{f"{campo}__{'gt' if mayor else 'lt'}": valores[i]})
+            condicion |= paso
+        return condicion
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        params = self.request.GET.copy()
+        for param in (self.cursor_param, 'page'):
+            params.pop(param, None)
+        context['querystring'] = params.urlencode()
+        return context
@@ -0,0 +1,103 @@
+"""Medición del costo de cada request (ver ``RendimientoMiddleware``).
+
+``medir()`` abre una ``Medicion`` para el hilo/contexto actual y registra,
+mientras dura:
+
+- cantidad y tiempo de las consultas SQL, con ``connection.execute_wrapper``
+  en cada conexión;
+- tiempo de render de plantillas (sólo la plantilla de más afuera, las
+  incluidas ya están dentro de ese tiempo).
+
+Las consultas que se ejecutan mientras se renderiza una plantilla (querysets
+perezosos) cuentan en los dos tiempos.
+"""
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import connections
+
+_actual = ContextVar('medicion', default=None)
+
+
+class Medicion:
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.fin = None
+        self.consultas = 0
+        self.sql_segundos = 0.0
+        self.plantillas_segundos = 0.0
+        self._profundidad_plantillas = 0
+
+    @property
+    def total_segundos(self):
+        return (self.fin or time.perf_counter()) - self.inicio
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: se llama por cada consulta
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_segundos += time.perf_counter() - inicio
+            self.consultas += 1
+
+
+def medicion_actual():
+    """La ``Medicion`` en curso, o ``None`` fuera de ``medir()``."""
+    return _actual.get()
+
+
+@contextmanager
+def medir(continuar=None):
+    """Mide el bloque. Si ya hay una medición en curso (p. ej. dos
+    middleware que miden) se reutiliza en lugar de contar todo dos veces.
+
+    ``continuar`` es una ``Medicion`` ya cerrada que sigue sumando desde su
+    inicio: el cuerpo de una respuesta streaming se genera después de que la
+    vista devolvió la respuesta."""
+    medicion = _actual.get()
+    if medicion is not None:
+        yield medicion
+        return
+    medicion = continuar or Medicion()
+    medicion.fin = None
+    token = _actual.set(medicion)
+    try:
+        with ExitStack() as stack:
+            for conexion in connections.all():
+                stack.enter_context(conexion.execute_wrapper(medicion))
+            yield medicion
+    finally:
+        medicion.fin = time.perf_counter()
+        _actual.reset(token)
+
+
+def _render_medido(render):
+    def wrapper(self, *args, **kwargs):
+        medicion = _actual.get()
+        if medicion is None:
+            return render(self, *args, **kwargs)
+        medicion._profundidad_plantillas += 1
+        inicio = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            medicion._profundidad_plantillas -= 1
+            if not medicion._profundidad_plantillas:
+                medicion.plantillas_segundos += time.perf_counter() - inicio
+    wrapper._medido = True
+    return wrapper
+
+
+def instrumentar_plantillas():
+    """Envuelve ``render`` de las plantillas de Django (una sola vez).
+
+    Django sólo emite la señal ``template_rendered`` en tests, así que el
+    tiempo se toma envolviendo el método. Fuera de ``medir()`` el costo es
+    una lectura de ``ContextVar``.
+    """
+    from django.template.backends.django import Template
+
+    if not getattr(Template.render, '_medido', False):
+        Template.render = _render_medido(Template.render)
@@ -17,6 +17,8 @@ import importlib.util
 # Detect whether whitenoise is available; make it optional so runserver
 # doesn't crash when the package is missing in local dev venvs
 USE_WHITENOISE = importlib.util.find_spec('whitenoise') is not None
+# Lo mismo para prometheus_client: sin el paquete no se publica /metrics
+USE_PROMETHEUS = importlib.util.find_spec('prometheus_client') is not None
 
 # Construye rutas dentro del proyecto así: BASE_DIR / 'subdir'.
 # BASE_DIR apunta a la carpeta del repositorio que contiene manage.py
@@ -88,8 +90,35 @@ MIDDLEWARE += [
     # Custom middleware to require login for anonymous users
     # Temporarily disabled while debugging redirect loop. Re-enable when fixed.
     'inventario.middleware.LoginRequiredMiddleware',
+    # Detector de consultas N+1; se desactiva solo si NMAS1 está vacío
+    'inventario.nmas1.NMas1Middleware',
 ]
 
+# Detector de N+1 (inventario.nmas1): 'log' avisa en el logger
+# `inventario.nmas1`, 'error' lanza una excepción, vacío lo desactiva. Por
+# defecto 'log' con DEBUG; los tests usan 'error' (inventario.test_runner).
+NMAS1 = os.environ.get('NMAS1', 'log' if DEBUG else '')
+# Repeticiones de la misma consulta desde el mismo lugar que cuentan como N+1
+NMAS1_UMBRAL = int(os.environ.get('NMAS1_UMBRAL', '3'))
+TEST_RUNNER = 'inventario.test_runner.InventarioTestRunner'
+
+# Medición por request (inventario.middleware.RendimientoMiddleware): con
+# RENDIMIENTO=1 cada respuesta lleva Server-Timing y los requests de más de
+# RENDIMIENTO_UMBRAL_MS milisegundos se registran como JSON en el logger
+# `inventario.rendimiento` (stderr, o el archivo RENDIMIENTO_LOG).
+RENDIMIENTO = os.environ.get('RENDIMIENTO', '0') == '1'
+RENDIMIENTO_UMBRAL_MS = int(os.environ.get('RENDIMIENTO_UMBRAL_MS', '500'))
+if USE_PROMETHEUS:
+    # Métricas para Prometheus en /metrics (inventario.metricas). Con gunicorn,
+    # gunicorn.conf.py define PROMETHEUS_MULTIPROC_DIR para sumar los workers.
+    MIDDLEWARE.insert(0, 'inventario.metricas.MetricasMiddleware')
+# /metrics exige "Authorization: Bearer <METRICAS_TOKEN>". Sin token solo
+# responde con DEBUG; fuera de DEBUG devuelve 404
+METRICAS_TOKEN = os.environ.get('METRICAS_TOKEN', '')
+if RENDIMIENTO:
+    # Primero, para que el tiempo incluya al resto de los middleware
+    MIDDLEWARE.insert(0, 'inventario.middleware.RendimientoMiddleware')
+
 ROOT_URLCONF = 'inventario.urls'
 
 TEMPLATES = [
@@ -129,6 +158,18 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # SQLite no soporta SELECT ... FOR UPDATE: con BEGIN IMMEDIATE cada
+            # transacción toma el lock de escritura al empezar y las demás
+            # esperan (hasta `timeout` segundos) en lugar de fallar.
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+            # Base de tests en archivo (no en memoria) para que los tests de
+            # concurrencia puedan abrir varias conexiones.
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
         }
     }
 
@@ -175,6 +216,13 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Envío de archivos de media (ver inventario.media): vacío = los envía Django;
+# 'x-accel' = nginx vía X-Accel-Redirect a MEDIA_ACCEL_PREFIJO (location
+# `internal` con alias a MEDIA_ROOT); 'x-sendfile' = Apache/lighttpd.
+MEDIA_ENVIO = os.environ.get('MEDIA_ENVIO') or None
+MEDIA_ACCEL_PREFIJO = os.environ.get('MEDIA_ACCEL_PREFIJO', '/media-interna/')
+# max-age de los archivos de media que no tienen nombre por hash
+MEDIA_CACHE_SEGUNDOS = int(os.environ.get('MEDIA_CACHE_SEGUNDOS', '3600'))
 # STATIC_ROOT: carpeta destino donde collectstatic guarda los archivos para producción
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
@@ -194,6 +242,66 @@ else:
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Caché. CACHE_BACKEND elige el backend:
+#   - 'locmem' (por defecto con DEBUG): en memoria, una por proceso. Sólo
+#     sirve con un proceso (runserver, tests): con varios workers cada uno ve
+#     su propia versión del catálogo (ver inventario.cache) y sirve páginas
+#     viejas hasta CACHE_TIMEOUT.
+#   - 'file' (por defecto sin DEBUG): en disco (CACHE_LOCATION), compartida
+#     por los workers de la misma máquina.
+#   - la ruta de un backend, p. ej. 'django.core.cache.backends.redis.RedisCache',
+#     con su CACHE_LOCATION.
+_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+_cache_backend = os.environ.get('CACHE_BACKEND', 'locmem' if DEBUG else 'file')
+CACHES = {
+    'default': {
+        'BACKEND': _CACHE_BACKENDS.get(_cache_backend, _cache_backend),
+        'LOCATION': os.environ.get(
+            'CACHE_LOCATION', str(BASE_DIR / 'cache') if _cache_backend == 'file' else 'inventario',
+        ),
+        'TIMEOUT': int(os.environ.get('CACHE_TIMEOUT', '300')),
+    }
+}
+if _cache_backend in _CACHE_BACKENDS:
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '5000'))}
+
+# Versión del código para los cachés de páginas (inventario.version). Vacía:
+# hash de plantillas y código, que cambia solo en cada despliegue.
+VERSION_PAGINAS = os.environ.get('VERSION_PAGINAS', '')
+
+# Imágenes de productos: las variantes (miniatura, detalle, WebP) se generan
+# después del commit en un pool de hilos de cada worker (productos.imagenes).
+# Con False se generan en el mismo request, útil en tests o scripts.
+PRODUCTO_IMAGENES_EN_SEGUNDO_PLANO = os.environ.get('PRODUCTO_IMAGENES_EN_SEGUNDO_PLANO', '1') == '1'
+PRODUCTO_IMAGENES_HILOS = int(os.environ.get('PRODUCTO_IMAGENES_HILOS', '2'))
+
+# Comprobantes PDF de ventas (ventas.comprobantes): se generan una vez y
+# quedan en disco. No va dentro de MEDIA_ROOT porque MEDIA es público.
+COMPROBANTES_DIR = os.environ.get('COMPROBANTES_DIR', str(BASE_DIR / 'comprobantes'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        # Una línea JSON por evento, sin prefijos
+        'json': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'rendimiento': (
+            {'class': 'logging.FileHandler', 'filename': os.environ['RENDIMIENTO_LOG'], 'formatter': 'json'}
+            if os.environ.get('RENDIMIENTO_LOG')
+            else {'class': 'logging.StreamHandler', 'formatter': 'json'}
+        ),
+    },
+    'loggers': {
+        'inventario.rendimiento': {'handlers': ['rendimiento'], 'level': 'INFO', 'propagate': False},
+        'inventario.nmas1': {'handlers': ['rendimiento'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
 CRISPY_ALLOWED_TEMPLATE_PACKS = 'bootstrap4'
 CRISPY_TEMPLATE_PACK = 'bootstrap4'
 
@@ -0,0 +1,14 @@
+import os
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class InventarioTestRunner(DiscoverRunner):
+    """Runner de tests del proyecto: activa el detector de N+1 en modo
+    ``'error'`` para que una vista con consultas repetidas haga fallar la
+    suite (``NMAS1=log`` o ``NMAS1=`` para relajarlo). Ver ``inventario.nmas1``."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.NMAS1 = os.environ.get('NMAS1', 'error')
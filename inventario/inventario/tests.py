@@ -0,0 +1,321 @@
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.signals import post_init
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from clientes import urls as clientes_urls
+from clientes.models import Cliente
+from inventario.nmas1 import ConsultasNMas1Error, detectar
+from productos import urls as productos_urls
+from productos.models import Producto
+from productos.services import registrar_movimiento
+from ventas import urls as ventas_urls
+from ventas.models import Venta
+from ventas.services import VentaLote, registrar_lote, registrar_venta
+
+
+@override_settings(
+    MIDDLEWARE=['inventario.middleware.RendimientoMiddleware', *settings.MIDDLEWARE],
+    RENDIMIENTO_UMBRAL_MS=0,
+)
+class RendimientoMiddlewareTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='view_venta'))
+        self.client.force_login(user)
+
+    def test_server_timing_y_log_de_request_lento(self):
+        with self.assertLogs('inventario.rendimiento', 'WARNING') as logs:
+            response = self.client.get(reverse('ventas:venta_list'))
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual(registro['vista'], 'ventas:venta_list')
+        self.assertEqual(registro['estado'], 200)
+        self.assertGreater(registro['consultas'], 0)
+        self.assertGreater(registro['plantillas_ms'], 0)
+
+    def test_streaming_mide_el_cuerpo(self):
+        cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='100')
+        producto = Producto.objects.create(nombre='Yerba', descripcion='1kg', precio=Decimal('10.00'), stock=6)
+        registrar_venta(cliente, [(producto.pk, 2)])
+        with self.assertNoLogs('inventario.rendimiento'):
+            response = self.client.get(reverse('ventas:venta_exportar'))
+        with self.assertLogs('inventario.rendimiento', 'WARNING') as logs:
+            contenido = b''.join(response.streaming_content)
+        self.assertIn(b'Ana', contenido)
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual(registro['vista'], 'ventas:venta_exportar')
+        self.assertGreater(registro['consultas'], 0)
+
+    @override_settings(RENDIMIENTO_UMBRAL_MS=60000)
+    def test_requests_rapidos_no_se_registran(self):
+        with self.assertNoLogs('inventario.rendimiento'):
+            response = self.client.get(reverse('ventas:venta_list'))
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+
+class MetricasTests(TestCase):
+    def muestra(self, nombre, **labels):
+        return REGISTRY.get_sample_value(nombre, labels) or 0
+
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_contadores_y_stock_bajo(self):
+        cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='100')
+        producto = Producto.objects.create(nombre='Yerba', descripcion='1kg', precio=Decimal('10.00'), stock=6, stock_minimo=5)
+        ventas = self.muestra('inventario_ventas_total')
+        salidas = self.muestra('inventario_movimientos_stock_total', tipo='salida')
+        with self.captureOnCommitCallbacks(execute=True):
+            registrar_venta(cliente, [(producto.pk, 2)])
+        self.assertEqual(self.muestra('inventario_ventas_total'), ventas + 1)
+        self.assertEqual(self.muestra('inventario_movimientos_stock_total', tipo='salida'), salidas + 1)
+
+        # /metrics no pide login, pide el token
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer secreto'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('inventario_productos_stock_bajo 1.0', response.content.decode())
+
+    def test_latencia_y_consultas_por_vista(self):
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='view_venta'))
+        self.client.force_login(user)
+        antes = self.muestra('inventario_request_segundos_count', vista='ventas:venta_list', metodo='GET')
+        self.client.get(reverse('ventas:venta_list'))
+        self.assertEqual(
+            self.muestra('inventario_request_segundos_count', vista='ventas:venta_list', metodo='GET'), antes + 1,
+        )
+        self.assertGreater(self.muestra('inventario_consultas_sql_total', vista='ventas:venta_list'), 0)
+
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer secreto'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICAS_TOKEN='')
+    def test_sin_token_solo_con_debug(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+
+class NMas1Tests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        productos = [
+            Producto.objects.create(nombre=f'Producto {i}', sku=f'P-{i}', descripcion='-', precio=Decimal('5.00'), stock=2)
+            for i in range(4)
+        ]
+        for producto in productos:
+            registrar_movimiento(producto, 'entrada', 20, motivo='Compra')
+        for i in range(4):
+            cliente = Cliente.objects.create(nombre='Cliente', apellido=f'N{i}', documento=f'D-{i}')
+            registrar_venta(cliente, [(p.pk, 1) for p in productos])
+        cls.producto, cls.cliente = productos[0], cliente
+        cls.venta = Venta.objects.first()
+
+    def test_detecta_relacion_cargada_por_fila(self):
+        with self.assertRaises(ConsultasNMas1Error) as error:
+            with detectar():
+                [venta.cliente for venta in Venta.objects.all()]
+        repetida, = error.exception.repetidas
+        self.assertEqual(repetida['relacion'], 'Venta.cliente')
+        self.assertTrue(repetida['sitio'].startswith('inventario/tests.py:'))
+
+    def test_informa_la_linea_de_la_plantilla(self):
+        with self.assertRaises(ConsultasNMas1Error) as error:
+            with detectar():
+                render_to_string('ventas/venta_list.html', {'ventas': Venta.objects.all()})
+        self.assertTrue(error.exception.repetidas[0]['sitio'].startswith('ventas/venta_list.html:'))
+
+    def test_listados_y_detalles_sin_nmas1(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        urls = [
+            reverse('productos:producto_list'),
+            reverse('productos:stock_bajo_list'),
+            reverse('productos:producto_detail', args=[self.producto.pk]),
+            reverse('productos:movimiento_create', args=[self.producto.pk]),
+            reverse('productos:producto_delete', args=[self.producto.pk]),
+            reverse('clientes:cliente_list'),
+            reverse('clientes:cliente_detail', args=[self.cliente.pk]),
+            reverse('ventas:venta_list'),
+            reverse('ventas:venta_detail', args=[self.venta.pk]),
+            reverse('ventas:venta_create'),
+            reverse('admin:ventas_venta_changelist'),
+            reverse('admin:ventas_venta_change', args=[self.venta.pk]),
+            reverse('admin:ventas_itemventa_changelist'),
+            reverse('admin:productos_producto_changelist'),
+            reverse('admin:clientes_cliente_changelist'),
+        ]
+        for url in urls:
+            with self.subTest(url=url), detectar(contexto=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class PresupuestoDeConsultasTests(TestCase):
+    """Máximo de consultas por vista, independiente del volumen de datos.
+
+    Cada URL de ``productos``, ``clientes`` y ``ventas`` se pide dos veces:
+    con los datos iniciales y después de sembrar varias veces más productos,
+    clientes, ventas y movimientos (y de hacer crecer los objetos que muestra
+    el detalle). Las dos veces tiene que hacer las mismas consultas, dentro
+    del presupuesto, e instanciar la misma cantidad de modelos: una consulta
+    por fila cambia lo primero y un queryset sin límite, lo último.
+    """
+
+    # Nombre de URL: consultas máximas (sesión, usuario y permisos incluidos)
+    PRESUPUESTOS = {
+        'productos:producto_list': 3,
+        'productos:producto_exportar': 5,
+        'productos:producto_create': 4,
+        'productos:producto_detail': 6,
+        'productos:producto_update': 5,
+        'productos:producto_delete': 8,
+        'productos:movimiento_create': 6,
+        'productos:ajustar_stock': 3,
+        'productos:stock_bajo_list': 5,
+        'clientes:cliente_list': 5,
+        'clientes:cliente_buscar': 5,
+        'clientes:cliente_create': 4,
+        'clientes:cliente_detail': 5,
+        'clientes:cliente_update': 5,
+        'clientes:cliente_delete': 5,
+        'ventas:venta_list': 5,
+        'ventas:venta_exportar': 5,
+        'ventas:item_venta_exportar': 5,
+        'ventas:ventas_por_dia': 5,
+        'ventas:ventas_por_producto': 5,
+        'ventas:buscar_productos': 6,
+        'ventas:buscar_clientes': 5,
+        'ventas:venta_create': 4,
+        'ventas:venta_lote': 14,
+        'ventas:venta_detail': 6,
+        'ventas:venta_comprobante': 7,
+    }
+    # Muestra todos los items de la venta; la venta medida crece a propósito
+    # para que una consulta por item se note en el conteo de consultas.
+    FILAS_DEL_OBJETO = {'ventas:venta_detail'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('encargado', password='x')
+        cls.usuario.user_permissions.set(
+            Permission.objects.filter(content_type__app_label__in=['productos', 'clientes', 'ventas'])
+        )
+        cls.producto = Producto.objects.create(nombre='Yerba', sku='YER-1', descripcion='1kg', precio=Decimal('10.00'))
+        cls.cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='100')
+        cls.sembrar(1)
+
+    @classmethod
+    def sembrar(cls, escala):
+        """Agrega ``escala`` tandas de datos; devuelve la venta más grande."""
+        productos = [
+            Producto.objects.create(
+                nombre=f'Producto {escala}-{i}', sku=f'S{escala}-{i}', descripcion='Sembrado',
+                precio=Decimal('2.50') + i, stock_minimo=10 ** 6 if i % 3 == 0 else 5,
+            )
+            for i in range(20 * escala)
+        ]
+        clientes = [
+            Cliente.objects.create(nombre='Cliente', apellido=f'Sembrado {escala}-{i}', documento=f'S{escala}-{i}')
+            for i in range(15 * escala)
+        ]
+        for producto in [cls.producto, *productos]:
+            registrar_movimiento(producto, 'entrada', 1000, motivo='Compra')
+            registrar_movimiento(producto, 'salida', 1, motivo='Rotura')
+        ahora = timezone.now()
+        lote = [
+            VentaLote(
+                f'semilla-{escala}-{i}', (cls.cliente if i % 3 == 0 else clientes[i % len(clientes)]).pk,
+                [(cls.producto.pk, 1), *[(p.pk, 1 + i % 3) for p in productos[i % 5::5]]],
+                fecha=ahora - timedelta(days=i % 10),
+            )
+            for i in range(30 * escala)
+        ]
+        lote.append(VentaLote(f'semilla-{escala}-grande', cls.cliente.pk, [(p.pk, 1) for p in productos]))
+        registrar_lote(lote)
+        return lote[-1].venta
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajuste = override_settings(COMPROBANTES_DIR=self.directorio)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        self.client.force_login(self.usuario)
+
+    def pedidos(self, venta):
+        """``(nombre, método, url, datos)`` de cada URL de las tres apps. Las
+        rutas con ``<pk>`` apuntan al objeto con más filas relacionadas."""
+        objetos = {'productos': self.producto, 'clientes': self.cliente, 'ventas': venta}
+        lote = json.dumps({'ventas': [
+            {'clave': f'presupuesto-{venta.pk}-{i}', 'cliente': self.cliente.pk,
+             'items': [{'producto': self.producto.pk, 'cantidad': 1}]}
+            for i in range(3)
+        ]})
+        busquedas = {
+            'clientes:cliente_buscar': 'sembrado', 'ventas:buscar_clientes': 'sembrado',
+            'ventas:buscar_productos': 'producto',
+        }
+        for modulo in (productos_urls, clientes_urls, ventas_urls):
+            for patron in modulo.urlpatterns:
+                nombre = f'{modulo.app_name}:{patron.name}'
+                args = [objetos[modulo.app_name].pk] if patron.pattern.converters else []
+                url = reverse(nombre, args=args)
+                if nombre == 'ventas:venta_lote':
+                    yield nombre, 'post', url, {'data': lote, 'content_type': 'application/json'}
+                elif nombre in busquedas:
+                    yield nombre, 'get', url, {'data': {'q': busquedas[nombre]}}
+                else:
+                    yield nombre, 'get', url, {}
+
+    def medir(self, metodo, url, datos):
+        # Sin caché: se mide el costo de generar la página, no de servirla
+        cache.clear()
+        instancias = []
+        contar = lambda sender, **kwargs: instancias.append(sender)
+        post_init.connect(contar, weak=False)
+        try:
+            with CaptureQueriesContext(connection) as ctx:
+                response = getattr(self.client, metodo)(url, **datos)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+        finally:
+            post_init.disconnect(contar)
+        self.assertLess(response.status_code, 400, url)
+        consultas = [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        return len(consultas), len(instancias)
+
+    def test_cubre_todas_las_urls(self):
+        nombres = {
+            f'{modulo.app_name}:{patron.name}'
+            for modulo in (productos_urls, clientes_urls, ventas_urls)
+            for patron in modulo.urlpatterns
+        }
+        self.assertEqual(nombres, set(self.PRESUPUESTOS))
+
+    def test_consultas_no_dependen_del_volumen(self):
+        venta = Venta.objects.get(clave_idempotencia='semilla-1-grande')
+        antes = {nombre: self.medir(*pedido) for nombre, *pedido in self.pedidos(venta)}
+        venta = self.sembrar(4)
+        despues = {nombre: self.medir(*pedido) for nombre, *pedido in self.pedidos(venta)}
+        for nombre, maximo in self.PRESUPUESTOS.items():
+            with self.subTest(nombre):
+                (consultas, instancias), (consultas_despues, instancias_despues) = antes[nombre], despues[nombre]
+                self.assertLessEqual(consultas_despues, maximo, 'consultas por encima del presupuesto')
+                self.assertEqual(consultas_despues, consultas, 'las consultas crecen con los datos')
+                if nombre not in self.FILAS_DEL_OBJETO:
+                    self.assertEqual(instancias_despues, instancias, 'los modelos cargados crecen con los datos')
@@ -0,0 +1,13 @@
+"""Normalización de texto para columnas de búsqueda."""
+import unicodedata
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y con espacios simples: ``'  José  PÉREZ'`` -> ``'jose perez'``.
+
+    Se aplica igual al guardar y al buscar, así la comparación en la base es
+    exacta (``LIKE``) y puede usar índices sin funciones de por medio.
+    """
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.lower().split())
@@ -19,9 +19,8 @@ from django.urls import path, include
 import os
 import re
 from django.conf import settings
-from django.conf.urls.static import static
 from django.urls import re_path
-from django.views.static import serve
+from inventario.media import servir_media
 from django.http import HttpResponse
 from django.views.generic.base import RedirectView
 
@@ -37,13 +36,18 @@ urlpatterns = [
     path('accounts/', include('allauth.urls')),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-elif os.environ.get('SERVE_MEDIA', '0') == '1':
-    # Serve MEDIA files in demo/CI environments even when DEBUG is False.
+if settings.USE_PROMETHEUS:
+    from inventario.metricas import metricas_view
+
+    # Sin login: lo consulta Prometheus con METRICAS_TOKEN
+    urlpatterns += [path('metrics', metricas_view, name='metricas')]
+
+if settings.DEBUG or os.environ.get('SERVE_MEDIA', '0') == '1':
+    # Serve MEDIA files in dev and in demo/CI environments even when DEBUG is
+    # False, with ETag/304, Range and long cache headers (see inventario.media).
     prefix = settings.MEDIA_URL or '/media/'
     # build a regex like ^media/(?P<path>.*)$ (strip leading slash)
     escaped = re.escape(prefix.lstrip('/'))
     urlpatterns += [
-        re_path(rf'^{escaped}(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
-    ]
\ No newline at end of file
+        re_path(rf'^{escaped}(?P<path>.*)$', servir_media, name='media'),
+    ]
@@ -0,0 +1,38 @@
+"""Versión del código desplegado, para los cachés de páginas enteras.
+
+Lo que se cachea sin vencimiento por contenido (el fragmento y el ETag del
+detalle de venta) tiene que cambiar cuando cambian las plantillas o el
+código que las arma; si no, un enlace nuevo nunca aparece en las páginas ya
+cacheadas. ``VERSION_PAGINAS`` (p. ej. el commit del despliegue) fija la
+versión; si no está definida se usa un hash de las plantillas y del código
+de las apps, calculado una vez por proceso.
+"""
+import hashlib
+from functools import lru_cache
+
+from django.conf import settings
+
+_APPS = ('inventario', 'productos', 'clientes', 'ventas')
+
+
+def _archivos():
+    base = settings.BASE_DIR
+    yield from sorted((base / 'templates').rglob('*.html'))
+    for app in _APPS:
+        for ruta in sorted((base / app).rglob('*.py')):
+            if 'migrations' not in ruta.parts and ruta.name != 'tests.py':
+                yield ruta
+
+
+@lru_cache(maxsize=None)
+def version_paginas():
+    """``(version, timestamp)``: identificador corto y la fecha de
+    modificación más nueva del código (para ``Last-Modified``)."""
+    digest = hashlib.sha1()
+    ultimo = 0
+    for ruta in _archivos():
+        digest.update(str(ruta.relative_to(settings.BASE_DIR)).encode())
+        digest.update(ruta.read_bytes())
+        ultimo = max(ultimo, int(ruta.stat().st_mtime))
+    version = getattr(settings, 'VERSION_PAGINAS', '') or digest.hexdigest()[:12]
+    return version, ultimo
@@ -41,6 +41,12 @@ class ProductoForm(forms.ModelForm):
         # Asignamos nuestro helper de formulario base para el diseño
         self.helper = BaseFormHelper()
 
+        # El stock sólo se carga al crear (queda como movimiento de "Stock
+        # inicial"). Después cambia únicamente por movimientos o ajustes, que
+        # lo actualizan de forma atómica y dejan registro en el historial.
+        if self.instance and self.instance.pk:
+            del self.fields["stock"]
+
         # Mostrar el SKU pero no permitir editarlo desde el formulario público.
         # Si existe la instancia (edición) el campo se muestra deshabilitado.
         # Si es creación, también se muestra deshabilitado (se autogenerará en el modelo).
@@ -58,7 +64,7 @@ class ProductoForm(forms.ModelForm):
             Field("descripcion"),
             # 'PrependedText' añade un prefijo (ej: el símbolo de $) al campo de precio
             PrependedText("precio", "$", placeholder="0.00"),
-            Field("stock"),
+            *([Field("stock")] if "stock" in self.fields else []),
             Field("stock_minimo"),
             Field("imagen"),
             # 'ButtonHolder' agrupa los botones en un contenedor
@@ -131,7 +137,11 @@ class MovimientoStockForm(forms.ModelForm):
             "cantidad": "Cantidad",
             "motivo": "Motivo (opcional)"
         }
-        
+
+    # Stock que se le mostró al usuario (GET): el ajuste se aplica sólo si
+    # sigue siendo ese (ver registrar_movimiento).
+    stock_esperado = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
     def __init__(self, *args, **kwargs):
         # Sacamos la instancia del producto de los kwargs para usarla en la validación y el layout
         self.producto = kwargs.pop("producto", None)
@@ -147,9 +157,11 @@ class MovimientoStockForm(forms.ModelForm):
                 <strong>Stock actual:</strong> {self.producto.stock}
             </div>
             """
+            self.fields["stock_esperado"].initial = self.producto.stock
 
         self.helper.layout = Layout(
             HTML(stock_info),  # Insertamos la información del stock antes de los campos
+            Field("stock_esperado"),
             Field("tipo"),
             Field("cantidad"),
             Field("motivo"),
@@ -194,6 +206,9 @@ class AjusteStockForm(forms.Form):
         label="Motivo del Ajuste",
         help_text="Explica por qué estás ajustando el stock (opcional)."
     )
+    # Stock que se le mostró al usuario (GET): el ajuste se aplica sólo si
+    # sigue siendo ese (ver registrar_movimiento).
+    stock_esperado = forms.IntegerField(widget=forms.HiddenInput, required=False)
 
     def __init__(self, *args, **kwargs):
         self.producto = kwargs.pop('producto', None)
@@ -211,9 +226,11 @@ class AjusteStockForm(forms.Form):
             """
             # Establecemos el valor inicial del campo 'cantidad' al stock actual
             self.fields['cantidad'].initial = self.producto.stock
-        
+            self.fields['stock_esperado'].initial = self.producto.stock
+
         self.helper.layout = Layout(
             HTML(stock_info),
+            Field('stock_esperado'),
             Field('cantidad'),
             Field('motivo'),
             ButtonHolder(
@@ -0,0 +1,140 @@
+"""Procesamiento de imágenes de productos fuera del request.
+
+Al guardar un producto con imagen nueva, ``Producto.save`` sólo marca las
+variantes como pendientes y ``encolar_procesamiento`` agenda el trabajo para
+después del commit en un pool de hilos del propio worker. Cada tamaño se
+genera en WebP y en el formato de origen; el original queda intacto.
+
+``Producto.imagen_variantes`` guarda el resultado::
+
+    {"original": "productos/<uuid>.png", "formato": "png",
+     "tamanos": {"lista": {"ancho": 50, "alto": 50,
+                           "webp": "productos/variantes/<uuid>-lista.webp",
+                           "png": "productos/variantes/<uuid>-lista.png"}, ...}}
+
+Si el worker se reinicia con trabajos en cola, ``manage.py procesar_imagenes``
+genera lo que haya quedado pendiente.
+"""
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, connection, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Ancho máximo de cada variante (None = tamaño original)
+TAMANOS = {
+    'lista': 50,
+    'detalle': 480,
+    'completa': None,
+}
+
+# Formatos de origen que se conservan; el resto (gif, bmp, ...) se guarda como PNG
+_FORMATOS_ORIGEN = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'PRODUCTO_IMAGENES_HILOS', 2),
+            thread_name_prefix='imagenes',
+        )
+    return _executor
+
+
+def encolar_procesamiento(producto):
+    """Agenda la generación de variantes para cuando se confirme la transacción.
+
+    Con ``PRODUCTO_IMAGENES_EN_SEGUNDO_PLANO = False`` se procesa en el mismo
+    hilo (tests, scripts).
+    """
+    producto_id, nombre = producto.pk, producto.imagen.name
+
+    def lanzar():
+        if getattr(settings, 'PRODUCTO_IMAGENES_EN_SEGUNDO_PLANO', True):
+            _get_executor().submit(_procesar_en_hilo, producto_id, nombre)
+        else:
+            procesar_imagen(producto_id, nombre)
+
+    transaction.on_commit(lanzar)
+
+
+def _procesar_en_hilo(producto_id, nombre):
+    # Cada hilo usa su propia conexión; hay que cerrarla al terminar
+    close_old_connections()
+    try:
+        procesar_imagen(producto_id, nombre)
+    finally:
+        connection.close()
+
+
+def _guardar(storage, imagen, nombre, formato):
+    buffer = io.BytesIO()
+    if formato == 'jpg':
+        imagen.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+    elif formato == 'webp':
+        imagen.save(buffer, 'WEBP', quality=80, method=4)
+    else:
+        imagen.save(buffer, 'PNG', optimize=True)
+    return storage.save(nombre, ContentFile(buffer.getvalue()))
+
+
+def generar_variantes(storage, nombre):
+    """Genera los tamaños de ``TAMANOS`` a partir del archivo ``nombre``.
+
+    Devuelve el dict que se guarda en ``Producto.imagen_variantes``.
+    """
+    with storage.open(nombre, 'rb') as archivo:
+        with Image.open(archivo) as original:
+            formato = _FORMATOS_ORIGEN.get(original.format, 'png')
+            imagen = ImageOps.exif_transpose(original)
+            if imagen.mode not in ('RGB', 'RGBA'):
+                imagen = imagen.convert('RGBA' if imagen.has_transparency_data else 'RGB')
+            imagen.load()
+
+    raiz, extension = os.path.splitext(nombre)
+    base = os.path.join(os.path.dirname(nombre), 'variantes', os.path.basename(raiz))
+    extension = extension.lstrip('.').lower().replace('jpeg', 'jpg')
+    tamanos = {}
+    for tamano, ancho in TAMANOS.items():
+        if ancho is None or max(imagen.size) <= ancho:
+            copia = imagen
+        else:
+            copia = imagen.copy()
+            copia.thumbnail((ancho, ancho), Image.LANCZOS)
+        variante = {'ancho': copia.width, 'alto': copia.height}
+        variante['webp'] = _guardar(storage, copia, f'{base}-{tamano}.webp', 'webp')
+        if ancho is None and formato == extension:
+            # El tamaño completo en el formato de origen es el propio original
+            variante[formato] = nombre
+        elif formato != 'webp':
+            variante[formato] = _guardar(storage, copia, f'{base}-{tamano}.{formato}', formato)
+        tamanos[tamano] = variante
+    return {'original': nombre, 'formato': formato, 'tamanos': tamanos}
+
+
+def procesar_imagen(producto_id, nombre):
+    """Genera y registra las variantes de la imagen ``nombre`` del producto.
+
+    Si mientras tanto el producto cambió de imagen (o se eliminó) el
+    resultado se descarta sin pisar nada.
+    """
+    from .models import Producto
+    from .services import invalidar_catalogo
+
+    try:
+        variantes = generar_variantes(Producto._meta.get_field('imagen').storage, nombre)
+    except Exception:
+        logger.exception('No se pudo procesar la imagen %s del producto %s', nombre, producto_id)
+        return None
+    if Producto.objects.filter(pk=producto_id, imagen=nombre).update(imagen_variantes=variantes):
+        invalidar_catalogo()
+    return variantes
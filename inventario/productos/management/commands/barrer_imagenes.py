@@ -0,0 +1,58 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from productos.models import Producto
+from productos.storage import referencias_en_uso
+
+
+class Command(BaseCommand):
+    help = (
+        'Elimina los archivos de media/productos que ningún producto referencia '
+        '(ni como imagen ni como variante). Los archivos recientes se respetan '
+        'para no borrar subidas cuyo producto todavía no se guardó.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--minutos', type=int, default=60,
+            help='Antigüedad mínima (por fecha de modificación) para borrar un archivo. Por defecto 60.',
+        )
+        parser.add_argument(
+            '--simular', action='store_true',
+            help='Sólo informa qué se borraría.',
+        )
+
+    def handle(self, *args, **options):
+        storage = Producto._meta.get_field('imagen').storage
+        raiz = storage.path('productos')
+        if not os.path.isdir(raiz):
+            self.stdout.write('No hay imágenes.')
+            return
+
+        # Primero la lista de archivos y después las referencias: un archivo
+        # subido entre ambos pasos es reciente y queda protegido por --minutos.
+        limite = time.time() - options['minutos'] * 60
+        candidatos = []
+        for carpeta, _, archivos in os.walk(raiz):
+            for archivo in archivos:
+                ruta = os.path.join(carpeta, archivo)
+                stat = os.stat(ruta)
+                if stat.st_mtime < limite:
+                    nombre = os.path.relpath(ruta, storage.location).replace(os.sep, '/')
+                    candidatos.append((nombre, stat.st_size))
+
+        en_uso = referencias_en_uso()
+        huerfanos = [(nombre, tamano) for nombre, tamano in candidatos if nombre not in en_uso]
+        liberados = sum(tamano for _, tamano in huerfanos)
+
+        if not options['simular']:
+            for nombre, _ in huerfanos:
+                storage.delete(nombre)
+
+        accion = 'se borrarían' if options['simular'] else 'borrados'
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(huerfanos)} archivos huérfanos {accion} ({liberados / 1024 / 1024:.1f} MB); '
+            f'{len(en_uso)} archivos en uso.'
+        ))
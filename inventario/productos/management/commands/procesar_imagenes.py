@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from productos.imagenes import procesar_imagen
+from productos.models import Producto
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera las variantes (tamaños y WebP) de las imágenes de productos que '
+        'no las tienen, p. ej. imágenes anteriores al procesamiento en segundo '
+        'plano o trabajos que se perdieron al reiniciar un worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todas', action='store_true',
+            help='Regenera también las imágenes que ya tienen variantes.',
+        )
+
+    def handle(self, *args, **options):
+        productos = Producto.objects.exclude(imagen='').exclude(imagen__isnull=True)
+        procesadas = errores = 0
+        for pk, imagen, variantes in productos.values_list('pk', 'imagen', 'imagen_variantes').iterator():
+            if not options['todas'] and variantes.get('original') == imagen:
+                continue
+            if procesar_imagen(pk, imagen) is None:
+                errores += 1
+                self.stderr.write(f'#{pk}: no se pudo procesar {imagen}')
+            else:
+                procesadas += 1
+        self.stdout.write(self.style.SUCCESS(f'{procesadas} imágenes procesadas, {errores} con errores.'))
@@ -0,0 +1,45 @@
+# Índices de búsqueda de productos; ver productos/search.py
+
+from django.db import migrations
+
+from inventario.db import RunSQLSegunMotor
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0002_producto_stock_no_negativo'),
+    ]
+
+    operations = [
+        RunSQLSegunMotor(
+            'postgresql',
+            sql=[
+                "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+                "ALTER TABLE productos_producto ADD COLUMN busqueda tsvector GENERATED ALWAYS AS ("
+                " setweight(to_tsvector('spanish'::regconfig, coalesce(sku, '')), 'A')"
+                " || setweight(to_tsvector('spanish'::regconfig, nombre), 'A')"
+                " || setweight(to_tsvector('spanish'::regconfig, descripcion), 'B')"
+                ") STORED",
+                "CREATE INDEX productos_producto_busqueda_gin ON productos_producto USING gin (busqueda)",
+                "CREATE INDEX productos_producto_nombre_trgm ON productos_producto USING gin (nombre gin_trgm_ops)",
+                "CREATE INDEX productos_producto_sku_trgm ON productos_producto USING gin (sku gin_trgm_ops)",
+            ],
+            reverse_sql=[
+                "DROP INDEX IF EXISTS productos_producto_sku_trgm",
+                "DROP INDEX IF EXISTS productos_producto_nombre_trgm",
+                "DROP INDEX IF EXISTS productos_producto_busqueda_gin",
+                "ALTER TABLE productos_producto DROP COLUMN IF EXISTS busqueda",
+            ],
+        ),
+        RunSQLSegunMotor(
+            'sqlite',
+            sql=[
+                "CREATE VIRTUAL TABLE productos_producto_fts USING fts5("
+                "sku, nombre, descripcion, tokenize = 'unicode61 remove_diacritics 2')",
+                "INSERT INTO productos_producto_fts (rowid, sku, nombre, descripcion) "
+                "SELECT id, coalesce(sku, ''), nombre, descripcion FROM productos_producto",
+            ],
+            reverse_sql=["DROP TABLE IF EXISTS productos_producto_fts"],
+        ),
+    ]
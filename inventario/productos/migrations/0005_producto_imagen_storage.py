@@ -0,0 +1,20 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:40
+
+import productos.models
+import productos.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0004_producto_imagen_variantes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='producto',
+            name='imagen',
+            field=models.ImageField(blank=True, help_text='Formatos permitidos: jpg, png, gif. Tamaño maximo: 5MB', null=True, storage=productos.storage.ContenidoHashStorage(), upload_to=productos.models.get_image_path, validators=[productos.models.validate_image_size], verbose_name='Imagen'),
+        ),
+    ]
@@ -2,9 +2,11 @@ from django.db import models
 import os
 import uuid
 from django.core.exceptions import ValidationError
-from PIL import Image
 from django.utils import timezone
 
+from .imagenes import encolar_procesamiento
+from .storage import ContenidoHashStorage
+
 def validate_image_size(image):
     filesize = image.file.size
     megabyte_limit = 5.0
@@ -12,9 +14,10 @@ def validate_image_size(image):
         raise ValidationError (f"El tamaño maximo permitido es de {megabyte_limit} MB")
     
 def get_image_path(instance, filename):
+    # El nombre final lo pone ContenidoHashStorage (hash del contenido); acá
+    # sólo se elige la carpeta y se conserva la extensión.
     ext = filename.split('.')[-1]
-    filename = f"{uuid.uuid4()}.{ext}"
-    return os.path.join("productos", filename)
+    return os.path.join("productos", f"imagen.{ext}")
 
 class Producto(models.Model):
     """Model definition for Producto."""
@@ -27,12 +30,15 @@ class Producto(models.Model):
     stock_minimo = models.IntegerField(default=5, verbose_name="Stock Minimo")
     imagen = models.ImageField(
         "Imagen", 
-        upload_to=get_image_path, 
+        upload_to=get_image_path,
+        storage=ContenidoHashStorage(),
         validators=[validate_image_size],
         blank=True,
         null=True,
         help_text="Formatos permitidos: jpg, png, gif. Tamaño maximo: 5MB"
     )
+    # Tamaños y formatos generados a partir de `imagen` (ver productos.imagenes)
+    imagen_variantes = models.JSONField(default=dict, blank=True, editable=False)
     fecha_creacion = models.DateTimeField("Fecha de creacion", auto_now_add=True)
     fecha_actualizacion = models.DateTimeField("Fecha de creacion", auto_now=True)
 
@@ -43,6 +49,15 @@ class Producto(models.Model):
         verbose_name = 'Producto'
         verbose_name_plural = 'Productos'
         ordering = ['nombre']
+        constraints = [
+            # Última defensa contra la sobreventa: la base rechaza cualquier
+            # UPDATE que deje el stock negativo.
+            models.CheckConstraint(
+                condition=models.Q(stock__gte=0),
+                name='producto_stock_no_negativo',
+                violation_error_message='El stock no puede ser negativo.',
+            ),
+        ]
 
     def __str__(self):
         """Unicode representation of Producto."""
@@ -53,18 +68,23 @@ class Producto(models.Model):
         if not self.sku:
             self.sku = uuid.uuid4().hex[:8].upper()
 
+        # Las variantes (miniaturas, WebP) se generan en segundo plano después
+        # del commit; acá sólo se detecta que la imagen cambió.
+        imagen_nueva = bool(self.imagen) and self.imagen_variantes.get('original') != self.imagen.name
+        if imagen_nueva or not self.imagen:
+            self.imagen_variantes = {}
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'imagen_variantes'}
+
         super().save(*args, **kwargs)
 
-        # Procesar imagen (si existe) — se corrige referencia a self.imagen
-        if self.imagen:
-            try:
-                img = Image.open(self.imagen.path)
-                if img.height > 300 or img.width > 300:
-                    output_size = (300, 300)
-                    img.thumbnail(output_size)
-                    img.save(self.imagen.path)
-            except Exception as e:
-                print(f"Error al procesar la imagen {e}")
+        if imagen_nueva:
+            encolar_procesamiento(self)
+
+    def imagen_variante(self, tamano):
+        """Variante ``tamano`` de ``imagen_variantes`` o ``None`` si aún no se generó."""
+        return self.imagen_variantes.get('tamanos', {}).get(tamano)
 
     @property
     def necesita_reposicion(self):
@@ -0,0 +1,148 @@
+"""Búsqueda de productos por texto.
+
+Cada motor usa su propio índice:
+
+- PostgreSQL: columna generada ``busqueda`` (``tsvector`` con sku y nombre de
+  peso A y descripción de peso B) con índice GIN, más índices trigram
+  (``pg_trgm``) sobre nombre y sku para coincidencias parciales o con errores
+  de tipeo. Los resultados se ordenan por ``ts_rank`` + ``similarity``.
+- SQLite: tabla virtual FTS5 ``productos_producto_fts`` (sin acentos, por
+  prefijo) que mantienen sincronizada las señales de ``productos.signals``.
+  Los resultados se ordenan por ``bm25()`` del índice, con sku y nombre por
+  encima de la descripción (como los pesos A y B de PostgreSQL); se toman
+  los ``LIMITE_FTS`` mejores.
+
+En ambos casos un SKU o id exacto tiene ``prioridad`` 0 y sale primero.
+"""
+import re
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.fields import BooleanField
+
+from .models import Producto
+
+TABLA_FTS = 'productos_producto_fts'
+
+# Orden de resultados para KeysetPaginationMixin (el id lo hace total)
+ORDEN_BUSQUEDA = ('prioridad', '-relevancia', 'nombre', 'id')
+
+# ts_rank, similarity y bm25 devuelven reales; se escalan a entero para que
+# el cursor compare por igualdad sin problemas de redondeo.
+_ESCALA_RELEVANCIA = 1000000
+
+# En SQLite sólo los LIMITE_FTS resultados más relevantes del índice de texto
+# llegan a la consulta principal (más los SKU o id exactos)
+LIMITE_FTS = 200
+
+# Pesos de bm25() por columna de la tabla FTS5 (sku, nombre, descripcion),
+# los de ts_rank para A, A y B
+_PESOS_FTS = (1.0, 1.0, 0.4)
+
+
+def _terminos(q):
+    return re.findall(r'\w+', q)
+
+
+def _coincidencia_exacta(q):
+    """SKU o id exactos: se resuelven por índice único / clave primaria."""
+    exacta = Q(sku__in={q, q.upper()})
+    # isdigit() también acepta dígitos como '²', que int() rechaza
+    if q.isascii() and q.isdigit():
+        exacta |= Q(pk=int(q))
+    return exacta
+
+
+def _postgresql(queryset, q):
+    tabla = connection.ops.quote_name(Producto._meta.db_table)
+    tsquery = "websearch_to_tsquery('spanish', %s)"
+    coincide = RawSQL(
+        f"{tabla}.busqueda @@ {tsquery} OR {tabla}.nombre %% %s OR {tabla}.sku ILIKE %s",
+        (q, q, f"%{q}%"),
+        output_field=BooleanField(),
+    )
+    relevancia = RawSQL(
+        f"CAST((ts_rank({tabla}.busqueda, {tsquery}) + similarity({tabla}.nombre, %s)) * {_ESCALA_RELEVANCIA} AS integer)",
+        (q, q),
+        output_field=IntegerField(),
+    )
+    return queryset.filter(coincide | _coincidencia_exacta(q)), relevancia
+
+
+def _sqlite(queryset, q):
+    terminos = _terminos(q)
+    condicion = _coincidencia_exacta(q)
+    if not terminos:
+        return queryset.filter(condicion), Value(0)
+    # Cada término entre comillas (FTS5 no interpreta operadores) y con *
+    # para buscar por prefijo; los términos se combinan con AND.
+    consulta = ' '.join('"%s"*' % t for t in terminos)
+    # Una sola pasada por el índice: el puntaje (columna ``rank``, bm25 con
+    # _PESOS_FTS; negativo y más chico cuanto mejor) sólo existe dentro de la
+    # consulta MATCH, así que se leen ahí los mejores LIMITE_FTS y la
+    # consulta principal los busca por clave primaria.
+    pesos = ', '.join(map(str, _PESOS_FTS))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid, rank FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s AND rank MATCH %s "
+            f"ORDER BY rank LIMIT %s",
+            (consulta, f'bm25({pesos})', LIMITE_FTS),
+        )
+        filas = cursor.fetchall()
+    por_relevancia = defaultdict(list)
+    for rowid, puntaje in filas:
+        por_relevancia[round(-puntaje * _ESCALA_RELEVANCIA)].append(rowid)
+    # Un SKU o id exacto puede no estar entre ellos: relevancia 0
+    relevancia = Case(
+        *[When(pk__in=ids, then=Value(valor)) for valor, ids in por_relevancia.items()],
+        default=Value(0), output_field=IntegerField(),
+    )
+    return queryset.filter(condicion | Q(pk__in=[rowid for rowid, _ in filas])), relevancia
+
+
+def buscar_productos(queryset, q):
+    """Filtra ``queryset`` por ``q`` y anota ``prioridad`` y ``relevancia``.
+
+    Ordenar el resultado por ``ORDEN_BUSQUEDA``. En motores sin índice de
+    texto propio se cae a ``icontains``.
+    """
+    q = q.strip()
+    if not q:
+        return queryset.annotate(prioridad=Value(1), relevancia=Value(0))
+
+    if connection.vendor == 'postgresql':
+        queryset, relevancia = _postgresql(queryset, q)
+    elif connection.vendor == 'sqlite':
+        queryset, relevancia = _sqlite(queryset, q)
+    else:
+        queryset = queryset.filter(
+            Q(sku__icontains=q) | Q(nombre__icontains=q) | Q(descripcion__icontains=q) | _coincidencia_exacta(q)
+        )
+        relevancia = Value(0)
+
+    return queryset.annotate(
+        prioridad=Case(When(_coincidencia_exacta(q), then=Value(0)), default=Value(1)),
+        relevancia=relevancia,
+    )
+
+
+def indexar_producto(producto):
+    """Reemplaza la fila de ``producto`` en la tabla FTS5 (sólo SQLite)."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [producto.pk])
+        cursor.execute(
+            f"INSERT INTO {TABLA_FTS} (rowid, sku, nombre, descripcion) VALUES (%s, %s, %s, %s)",
+            [producto.pk, producto.sku or '', producto.nombre, producto.descripcion],
+        )
+
+
+def desindexar_producto(producto_id):
+    """Quita el producto de la tabla FTS5 (sólo SQLite)."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {TABLA_FTS} WHERE rowid = %s", [producto_id])
@@ -0,0 +1,211 @@
+"""Operaciones de stock que deben ser atómicas frente a escrituras concurrentes.
+
+Todas las modificaciones de ``Producto.stock`` pasan por acá para que el
+valor se calcule en la base de datos (``stock = stock - n``) y no en Python,
+donde dos workers de gunicorn podrían pisarse.
+"""
+from django.db import connection, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+
+from inventario.cache import invalidar
+from .models import MovimientoStock, Producto
+
+# Grupo de caché del listado de productos (ver inventario.cache)
+CATALOGO = 'catalogo'
+
+# Productos por sentencia UPDATE en descontar_stock
+LOTE_DESCUENTO = 500
+
+
+def invalidar_catalogo():
+    """Invalida las páginas y filas cacheadas del listado de productos."""
+    invalidar(CATALOGO)
+
+
+class StockInsuficienteError(Exception):
+    """No hay stock suficiente para uno o más productos.
+
+    ``faltantes`` es una lista de ``(producto, solicitado)`` donde
+    ``producto.stock`` refleja el valor leído bajo bloqueo.
+    """
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        detalle = '; '.join(f"{p.nombre}: {p.stock} disponibles" for p, _ in faltantes)
+        super().__init__(f"Stock insuficiente para: {detalle}")
+
+
+class StockModificadoError(Exception):
+    """El stock cambió entre que se leyó y se intentó ajustar.
+
+    ``stock_actual`` es el valor vigente en la base.
+    """
+
+    def __init__(self, producto, stock_actual):
+        self.producto = producto
+        self.stock_actual = stock_actual
+        super().__init__(f"El stock de {producto.nombre} cambió; ahora es {stock_actual}")
+
+
+def descontar_stock(cantidades):
+    """Descuenta stock de varios productos con una sentencia UPDATE por lote.
+
+    ``cantidades`` es un dict ``{producto_id: cantidad}``. Debe llamarse dentro
+    de ``transaction.atomic()``. Las filas se bloquean en orden de id para que
+    dos ventas con los mismos productos no puedan producir un deadlock; luego
+    se aplica ``UPDATE ... SET stock = stock - CASE ... WHERE stock >= CASE ...``
+    (uno solo salvo que haya más de ``LOTE_DESCUENTO`` productos).
+
+    Devuelve un dict ``{producto_id: Producto}`` con los productos bloqueados
+    (precio y stock previos al descuento). Lanza ``StockInsuficienteError`` si
+    algún producto no alcanza; en ese caso no se modifica ninguna fila.
+    """
+    cantidades = {pid: cant for pid, cant in cantidades.items() if cant}
+    if not cantidades:
+        return {}
+
+    ids = sorted(cantidades)
+    productos = {
+        p.pk: p
+        for p in Producto.objects.select_for_update()
+        .filter(pk__in=ids)
+        .order_by('pk')
+        .only('pk', 'nombre', 'sku', 'precio', 'stock', 'stock_minimo')
+    }
+
+    faltantes = [
+        (productos[pid], cantidades[pid])
+        if pid in productos
+        # El producto fue eliminado después de validar el formulario
+        else (Producto(pk=pid, nombre=f'#{pid}', stock=0), cantidades[pid])
+        for pid in ids
+        if pid not in productos or productos[pid].stock < cantidades[pid]
+    ]
+    if faltantes:
+        raise StockInsuficienteError(faltantes)
+
+    # La condición stock >= n se repite en el WHERE: con el bloqueo anterior
+    # ya está garantizada, pero así la regla también queda del lado de la base.
+    # Un lote de ventas puede tocar miles de productos: se actualizan de a
+    # LOTE_DESCUENTO para no pasar el límite de parámetros de SQLite.
+    actualizados = 0
+    for inicio in range(0, len(ids), LOTE_DESCUENTO):
+        parte = ids[inicio:inicio + LOTE_DESCUENTO]
+        cantidad = Case(*[When(pk=pid, then=Value(cantidades[pid])) for pid in parte], default=Value(0))
+        actualizados += Producto.objects.filter(pk__in=parte, stock__gte=cantidad).update(
+            stock=F('stock') - cantidad,
+        )
+    if actualizados != len(ids):
+        # Sólo posible en bases sin SELECT ... FOR UPDATE: otra transacción
+        # cambió el stock entre la lectura y el UPDATE. Quien llama revierte.
+        raise StockInsuficienteError([(productos[pid], cantidades[pid]) for pid in ids])
+
+    # UPDATE en bloque: no dispara señales
+    invalidar_catalogo()
+    return productos
+
+
+def _actualizar_stock(producto_id, asignacion, params, condicion='', condicion_params=()):
+    """Ejecuta ``UPDATE ... SET stock = <asignacion> ... RETURNING stock``.
+
+    Devuelve el stock resultante o ``None`` si ninguna fila cumplió la
+    condición. RETURNING está soportado por PostgreSQL y SQLite >= 3.35.
+    """
+    qn = connection.ops.quote_name
+    meta = Producto._meta
+    stock = qn(meta.get_field('stock').column)
+    sql = (
+        f"UPDATE {qn(meta.db_table)} SET {stock} = {asignacion.format(stock=stock)} "
+        f"WHERE {qn(meta.pk.column)} = %s{condicion.format(stock=stock)} RETURNING {stock}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, producto_id, *condicion_params])
+        fila = cursor.fetchone()
+    return fila[0] if fila else None
+
+
+def registrar_movimiento(producto, tipo, cantidad, motivo=None, usuario='Sistema'):
+    """Aplica un movimiento de stock y lo deja registrado en el historial.
+
+    - ``entrada``: suma ``cantidad``.
+    - ``salida``: resta ``cantidad`` sólo si alcanza el stock; si no, lanza
+      ``StockInsuficienteError``.
+    - ``ajuste``: ``cantidad`` es el nuevo stock absoluto. El ajuste se aplica
+      sólo si el stock sigue siendo ``producto.stock`` (el valor que vio el
+      usuario); si cambió, lanza ``StockModificadoError``. El movimiento guarda
+      la diferencia con signo, para que la suma del historial dé el stock.
+
+    Son dos sentencias (UPDATE ... RETURNING e INSERT) en una transacción.
+    Devuelve el stock resultante y actualiza ``producto.stock``.
+    """
+    with transaction.atomic():
+        if tipo == 'entrada':
+            nuevo = _actualizar_stock(producto.pk, '{stock} + %s', [cantidad])
+            delta = cantidad
+        elif tipo == 'salida':
+            nuevo = _actualizar_stock(producto.pk, '{stock} - %s', [cantidad], ' AND {stock} >= %s', [cantidad])
+            if nuevo is None:
+                raise StockInsuficienteError([(producto, cantidad)])
+            delta = cantidad
+        elif tipo == 'ajuste':
+            anterior = producto.stock
+            nuevo = _actualizar_stock(producto.pk, '%s', [cantidad], ' AND {stock} = %s', [anterior])
+            if nuevo is None:
+                actual = Producto.objects.filter(pk=producto.pk).values_list('stock', flat=True).first()
+                raise StockModificadoError(producto, actual)
+            delta = cantidad - anterior
+        else:
+            raise ValueError(f"Tipo de movimiento desconocido: {tipo}")
+
+        if nuevo is None:
+            raise Producto.DoesNotExist(f"No existe el producto {producto.pk}")
+
+        if delta:
+            MovimientoStock.objects.create(
+                producto=producto,
+                tipo=tipo,
+                cantidad=delta,
+                motivo=motivo,
+                fecha=timezone.now(),
+                usuario=usuario,
+            )
+
+    producto.stock = nuevo
+    return nuevo
+
+
+def registrar_stock_inicial(producto, usuario='Sistema'):
+    """Registra como entrada el stock con el que se dio de alta un producto.
+
+    El stock ya quedó guardado al crear el producto, así que sólo se inserta
+    el movimiento.
+    """
+    if producto.stock > 0:
+        MovimientoStock.objects.create(
+            producto=producto,
+            tipo='entrada',
+            cantidad=producto.stock,
+            motivo='Stock inicial',
+            fecha=timezone.now(),
+            usuario=usuario,
+        )
+
+
+
+def saldos_por_producto():
+    """Stock que resulta del historial, como ``(producto_id, saldo)``.
+
+    Entradas y ajustes suman su cantidad (los ajustes guardan la diferencia
+    con signo) y las salidas restan. Es un único agregado agrupado por
+    producto; los productos sin movimientos no aparecen (saldo 0).
+    """
+    return (
+        MovimientoStock.objects.order_by()
+        .values('producto_id')
+        .annotate(saldo=Sum(Case(
+            When(tipo='salida', then=-F('cantidad')),
+            default=F('cantidad'),
+        )))
+        .values_list('producto_id', 'saldo')
+    )
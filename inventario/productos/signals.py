@@ -0,0 +1,41 @@
+"""Señales de productos.
+
+- Mantienen el índice de búsqueda de SQLite (ver ``search``). En PostgreSQL
+  la columna ``busqueda`` es generada y la base la mantiene sola.
+- Cuentan los movimientos de stock para ``/metrics`` (los que se crean en
+  bloque al vender se cuentan en ``ventas.services``).
+- Invalidan la caché del catálogo (listado de productos) ante cualquier cambio
+  de productos o movimientos. Las operaciones en bloque que no disparan señales
+  (``update``, ``bulk_create``, SQL directo) invalidan explícitamente.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from inventario.metricas import contar_movimientos
+from .models import MovimientoStock, Producto
+from .search import desindexar_producto, indexar_producto
+from .services import invalidar_catalogo
+
+
+@receiver(post_save, sender=Producto, dispatch_uid='productos_indexar_busqueda')
+def indexar_busqueda(sender, instance, raw=False, **kwargs):
+    indexar_producto(instance)
+
+
+@receiver(post_delete, sender=Producto, dispatch_uid='productos_desindexar_busqueda')
+def desindexar_busqueda(sender, instance, **kwargs):
+    desindexar_producto(instance.pk)
+
+
+@receiver(post_save, sender=Producto, dispatch_uid='productos_invalidar_catalogo_producto')
+@receiver(post_delete, sender=Producto, dispatch_uid='productos_invalidar_catalogo_producto_baja')
+@receiver(post_save, sender=MovimientoStock, dispatch_uid='productos_invalidar_catalogo_movimiento')
+@receiver(post_delete, sender=MovimientoStock, dispatch_uid='productos_invalidar_catalogo_movimiento_baja')
+def catalogo_modificado(sender, **kwargs):
+    invalidar_catalogo()
+
+
+@receiver(post_save, sender=MovimientoStock, dispatch_uid='productos_contar_movimiento')
+def contar_movimiento(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        contar_movimientos(instance.tipo)
@@ -0,0 +1,77 @@
+"""Almacenamiento de imágenes de productos por contenido.
+
+Cada archivo se guarda como ``<carpeta>/<sha256[:2]>/<sha256><ext>``: subir
+la misma foto para otro producto (o de nuevo al editar) reutiliza el archivo
+existente en lugar de escribir una copia. Como un archivo puede estar en uso
+por varios productos, no se borra al cambiar o eliminar la imagen; el comando
+``barrer_imagenes`` elimina en bloque los que ya nadie referencia (ver
+``referencias_en_uso``).
+"""
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+class ContenidoHashStorage(FileSystemStorage):
+    """``FileSystemStorage`` que nombra los archivos por su SHA-256.
+
+    De ``name`` sólo se conservan la carpeta y la extensión. Los nombres
+    nunca cambian de contenido, así que se pueden cachear para siempre.
+    """
+
+    def __init__(self, **kwargs):
+        # Dos subidas simultáneas del mismo archivo escriben los mismos bytes
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def nombre_por_contenido(name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        hexdigest = digest.hexdigest()
+        carpeta = os.path.dirname(str(name).replace('\\', '/'))
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(carpeta, hexdigest[:2], hexdigest + extension).replace('\\', '/')
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.nombre_por_contenido(name, content)
+        if self.exists(name):
+            # Ya existe: se reutiliza. Se actualiza la fecha para que el barrido
+            # no lo tome como huérfano antes de que se confirme el producto.
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length=max_length)
+
+
+def referencias_en_uso():
+    """Nombres de archivo referenciados por algún producto.
+
+    Un archivo compartido por varios productos sigue en uso mientras al menos
+    uno lo referencie, en ``Producto.imagen`` o entre las variantes de
+    ``Producto.imagen_variantes``. Es un solo ``SELECT`` leído por lotes.
+    """
+    from .models import Producto
+
+    nombres = set()
+    filas = (
+        Producto.objects.exclude(imagen='').exclude(imagen__isnull=True)
+        .values_list('imagen', 'imagen_variantes')
+        .iterator(chunk_size=2000)
+    )
+    for imagen, variantes in filas:
+        nombres.add(imagen)
+        for variante in (variantes or {}).get('tamanos', {}).values():
+            nombres.update(v for k, v in variante.items() if k not in ('ancho', 'alto'))
+    return nombres
+
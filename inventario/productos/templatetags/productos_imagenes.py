@@ -0,0 +1,37 @@
+from django import template
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/imagen_producto.html')
+def imagen_producto(producto, tamano, sizes, clase='', estilo=''):
+    """``<picture>`` con ``srcset`` de las variantes de la imagen del producto.
+
+    ``tamano`` es la variante usada como ``src`` (``lista``, ``detalle`` o
+    ``completa``) y ``sizes`` el ancho con que se muestra, para que el
+    navegador elija la variante adecuada. Si las variantes todavía no se
+    generaron se usa la imagen original.
+    """
+    storage = producto.imagen.storage
+    variantes = producto.imagen_variantes.get('tamanos', {})
+    formato = producto.imagen_variantes.get('formato')
+
+    def srcset(fmt):
+        return ', '.join(
+            f"{storage.url(v[fmt])} {v['ancho']}w"
+            for v in sorted(variantes.values(), key=lambda v: v['ancho'])
+            if fmt in v
+        )
+
+    variante = variantes.get(tamano, {})
+    return {
+        'src': storage.url(variante[formato]) if formato in variante else producto.imagen.url,
+        'srcset': srcset(formato) if variantes else '',
+        'srcset_webp': srcset('webp') if variantes and formato != 'webp' else '',
+        'ancho': variante.get('ancho'),
+        'alto': variante.get('alto'),
+        'sizes': sizes,
+        'alt': producto.nombre,
+        'clase': clase,
+        'estilo': estilo,
+    }
@@ -1,3 +1,440 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from inventario.pagination import _encode_cursor
+
+from .models import MovimientoStock, Producto
+from .search import LIMITE_FTS, ORDEN_BUSQUEDA, TABLA_FTS, buscar_productos
+from .services import (
+    LOTE_DESCUENTO,
+    StockInsuficienteError,
+    StockModificadoError,
+    descontar_stock,
+    registrar_movimiento,
+)
+
+
+class RegistrarMovimientoTests(TestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Yerba', descripcion='1kg', precio=Decimal('10.00'), stock=5)
+
+    def test_entrada_y_salida(self):
+        self.assertEqual(registrar_movimiento(self.producto, 'entrada', 3, usuario='ana'), 8)
+        self.assertEqual(registrar_movimiento(self.producto, 'salida', 8), 0)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 0)
+        self.assertEqual(MovimientoStock.objects.filter(producto=self.producto).count(), 2)
+
+    def test_salida_sin_stock(self):
+        with self.assertRaises(StockInsuficienteError):
+            registrar_movimiento(self.producto, 'salida', 6)
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 5)
+        self.assertFalse(MovimientoStock.objects.exists())
+
+    def test_ajuste_guarda_diferencia_con_signo(self):
+        registrar_movimiento(self.producto, 'ajuste', 2)
+        movimiento = MovimientoStock.objects.get()
+        self.assertEqual(movimiento.cantidad, -3)
+        self.assertEqual(self.producto.stock, 2)
+
+    def test_ajuste_con_stock_desactualizado(self):
+        Producto.objects.filter(pk=self.producto.pk).update(stock=9)
+        with self.assertRaises(StockModificadoError) as ctx:
+            registrar_movimiento(self.producto, 'ajuste', 2)
+        self.assertEqual(ctx.exception.stock_actual, 9)
+
+    def test_descontar_muchos_productos(self):
+        productos = Producto.objects.bulk_create(
+            Producto(nombre=f'P{i}', sku=f'P-{i}', descripcion='-', precio=Decimal('1.00'), stock=3)
+            for i in range(2 * LOTE_DESCUENTO + 1)
+        )
+        # Al último no le alcanza: no se descuenta ninguno
+        with self.assertRaises(StockInsuficienteError), transaction.atomic():
+            descontar_stock({p.pk: 4 if p is productos[-1] else 1 for p in productos})
+        self.assertFalse(Producto.objects.exclude(stock=3).exclude(pk=self.producto.pk).exists())
+
+        with transaction.atomic():
+            descontar_stock({p.pk: 1 + p.pk % 3 for p in productos})
+        self.assertEqual(
+            {p.pk: p.stock for p in Producto.objects.filter(pk__in=[p.pk for p in productos])},
+            {p.pk: 2 - p.pk % 3 for p in productos},
+        )
+
+    def test_dos_sentencias_por_movimiento(self):
+        with CaptureQueriesContext(connection) as ctx:
+            registrar_movimiento(self.producto, 'entrada', 1)
+        # Dentro de TestCase, atomic() agrega SAVEPOINT/RELEASE que no cuentan
+        sentencias = [q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(len(sentencias), 2)
+
+
+class StockDesdeFormulariosTests(TestCase):
+    def setUp(self):
+        self.producto = Producto.objects.create(nombre='Yerba', descripcion='1kg', precio=Decimal('10.00'), stock=5)
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+
+    def test_ajuste_compara_con_el_stock_que_vio_el_usuario(self):
+        url = reverse('productos:ajustar_stock', args=[self.producto.pk])
+        self.assertContains(self.client.get(url), 'name="stock_esperado" value="5"')
+        # Una venta descuenta mientras el formulario está abierto
+        Producto.objects.filter(pk=self.producto.pk).update(stock=3)
+
+        response = self.client.post(url, {'cantidad': 8, 'stock_esperado': 5})
+        self.assertContains(response, 'El stock cambió mientras lo ajustabas (ahora es 3)')
+        self.assertContains(response, 'name="stock_esperado" value="3"')
+        self.client.post(url, {'cantidad': 8, 'stock_esperado': 3})
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 8)
+        self.assertEqual(MovimientoStock.objects.get().cantidad, 5)
+
+    def test_editar_producto_no_toca_el_stock(self):
+        url = reverse('productos:producto_update', args=[self.producto.pk])
+        self.assertNotContains(self.client.get(url), 'name="stock"')
+        Producto.objects.filter(pk=self.producto.pk).update(stock=2)
+        self.client.post(url, {
+            'nombre': 'Yerba suave', 'descripcion': '1kg', 'precio': '11.00', 'stock': 50, 'stock_minimo': 5,
+        })
+        self.producto.refresh_from_db()
+        self.assertEqual((self.producto.nombre, self.producto.stock), ('Yerba suave', 2))
+
+
+class ReconcileStockTests(TestCase):
+    def test_detecta_y_repara_diferencias(self):
+        ok = Producto.objects.create(nombre='Ok', descripcion='-', precio=Decimal('1.00'), stock=0)
+        registrar_movimiento(ok, 'entrada', 4)
+        registrar_movimiento(ok, 'salida', 1)
+        roto = Producto.objects.create(nombre='Roto', descripcion='-', precio=Decimal('1.00'), stock=0)
+        registrar_movimiento(roto, 'entrada', 5)
+        registrar_movimiento(roto, 'ajuste', 2)
+        Producto.objects.filter(pk=roto.pk).update(stock=7)
+
+        salida = StringIO()
+        call_command('reconcile_stock', stdout=salida)
+        self.assertIn('1 productos con diferencias', salida.getvalue())
+
+        call_command('reconcile_stock', '--reparar', stdout=StringIO())
+        roto.refresh_from_db()
+        ok.refresh_from_db()
+        self.assertEqual((roto.stock, ok.stock), (2, 3))
+
+    def test_reparar_exige_el_historial_completo(self):
+        MigrationRecorder.Migration.objects.filter(app='ventas', name='0006_historial_movimientos').delete()
+        with self.assertRaisesMessage(CommandError, '0006_historial_movimientos'):
+            call_command('reconcile_stock', '--reparar', stdout=StringIO())
+
+
+class ProductoListPaginacionTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('stock', password='x'))
+        # Nombres repetidos para que el desempate por id sea necesario
+        for i in range(12):
+            Producto.objects.create(nombre=f'Prod {i // 3}', descripcion='-', precio=Decimal('1.00'), stock=i)
+        self.esperado = list(Producto.objects.order_by('nombre', 'id').values_list('pk', flat=True))
+
+    def recorrer(self, url, params=None):
+        vistos, paginas, cursor = [], [], None
+        while True:
+            response = self.client.get(url, {**(params or {}), **({'cursor': cursor} if cursor else {})})
+            page = response.context['page_obj']
+            paginas.append(page)
+            vistos += [p.pk for p in page]
+            if not page.has_next():
+                return vistos, paginas
+            cursor = page.next_cursor
+
+    def test_recorre_hacia_adelante_y_atras_sin_huecos(self):
+        url = reverse('productos:producto_list')
+        vistos, paginas = self.recorrer(url)
+        self.assertEqual(vistos, self.esperado)
+        self.assertEqual(len(paginas), 3)
+        self.assertFalse(paginas[0].has_previous())
+
+        # Volver desde la última página reproduce las anteriores
+        response = self.client.get(url, {'cursor': paginas[-1].previous_cursor})
+        self.assertEqual([p.pk for p in response.context['page_obj']], self.esperado[5:10])
+        response = self.client.get(url, {'cursor': response.context['page_obj'].previous_cursor})
+        page = response.context['page_obj']
+        self.assertEqual([p.pk for p in page], self.esperado[:5])
+        self.assertFalse(page.has_previous())
+
+    def test_conserva_filtros_y_no_cuenta_la_tabla(self):
+        url = reverse('productos:producto_list')
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'q': 'Prod', 'cursor': 'no-es-un-cursor'})
+        self.assertFalse(any('COUNT(' in q['sql'] for q in ctx.captured_queries))
+        self.assertEqual(response.context['querystring'], 'q=Prod')
+        self.assertEqual([p.pk for p in response.context['page_obj']], self.esperado[:5])
+
+
+    def test_cursor_adulterado_vuelve_a_la_primera_pagina(self):
+        url = reverse('productos:producto_list')
+        for params, valores in [
+            ({}, ['a', 'x']),
+            ({}, [None, 1]),
+            ({}, [['Prod 1'], {'id': 1}]),
+            ({'q': 'Prod'}, ['cero', 0, 'Prod 1', 1]),
+        ]:
+            cursor = _encode_cursor('n', valores)
+            with self.subTest(valores=valores):
+                response = self.client.get(url, {**params, 'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                page = response.context['page_obj']
+                self.assertEqual([p.pk for p in page], self.esperado[:5])
+                self.assertFalse(page.has_previous())
+
+
+class BusquedaProductosTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('stock', password='x'))
+        self.cafe = Producto.objects.create(nombre='Café molido', descripcion='Tostado medio', precio=Decimal('5.00'))
+        self.taza = Producto.objects.create(nombre='Taza', descripcion='Para café con leche', precio=Decimal('3.00'))
+        self.otro = Producto.objects.create(nombre='Azúcar', descripcion='Blanca', precio=Decimal('1.00'))
+
+    def buscar(self, q):
+        response = self.client.get(reverse('productos:producto_list'), {'q': q})
+        return [p.pk for p in response.context['page_obj']]
+
+    def test_busca_sin_acentos_y_por_prefijo(self):
+        self.assertEqual(set(self.buscar('cafe')), {self.cafe.pk, self.taza.pk})
+        self.assertEqual(self.buscar('azu'), [self.otro.pk])
+
+    def test_sku_o_id_exacto_salen_primero(self):
+        self.taza.sku = 'CAFE01'
+        self.taza.save()
+        self.assertEqual(self.buscar('cafe01')[0], self.taza.pk)
+        self.assertEqual(self.buscar(str(self.otro.pk))[0], self.otro.pk)
+        self.assertEqual(self.buscar('²'), [])
+
+    def test_ordena_por_relevancia(self):
+        # Coincidir en el nombre pesa más que en la descripción, aunque el
+        # nombre vaya después en orden alfabético. bm25 pondera por lo raro
+        # del término: con casi todo el catálogo coincidiendo no ordena.
+        for nombre in ('Yerba', 'Harina', 'Arroz', 'Fideos'):
+            Producto.objects.create(nombre=nombre, descripcion='1kg', precio=Decimal('1.00'))
+        self.assertEqual(self.buscar('leche'), [self.taza.pk])
+        yogur = Producto.objects.create(nombre='Yogur con leche', descripcion='1 litro', precio=Decimal('2.00'))
+        self.assertEqual(self.buscar('leche'), [yogur.pk, self.taza.pk])
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [fila[-1] for fila in cursor.fetchall()]
+
+    def test_una_sola_pasada_por_el_indice(self):
+        for i in range(LIMITE_FTS + 5):
+            Producto.objects.create(nombre=f'Café {i}', sku=f'CAF-{i}', descripcion='-', precio=Decimal('1.00'))
+        with CaptureQueriesContext(connection) as ctx:
+            resultado = list(buscar_productos(Producto.objects.all(), 'cafe').order_by(*ORDEN_BUSQUEDA)[:5])
+        self.assertEqual(len(resultado), 5)
+        self.assertEqual(len(ctx), 2)
+        indice, principal = (q['sql'] for q in ctx.captured_queries)
+
+        # El MATCH corre una vez y ordena FTS5 (sin B-tree temporal)
+        plan = self.plan(indice)
+        self.assertEqual(len(plan), 1)
+        self.assertTrue(plan[0].startswith(f'SCAN {TABLA_FTS} VIRTUAL TABLE INDEX'))
+        # La consulta principal no vuelve al índice de texto y busca los
+        # candidatos por clave primaria, sin recorrer la tabla
+        self.assertNotIn('MATCH', principal)
+        plan = self.plan(principal)
+        self.assertIn('SEARCH productos_producto USING INTEGER PRIMARY KEY (rowid=?)', plan)
+        self.assertFalse([paso for paso in plan if paso.startswith('SCAN')])
+
+    def test_indice_sigue_a_las_modificaciones(self):
+        self.otro.nombre = 'Yerba mate'
+        self.otro.save()
+        self.assertEqual(self.buscar('azucar'), [])
+        self.assertEqual(self.buscar('yerba'), [self.otro.pk])
+        self.otro.delete()
+        self.assertEqual(self.buscar('yerba'), [])
+
+
+def imagen_png(ancho, alto, color='red'):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (ancho, alto), color).save(buffer, 'PNG')
+    return SimpleUploadedFile('foto.png', buffer.getvalue(), content_type='image/png')
+
+
+class ImagenesProductoTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media, PRODUCTO_IMAGENES_EN_SEGUNDO_PLANO=False)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def test_variantes_se_generan_despues_del_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            producto = Producto.objects.create(
+                nombre='Mate', descripcion='-', precio=Decimal('1.00'), imagen=imagen_png(800, 400),
+            )
+        # El request no procesa la imagen: sólo agenda el trabajo
+        self.assertEqual(producto.imagen_variantes, {})
+        for callback in callbacks:
+            callback()
+
+        producto.refresh_from_db()
+        variantes = producto.imagen_variantes
+        self.assertEqual(variantes['original'], producto.imagen.name)
+        self.assertEqual(
+            {t: (v['ancho'], v['alto']) for t, v in variantes['tamanos'].items()},
+            {'lista': (50, 25), 'detalle': (480, 240), 'completa': (800, 400)},
+        )
+        self.assertEqual(variantes['tamanos']['completa']['png'], producto.imagen.name)
+        storage = producto.imagen.storage
+        for variante in variantes['tamanos'].values():
+            self.assertTrue(storage.exists(variante['webp']))
+            self.assertTrue(storage.exists(variante['png']))
+
+    def test_plantillas_usan_srcset(self):
+        self.client.force_login(User.objects.create_user('stock', password='x'))
+        with self.captureOnCommitCallbacks(execute=True):
+            producto = Producto.objects.create(
+                nombre='Mate', descripcion='-', precio=Decimal('1.00'), imagen=imagen_png(100, 100),
+            )
+        producto.refresh_from_db()
+        response = self.client.get(reverse('productos:producto_list'))
+        lista = producto.imagen.storage.url(producto.imagen_variante('lista')['png'])
+        self.assertContains(response, f'src="{lista}"')
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, ' 50w, ')
+
+    def test_misma_imagen_se_guarda_una_sola_vez(self):
+        uno = Producto.objects.create(nombre='A', descripcion='-', precio=Decimal('1.00'), imagen=imagen_png(20, 20))
+        dos = Producto.objects.create(nombre='B', descripcion='-', precio=Decimal('1.00'), imagen=imagen_png(20, 20))
+        self.assertEqual(uno.imagen.name, dos.imagen.name)
+        self.assertRegex(uno.imagen.name, r'^productos/[0-9a-f]{2}/[0-9a-f]{64}\.png$')
+        self.assertEqual(len(os.listdir(os.path.dirname(uno.imagen.path))), 1)
+
+    def test_barrido_borra_solo_archivos_sin_referencias(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            compartida = Producto.objects.create(nombre='A', descripcion='-', precio=Decimal('1.00'), imagen=imagen_png(600, 600))
+            otro = Producto.objects.create(nombre='B', descripcion='-', precio=Decimal('1.00'), imagen=imagen_png(600, 600, 'blue'))
+        otro.refresh_from_db()
+        vieja = [otro.imagen.name] + [v['webp'] for v in otro.imagen_variantes['tamanos'].values()]
+        with self.captureOnCommitCallbacks(execute=True):
+            otro.imagen = imagen_png(600, 600)
+            otro.save()
+
+        out = StringIO()
+        call_command('barrer_imagenes', minutos=0, stdout=out)
+        storage = compartida.imagen.storage
+        self.assertFalse(any(storage.exists(nombre) for nombre in vieja))
+        compartida.refresh_from_db()
+        self.assertTrue(storage.exists(compartida.imagen.name))
+        self.assertTrue(all(storage.exists(v['webp']) for v in compartida.imagen_variantes['tamanos'].values()))
+
+
+class ServirMediaTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.nombre = Producto._meta.get_field('imagen').storage.save('productos/x.png', imagen_png(10, 10))
+        self.factory = RequestFactory()
+
+    def get(self, **headers):
+        from inventario.media import servir_media
+        return servir_media(self.factory.get('/media/' + self.nombre, headers=headers), self.nombre)
+
+    def test_nombre_hash_es_inmutable_y_responde_304(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertEqual(self.get(if_none_match=etag).status_code, 304)
+
+    def test_rangos(self):
+        completo = b''.join(self.get().streaming_content)
+        response = self.get(range='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), completo[2:6])
+        self.assertEqual(response['Content-Range'], f'bytes 2-5/{len(completo)}')
+        self.assertEqual(b''.join(self.get(range='bytes=-3').streaming_content), completo[-3:])
+        self.assertEqual(self.get(range=f'bytes={len(completo)}-').status_code, 416)
+        # If-Range con un ETag viejo: archivo completo
+        self.assertEqual(self.get(range='bytes=2-5', if_range='"otro"').status_code, 200)
+
+    @override_settings(MEDIA_ENVIO='x-accel', MEDIA_ACCEL_PREFIJO='/interna/')
+    def test_delegar_envio_al_proxy(self):
+        response = self.get()
+        self.assertEqual(response['X-Accel-Redirect'], '/interna/' + self.nombre)
+        self.assertEqual(response.content, b'')
+
+
+class CatalogoCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user('stock', password='x'))
+        self.producto = Producto.objects.create(nombre='Yerba', descripcion='-', precio=Decimal('1.00'), stock=5)
+        self.url = reverse('productos:producto_list')
+
+    def get(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        return response, [q['sql'] for q in ctx.captured_queries if 'productos_producto' in q['sql']]
+
+    def test_segunda_visita_no_consulta_ni_renderiza(self):
+        response, consultas = self.get()
+        self.assertTrue(consultas)
+        response, consultas = self.get()
+        self.assertEqual(consultas, [])
+        self.assertIsNone(response.context)
+        self.assertContains(response, 'Yerba')
+
+    def test_cambios_invalidan_la_pagina(self):
+        self.get()
+        self.producto.nombre = 'Yerba mate'
+        self.producto.save()
+        self.assertContains(self.get()[0], 'Yerba mate')
+
+        # UPDATE en bloque (venta): no hay señal, invalida el servicio
+        with transaction.atomic():
+            descontar_stock({self.producto.pk: 2})
+        response, consultas = self.get()
+        self.assertTrue(consultas)
+        self.assertEqual(response.context['productos'][0].stock, 3)
+
+        registrar_movimiento(self.producto, 'entrada', 4)
+        self.assertEqual(self.get()[0].context['productos'][0].stock, 7)
+
+
+class ExportarProductosTests(TestCase):
+    def test_csv_respeta_la_busqueda(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        yerba = Producto.objects.create(nombre='Yerba Mate', sku='YER-1', descripcion='1kg', precio=Decimal('10.00'), stock=5)
+        Producto.objects.create(nombre='Azúcar', sku='AZU-1', descripcion='1kg', precio=Decimal('2.50'), stock=3)
+        response = self.client.get(reverse('productos:producto_exportar'), {'q': 'yerba'})
+        self.assertTrue(response.streaming)
+        contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertEqual(contenido.splitlines()[1:], [f'{yerba.pk},YER-1,Yerba Mate,1kg,10.00,5,5'])
+
+    def test_csv_no_exporta_formulas(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        producto = Producto.objects.create(
+            nombre='=HYPERLINK("http://x")', sku='-1', descripcion='@SUM(A1)', precio=Decimal('10.00'), stock=0,
+        )
+        response = self.client.get(reverse('productos:producto_exportar'))
+        contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertEqual(
+            contenido.splitlines()[1:], [f'{producto.pk},\'-1,"\'=HYPERLINK(""http://x"")",\'@SUM(A1),10.00,0,5'],
+        )
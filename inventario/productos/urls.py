@@ -5,6 +5,7 @@ app_name = 'productos'
 
 urlpatterns = [
     path('', views.ProductoListView.as_view(), name='producto_list'),
+    path('exportar/', views.ProductoExportarView.as_view(), name='producto_exportar'),
     path('nuevo/', views.ProductoCreateView.as_view(), name='producto_create'),
     path('<int:pk>/', views.ProductoDetailView.as_view(), name='producto_detail'),
     path('<int:pk>/editar/', views.ProductoUpdateView.as_view(), name='producto_update'),
@@ -6,18 +6,30 @@ from django.shortcuts import render
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from inventario.mixins import FriendlyPermissionRequiredMixin
+from inventario.pagination import KeysetPaginationMixin
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.shortcuts import get_object_or_404, redirect
-from django.db.models import Q, F
+from django.db.models import F
 from django.db.models.deletion import ProtectedError
 from django.db import transaction
-from django.utils import timezone
+from django.core.cache import cache
+from django.http import HttpResponse
+from inventario.cache import clave_versionada, version
+from inventario.exportar import EXPORTAR_LOTE, respuesta_exportacion
 from .models import Producto, MovimientoStock
 from .forms import ProductoForm, MovimientoStockForm, AjusteStockForm
+from .search import ORDEN_BUSQUEDA, buscar_productos
+from .services import (
+    CATALOGO,
+    StockInsuficienteError,
+    StockModificadoError,
+    registrar_movimiento,
+    registrar_stock_inicial,
+)
 
 
-class ProductoListView(ListView):
+class ProductoListView(KeysetPaginationMixin, ListView):
     # Temporarily allow anonymous access to the product list while debugging
     # the login/redirect loop. Re-add FriendlyPermissionRequiredMixin when
     # the redirect issue is resolved to restore permission checks.
@@ -26,6 +38,8 @@ class ProductoListView(ListView):
     template_name = "productos/producto_list.html"
     context_object_name = "productos"
     paginate_by = 5
+    # Paginación por cursor sobre (nombre, id): sin OFFSET ni COUNT(*)
+    keyset_ordering = ("nombre", "id")
 
     def get_queryset(self):
         """Sobrescribe para permitir el filtrado por stock bajo."""
@@ -35,22 +49,18 @@ class ProductoListView(ListView):
             # Filtra en la base de datos usando F() para eficiencia
             queryset = queryset.filter(stock__lt=F("stock_minimo"))
 
-        # Search across multiple fields: sku, nombre, descripcion, or id
-        q = self.request.GET.get('q')
+        # Búsqueda indexada (tsvector/trigram en PostgreSQL, FTS5 en SQLite);
+        # SKU o id exactos primero, después por relevancia
+        q = self.request.GET.get('q', '').strip()
         if q:
-            q = q.strip()
-            try:
-                pk = int(q)
-            except (ValueError, TypeError):
-                pk = None
+            queryset = buscar_productos(queryset, q)
 
-            queryset = queryset.filter(
-                Q(sku__icontains=q) | Q(nombre__icontains=q) | Q(descripcion__icontains=q) | (Q(pk=pk) if pk is not None else Q())
-            )
+        return queryset
 
-        # Hay un error aquí: 'order_by' debe ser una llamada a método, no una indexación
-        # Se ha corregido la sentencia
-        return queryset.order_by("nombre")
+    def get_keyset_ordering(self):
+        if self.request.GET.get('q', '').strip():
+            return ORDEN_BUSQUEDA
+        return super().get_keyset_ordering()
     
     def get_context_data(self, **kwargs):
         """Añade una variable al contexto para saber si se está filtrando por stock bajo."""
@@ -58,13 +68,53 @@ class ProductoListView(ListView):
         context["stock_bajo"] = self.request.GET.get("stock_bajo")
         # current search query for template
         context['q'] = self.request.GET.get('q', '')
-        # preserved GET params for pagination links (exclude 'page')
-        params = self.request.GET.copy()
-        if 'page' in params:
-            params.pop('page')
-        context['querystring'] = params.urlencode()
+        context['catalogo_version'] = version(CATALOGO)
         return context
-    
+
+    def get_clave_cache(self):
+        """Clave de la página renderizada, o ``None`` si no se debe cachear.
+
+        La página muestra el usuario en el menú, así que se cachea por usuario
+        (o anónimo). Si hay mensajes pendientes se renderiza normalmente para
+        que se muestren una sola vez.
+        """
+        if len(messages.get_messages(self.request)):
+            return None
+        usuario = self.request.user.pk if self.request.user.is_authenticated else 'anonimo'
+        return clave_versionada(CATALOGO, 'lista', usuario, sorted(self.request.GET.lists()))
+
+    def get(self, request, *args, **kwargs):
+        # Mientras el catálogo no cambie, se devuelve la página ya renderizada
+        # sin consultar productos ni renderizar la plantilla.
+        clave = self.get_clave_cache()
+        if clave is not None:
+            contenido = cache.get(clave)
+            if contenido is not None:
+                return HttpResponse(contenido)
+        response = super().get(request, *args, **kwargs)
+        if clave is not None:
+            response.add_post_render_callback(lambda r: cache.set(clave, r.content))
+        return response
+
+
+class ProductoExportarView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, ProductoListView):
+    """Exporta los productos del listado (mismos filtros) a CSV o XLSX.
+
+    GET ``q``, ``stock_bajo`` y ``formato`` (csv por defecto o xlsx); ver
+    ``inventario.exportar``.
+    """
+    permission_required = 'productos.view_producto'
+    columnas = ['ID', 'SKU', 'Nombre', 'Descripción', 'Precio', 'Stock', 'Stock mínimo']
+
+    def get(self, request, *args, **kwargs):
+        filas = (
+            self.get_queryset()
+            .order_by(*self.get_keyset_ordering())
+            .values_list('pk', 'sku', 'nombre', 'descripcion', 'precio', 'stock', 'stock_minimo')
+            .iterator(chunk_size=EXPORTAR_LOTE)
+        )
+        return respuesta_exportacion(request, 'productos', self.columnas, filas)
+
 
 class ProductoDetailView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, DetailView):
     permission_required = 'productos.view_producto'
@@ -93,17 +143,11 @@ class ProductoCreateView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, Cr
     def form_valid(self, form):
         """Sobrescribe para registrar un movimiento de stock inicial."""
         response = super().form_valid(form)
-
-        if form.cleaned_data["stock"] > 0:
-            MovimientoStock.objects.create(
-                producto=self.object, # self.object es la instancia del producto recién creado
-                tipo="entrada",
-                cantidad=form.cleaned_data["stock"],
-                motivo = "Stock inicial",
-                fecha = timezone.now(),
-                usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema"
-            )
-
+        # self.object es la instancia del producto recién creado
+        registrar_stock_inicial(
+            self.object,
+            usuario=self.request.user.username if self.request.user.is_authenticated else "Sistema",
+        )
         messages.success(self.request, "Producto creado exitosamente")
         return response
     
@@ -117,10 +161,13 @@ class ProductoUpdateView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, Up
     success_url = reverse_lazy("productos:producto_list")
 
     def form_valid(self, form):
-        """Sobrescribe para mostrar un mensaje de éxito."""
-        response = super().form_valid(form)
+        """Guarda sólo los campos del formulario (no ``stock``) y muestra un mensaje de éxito."""
+        # Un UPDATE de la fila entera escribiría el stock leído al abrir el
+        # formulario y pisaría las ventas o movimientos de mientras tanto.
+        self.object = form.save(commit=False)
+        self.object.save(update_fields=[*form.fields, "fecha_actualizacion"])
         messages.success(self.request, "Producto actualizado exitosamente")
-        return response
+        return redirect(self.get_success_url())
     
 
 class ProductoDeleteView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, DeleteView):
@@ -154,10 +201,13 @@ class ProductoDeleteView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, De
         # keep DB consistency.
         if request.POST.get('force'):
             from ventas.models import Venta, ItemVenta
+            from ventas.services import descontar_de_resumenes
             try:
                 with transaction.atomic():
                     related_items = ItemVenta.objects.filter(producto=self.object)
                     ventas_ids = set(related_items.values_list('venta_id', flat=True))
+                    # Keep the sales rollups in sync with the deleted sales
+                    descontar_de_resumenes(Venta.objects.filter(id__in=ventas_ids))
                     # Delete the related items
                     related_items.delete()
                     # Delete the ventas that referenced those items
@@ -180,6 +230,20 @@ class ProductoDeleteView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, De
             return redirect("productos:producto_detail", pk=self.object.pk)
     
 
+def _stock_visto(producto, form):
+    """Usa como stock "anterior" del ajuste el que vio el usuario al abrir el
+    formulario (campo oculto), no el que se acaba de leer en este POST."""
+    esperado = form.cleaned_data.get("stock_esperado")
+    if esperado is not None:
+        producto.stock = esperado
+
+
+def _stock_cambiado(form, stock_actual):
+    """Muestra el stock nuevo y lo deja como esperado para el próximo envío."""
+    form.data = form.data.copy()
+    form.data[form.add_prefix("stock_esperado")] = stock_actual
+
+
 class MovimientoStockCreateView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, CreateView):
     permission_required = 'productos.add_movimientostock'
     """Vista para registrar un nuevo movimiento de stock."""
@@ -187,105 +251,111 @@ class MovimientoStockCreateView(LoginRequiredMixin, FriendlyPermissionRequiredMi
     template_name = "productos/movimiento_form.html"
     form_class = MovimientoStockForm
 
+    def get_producto(self):
+        """Obtiene el producto una sola vez por request."""
+        if not hasattr(self, "producto"):
+            self.producto = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        return self.producto
+
     def get_form_kwargs(self):
         """Pasa la instancia del producto al formulario."""
         kwargs = super().get_form_kwargs()
-        kwargs["producto"] = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        kwargs["producto"] = self.get_producto()
         return kwargs
     
     def get_context_data(self, **kwargs):
         """Añade la instancia del producto al contexto de la plantilla."""
         context = super().get_context_data(**kwargs)
-        context["producto"] = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        context["producto"] = self.get_producto()
         return context
 
     def form_valid(self, form):
-        """Maneja la lógica de negocio para actualizar el stock."""
-        movimiento = form.save(commit=False)
-        movimiento.producto = get_object_or_404(Producto, pk=self.kwargs["pk"])
-        movimiento.usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema"
-
-        if movimiento.tipo == "entrada":
-            movimiento.producto.stock += movimiento.cantidad
-        elif movimiento.tipo == "salida":
-            # Si no hay suficiente stock, se añade un error y se re-renderiza el formulario
-            if movimiento.producto.stock >= movimiento.cantidad:
-                movimiento.producto.stock -= movimiento.cantidad
-            else:
-                form.add_error("cantidad", "No hay stock suficiente")
-                return self.form_invalid(form)
-        elif movimiento.tipo == "ajuste":
-            # Interpretar 'ajuste' desde el formulario de movimiento como "nuevo stock" absoluto.
-            # Es decir, el usuario introduce el valor de stock que quiere dejar, y guardamos
-            # en el movimiento la cantidad ajustada (delta absoluta) para audit trail.
-            antiguo = movimiento.producto.stock
-            nuevo = movimiento.cantidad
-            diferencia = nuevo - antiguo
-            movimiento.cantidad = abs(diferencia)
-            movimiento.producto.stock = nuevo
-        
-        # Guarda el producto actualizado y el nuevo movimiento
-        movimiento.producto.save()
-        movimiento.save()
+        """Aplica el movimiento con el servicio de stock (UPDATE atómico + historial)."""
+        producto = self.get_producto()
+        _stock_visto(producto, form)
+        try:
+            # Para 'ajuste' la cantidad del formulario es el nuevo stock absoluto.
+            registrar_movimiento(
+                producto,
+                form.cleaned_data["tipo"],
+                form.cleaned_data["cantidad"],
+                motivo=form.cleaned_data["motivo"],
+                usuario=self.request.user.username if self.request.user.is_authenticated else "Sistema",
+            )
+        except StockInsuficienteError:
+            form.add_error("cantidad", "No hay stock suficiente")
+            return self.form_invalid(form)
+        except StockModificadoError as e:
+            producto.stock = e.stock_actual
+            _stock_cambiado(form, e.stock_actual)
+            form.add_error("cantidad", f"El stock cambió mientras registrabas el movimiento (ahora es {e.stock_actual}). Revisá el valor.")
+            return self.form_invalid(form)
 
         messages.success(self.request, f"Movimiento de stock registrado exitosamente")
-        return redirect("productos:producto_detail", pk=movimiento.producto.pk)       
+        return redirect("productos:producto_detail", pk=producto.pk)       
 
 class AjusteStockView(FormView):
     """Vista para ajustar el stock de un producto a un valor específico."""
     form_class = AjusteStockForm
     template_name = "productos/ajuste_stock_form.html"
 
+    def get_producto(self):
+        """Obtiene el producto una sola vez por request."""
+        if not hasattr(self, "producto"):
+            self.producto = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        return self.producto
+
     def get_form_kwargs(self):
         """Pasa la instancia del producto al formulario para que pueda pre-llenar los datos."""
         kwargs = super().get_form_kwargs()
-        kwargs["producto"] = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        kwargs["producto"] = self.get_producto()
         return kwargs
     
     def get_context_data(self, **kwargs):
         """Añade la instancia del producto al contexto de la plantilla."""
         context = super().get_context_data(**kwargs)
-        context["producto"] = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        context["producto"] = self.get_producto()
         return context
 
     def form_valid(self, form):
         """
-        Calcula la diferencia de stock, registra un movimiento y actualiza el stock del producto.
+        Fija el stock al valor indicado y registra la diferencia como movimiento de 'ajuste'.
         """
-        producto = get_object_or_404(Producto, pk=self.kwargs["pk"])
+        producto = self.get_producto()
         nueva_cantidad = form.cleaned_data["cantidad"]
         motivo = form.cleaned_data["motivo"] or "Ajuste de stock"
+        _stock_visto(producto, form)
 
-        diferencia = nueva_cantidad - producto.stock
+        if nueva_cantidad == producto.stock:
+            messages.info(self.request, f"El stock no ha cambiado")
+            return redirect("productos:producto_detail", pk=producto.pk)
 
-        if diferencia != 0:
-            # Registrar como 'ajuste' para dejar claro que fue una corrección/manual
-            MovimientoStock.objects.create(
-                producto=producto,
-                tipo="ajuste",
-                cantidad=abs(diferencia),
+        try:
+            registrar_movimiento(
+                producto,
+                "ajuste",
+                nueva_cantidad,
                 motivo=motivo,
-                fecha=timezone.now(),
-                usuario = self.request.user.username if self.request.user.is_authenticated else "Sistema"
+                usuario=self.request.user.username if self.request.user.is_authenticated else "Sistema",
             )
+        except StockModificadoError as e:
+            producto.stock = e.stock_actual
+            _stock_cambiado(form, e.stock_actual)
+            form.add_error("cantidad", f"El stock cambió mientras lo ajustabas (ahora es {e.stock_actual}). Revisá el valor.")
+            return self.form_invalid(form)
 
-            producto.stock = nueva_cantidad
-            producto.save()
-
-            messages.success(self.request, f"Stock actualizado exitosamente")
-        else:
-            messages.info(self.request, f"El stock no ha cambiado")
-
+        messages.success(self.request, f"Stock actualizado exitosamente")
         return redirect("productos:producto_detail", pk=producto.pk)
 
 
-class StockBajoListView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, ListView):
+class StockBajoListView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, KeysetPaginationMixin, ListView):
     permission_required = 'productos.view_producto'
     """Muestra una lista filtrada solo para productos con stock bajo."""
     model = Producto
     template_name = "productos/stock_bajo_list.html"
     context_object_name = "productos"
     paginate_by = 5
+    keyset_ordering = ("stock", "id")
 
     def get_queryset(self):
         """
@@ -3,20 +3,31 @@ from .models import Venta, ItemVenta
 
 
 class ItemVentaInline(admin.TabularInline):
+    # Una venta confirmada no se edita (el stock ya se descontó y el
+    # comprobante ya puede estar generado): los items son de sólo lectura.
     model = ItemVenta
-    readonly_fields = ('subtotal',)
+    fields = readonly_fields = ('producto', 'cantidad', 'precio_unitario', 'subtotal')
     extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('producto')
 
 
 @admin.register(Venta)
 class VentaAdmin(admin.ModelAdmin):
     list_display = ('codigo', 'cliente', 'fecha', 'total')
+    list_select_related = ('cliente',)
     inlines = [ItemVentaInline]
 
 
 @admin.register(ItemVenta)
 class ItemVentaAdmin(admin.ModelAdmin):
     list_display = ('venta', 'producto', 'cantidad', 'precio_unitario', 'subtotal')
+    list_select_related = ('venta__cliente', 'producto')
 from django.contrib import admin
 
 # Register your models here.
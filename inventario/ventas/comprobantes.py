@@ -0,0 +1,129 @@
+"""Comprobantes de venta en PDF.
+
+Se dibujan con fpdf2 (Python puro, sin librerías nativas) con el mismo
+contenido que ``templates/ventas/venta_pdf.html``. Una venta no cambia
+después de confirmarse, así que cada PDF se genera una sola vez y queda en
+``COMPROBANTES_DIR/<codigo[:2]>/<codigo>.pdf``.
+
+``renderizar_pdf`` recibe un dict de datos planos (ver ``datos_de_ventas``)
+y no toca la base, así que se puede ejecutar en otro proceso: el comando
+``exportar_comprobantes`` lo reparte en un pool de procesos.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+from fpdf import FPDF
+from fpdf.fonts import FontFace
+
+
+def _latin1(texto):
+    # Las fuentes estándar de PDF sólo cubren Latin-1 (incluye acentos y ñ)
+    return str(texto).encode('latin-1', 'replace').decode('latin-1')
+
+
+def renderizar_pdf(datos):
+    """Devuelve los bytes del comprobante de ``datos``.
+
+    ``datos``: ``{"codigo", "fecha" (texto), "cliente", "total",
+    "items": [(producto, cantidad, precio_unitario, subtotal), ...]}``.
+    """
+    pdf = FPDF(format='A4')
+    pdf.set_title(f"Venta {datos['codigo']}")
+    pdf.add_page()
+
+    pdf.set_font('Helvetica', 'B', 16)
+    pdf.cell(0, 10, 'Comprobante de Venta', align='C', new_x='LMARGIN', new_y='NEXT')
+    pdf.set_font('Helvetica', size=9)
+    pdf.set_text_color(102)
+    pdf.cell(
+        0, 6, _latin1(f"Código: {datos['codigo']}  ·  Fecha: {datos['fecha']}"),
+        align='C', new_x='LMARGIN', new_y='NEXT',
+    )
+    pdf.ln(4)
+    pdf.set_text_color(34)
+    pdf.set_font('Helvetica', 'B', 10)
+    pdf.cell(pdf.get_string_width('Cliente: ') + 1, 6, 'Cliente:')
+    pdf.set_font('Helvetica', size=10)
+    pdf.cell(0, 6, _latin1(datos['cliente']), new_x='LMARGIN', new_y='NEXT')
+    pdf.ln(2)
+
+    with pdf.table(
+        col_widths=(100, 25, 30, 35),
+        text_align=('LEFT', 'RIGHT', 'RIGHT', 'RIGHT'),
+        headings_style=FontFace(emphasis='BOLD', fill_color=245),
+        borders_layout='HORIZONTAL_LINES',
+        line_height=7,
+    ) as tabla:
+        tabla.row(['Producto', 'Cant.', 'Precio', 'Subtotal'])
+        for producto, cantidad, precio, subtotal in datos['items']:
+            tabla.row([_latin1(producto), str(cantidad), str(precio), str(subtotal)])
+
+    pdf.ln(4)
+    pdf.set_font('Helvetica', 'B', 12)
+    pdf.cell(0, 8, f"Total: ${datos['total']}", align='R')
+    return bytes(pdf.output())
+
+
+def datos_de_ventas(ventas):
+    """Datos de ``renderizar_pdf`` para un queryset de ventas.
+
+    Dos consultas (ventas con cliente, items con producto) sin instanciar
+    modelos, cualquiera sea la cantidad de ventas.
+    """
+    from django.utils import timezone
+    from .models import ItemVenta
+
+    por_id = {}
+    filas = ventas.order_by('fecha', 'id').values_list(
+        'pk', 'codigo', 'fecha', 'total', 'cliente__apellido', 'cliente__nombre', 'cliente__documento',
+    )
+    for pk, codigo, fecha, total, apellido, nombre, documento in filas:
+        por_id[pk] = {
+            'codigo': codigo,
+            'fecha': timezone.localtime(fecha).strftime('%Y-%m-%d %H:%M'),
+            'cliente': f'{apellido}, {nombre} ({documento})',
+            'total': total,
+            'items': [],
+        }
+    items = (
+        ItemVenta.objects.filter(venta_id__in=list(por_id))
+        .order_by('venta_id', 'id')
+        .values_list('venta_id', 'producto__nombre', 'cantidad', 'precio_unitario', 'subtotal')
+    )
+    for venta_id, *item in items:
+        por_id[venta_id]['items'].append(tuple(item))
+    return list(por_id.values())
+
+
+def ruta_comprobante(codigo):
+    from django.conf import settings
+
+    return Path(settings.COMPROBANTES_DIR) / codigo[:2] / f'{codigo}.pdf'
+
+
+def guardar_comprobante(codigo, contenido):
+    """Escribe el PDF en el caché de disco de forma atómica (archivo temporal
+    + rename): un lector nunca ve un PDF a medio escribir."""
+    ruta = ruta_comprobante(codigo)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+    return ruta
+
+
+def obtener_comprobante(venta):
+    """Ruta del PDF de ``venta``; lo genera si todavía no está en disco."""
+    from .models import Venta
+
+    ruta = ruta_comprobante(venta.codigo)
+    if not ruta.exists():
+        datos, = datos_de_ventas(Venta.objects.filter(pk=venta.pk))
+        guardar_comprobante(venta.codigo, renderizar_pdf(datos))
+    return ruta
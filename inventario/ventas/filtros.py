@@ -0,0 +1,30 @@
+"""Filtros de fecha para las consultas de ventas.
+
+``fecha__date__gte=dia`` envuelve la columna en una conversión a fecha y la
+base ya no puede usar el índice sobre ``fecha``. ``rango_de_dias`` arma el
+mismo filtro como un rango semiabierto ``[inicio de desde, inicio del día
+siguiente a hasta)`` sobre la columna tal cual, con los límites calculados en
+la zona horaria actual (la misma que usan los resúmenes diarios).
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def inicio_del_dia(dia):
+    """Primer instante de ``dia`` en la zona horaria actual (aware)."""
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def rango_de_dias(desde=None, hasta=None, campo='fecha'):
+    """``Q`` para ``campo`` entre los días ``desde`` y ``hasta`` inclusive.
+
+    Cualquiera de los dos puede ser ``None`` (rango abierto de ese lado).
+    """
+    condicion = Q()
+    if desde:
+        condicion &= Q(**{f'{campo}__gte': inicio_del_dia(desde)})
+    if hasta:
+        condicion &= Q(**{f'{campo}__lt': inicio_del_dia(hasta + timedelta(days=1))})
+    return condicion
@@ -1,14 +1,54 @@
 from django import forms
-from django.forms import inlineformset_factory
+from django.forms import BaseInlineFormSet, inlineformset_factory
+from django.utils.functional import cached_property
 
 from .models import Venta, ItemVenta
 from productos.models import Producto
 
 
+class ClientePorIdField(forms.ModelChoiceField):
+    """Cliente elegido con el buscador (``ventas:buscar_clientes``).
+
+    Igual que ``ProductoPorIdField``: se envía sólo el id en un input oculto
+    y la página no lista todos los clientes.
+    """
+    widget = forms.HiddenInput
+
+
 class VentaForm(forms.ModelForm):
     class Meta:
         model = Venta
         fields = ['cliente']
+        field_classes = {'cliente': ClientePorIdField}
+
+    @property
+    def cliente_seleccionado(self):
+        """Cliente enviado (para volver a mostrarlo si hay errores)."""
+        return getattr(self, 'cleaned_data', {}).get('cliente')
+
+
+class ProductoPorIdField(forms.ModelChoiceField):
+    """Producto elegido con el buscador (``ventas:buscar_productos``).
+
+    Se envía sólo el id en un input oculto, así que nunca se renderiza el
+    catálogo. Al validar se busca en ``productos`` (dict ``{id: Producto}``
+    que carga el formset para todas las filas juntas); sin ese dict, cae a
+    una consulta por fila.
+    """
+    widget = forms.HiddenInput
+    productos = None
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            pk = int(value)
+        except (TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        productos = self.productos if self.productos is not None else self.queryset.in_bulk([pk])
+        if pk not in productos:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return productos[pk]
 
 
 class ItemVentaForm(forms.ModelForm):
@@ -16,20 +56,55 @@ class ItemVentaForm(forms.ModelForm):
         model = ItemVenta
         # remove precio_unitario from editable fields: price will be taken from Producto.precio
         fields = ['producto', 'cantidad']
+        field_classes = {'producto': ProductoPorIdField}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Optionally limit producto choices to active/available products
-        self.fields['producto'].queryset = Producto.objects.all()
         # show nicer widgets
         self.fields['cantidad'].widget.attrs.update({'min': '1', 'class': 'form-control'})
-        self.fields['producto'].widget.attrs.update({'class': 'form-select'})
+        self.fields['producto'].widget.attrs.update({'class': 'producto-id'})
+
+    def _get_validation_exclusions(self):
+        # ProductoPorIdField ya comprobó que el producto existe; sin esto la
+        # validación del modelo haría un SELECT más por fila.
+        exclude = super()._get_validation_exclusions()
+        exclude.add('producto')
+        return exclude
+
+    @property
+    def producto_seleccionado(self):
+        """Producto enviado en esta fila (para volver a mostrarlo si hay errores)."""
+        productos = self.fields['producto'].productos or {}
+        valor = self['producto'].value()
+        valor = str(valor or '')
+        # isdigit() también acepta dígitos como '²', que int() rechaza
+        return productos.get(int(valor)) if valor.isascii() and valor.isdigit() else None
+
+
+class BaseItemVentaFormSet(BaseInlineFormSet):
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        form.fields['producto'].productos = self.productos_enviados
+        return form
+
+    @cached_property
+    def productos_enviados(self):
+        """Productos de todas las filas enviadas, con un único ``in_bulk``."""
+        if not self.is_bound:
+            return {}
+        ids = set()
+        for i in range(self.total_form_count()):
+            valor = str(self.data.get(f"{self.add_prefix(i)}-producto", ''))
+            if valor.isascii() and valor.isdigit():
+                ids.add(int(valor))
+        return Producto.objects.order_by().only('pk', 'sku', 'nombre', 'precio', 'stock').in_bulk(ids)
 
 
 ItemVentaFormSet = inlineformset_factory(
     Venta,
     ItemVenta,
     form=ItemVentaForm,
+    formset=BaseItemVentaFormSet,
     extra=1,
     can_delete=True,
 )
@@ -0,0 +1,247 @@
+import json
+import platform
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, teardown_databases
+from django.urls import reverse
+from django.utils import timezone
+
+from inventario.exportar import en_lotes
+
+# Palabras de los nombres sembrados: la búsqueda de productos encuentra una
+# de cada len(TIPOS) filas, con y sin acentos
+TIPOS = ('Café', 'Yerba', 'Azúcar', 'Harina', 'Aceite', 'Arroz', 'Fideos', 'Leche')
+MARCAS = ('Norte', 'Sur', 'Andina', 'Pampa', 'Litoral')
+BUSQUEDA = 'cafe'
+
+# Middleware que mide cada request (RENDIMIENTO=1, prometheus_client): se
+# sacan del stack para no medir la medición
+MIDDLEWARE_DE_MEDICION = (
+    'inventario.middleware.RendimientoMiddleware',
+    'inventario.metricas.MetricasMiddleware',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia de los caminos más usados (crear venta con N items, listado de '
+        'productos con búsqueda, gráficos de ventas por día y por producto, registrar un '
+        'movimiento de stock) contra una base de prueba sembrada con el volumen indicado. '
+        'Repite cada caso después de un calentamiento y reporta p50/p95; puede guardar el '
+        'resultado como línea base JSON y comparar contra una línea base anterior.'
+    )
+
+    CASOS = ('venta_crear', 'productos_buscar', 'ventas_por_dia', 'ventas_por_producto', 'movimiento_crear')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=2000, help='Productos sembrados. Por defecto 2000.')
+        parser.add_argument('--clientes', type=int, default=500, help='Clientes sembrados. Por defecto 500.')
+        parser.add_argument('--ventas', type=int, default=10000, help='Ventas sembradas. Por defecto 10000.')
+        parser.add_argument(
+            '--dias', type=int, default=90, help='Días hacia atrás en los que se reparten las ventas. Por defecto 90.',
+        )
+        parser.add_argument(
+            '--items', type=int, default=10, help='Items de cada venta (sembradas y del caso venta_crear). Por defecto 10.',
+        )
+        parser.add_argument('--repeticiones', type=int, default=50, help='Mediciones por caso. Por defecto 50.')
+        parser.add_argument(
+            '--calentamiento', type=int, default=5, help='Ejecuciones sin medir antes de cada caso. Por defecto 5.',
+        )
+        parser.add_argument(
+            '--con-cache', action='store_true',
+            help='No vaciar el caché antes de cada ejecución (mide las respuestas ya cacheadas).',
+        )
+        parser.add_argument('--casos', nargs='+', choices=self.CASOS, help='Casos a medir. Por defecto, todos.')
+        parser.add_argument('--guardar', metavar='ARCHIVO', help='Guarda el resultado como línea base JSON.')
+        parser.add_argument(
+            '--comparar', metavar='ARCHIVO',
+            help='Compara contra una línea base JSON; termina con error si algún caso empeora más que --umbral.',
+        )
+        parser.add_argument(
+            '--umbral', type=float, default=0.2,
+            help='Empeoramiento de p50 o p95 que cuenta como regresión (0.2 = 20%%). Por defecto 0.2.',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 2:
+            raise CommandError('--repeticiones debe ser al menos 2.')
+        if options['items'] < 1 or options['items'] > options['productos']:
+            raise CommandError('--items debe estar entre 1 y --productos.')
+        base = self.leer_base(options['comparar']) if options['comparar'] else None
+        parametros = {
+            campo: options[campo]
+            for campo in ('productos', 'clientes', 'ventas', 'dias', 'items', 'repeticiones', 'calentamiento', 'con_cache')
+        }
+
+        # Base de prueba (como la de los tests): nunca se siembra la base real
+        bases = setup_databases(verbosity=0, interactive=False)
+        try:
+            with override_settings(
+                DEBUG=False, NMAS1='', MIDDLEWARE=self.middleware(),
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ):
+                inicio = time.perf_counter()
+                datos = self.sembrar(options)
+                self.stdout.write(f'Datos sembrados en {time.perf_counter() - inicio:.1f} s.')
+                resultados = self.medir_casos(datos, options)
+        finally:
+            teardown_databases(bases, verbosity=0)
+
+        resultado = {
+            'fecha': timezone.now().isoformat(timespec='seconds'),
+            'motor': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'parametros': parametros,
+            'casos': resultados,
+        }
+        if options['guardar']:
+            Path(options['guardar']).write_text(json.dumps(resultado, indent=2, ensure_ascii=False) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Línea base guardada en {options["guardar"]}.'))
+        if base is not None:
+            self.comparar(base, resultado, options['umbral'])
+
+    def middleware(self):
+        return [m for m in settings.MIDDLEWARE if m not in MIDDLEWARE_DE_MEDICION]
+
+    def sembrar(self, options):
+        from clientes.models import Cliente
+        from productos.models import Producto
+        from ventas.services import VentaLote, registrar_lote
+
+        # create() y no bulk_create: así corren las señales (índice de
+        # búsqueda, columna normalizada de clientes) igual que en la aplicación
+        with transaction.atomic():
+            productos = [
+                Producto.objects.create(
+                    nombre=f'{TIPOS[i % len(TIPOS)]} {MARCAS[i % len(MARCAS)]} {i}', sku=f'BM-{i:06d}',
+                    descripcion='Producto de benchmark', precio=Decimal('1.00') + i % 500,
+                    stock=10 ** 8, stock_minimo=5 if i % 10 else 10 ** 9,
+                )
+                for i in range(options['productos'])
+            ]
+            clientes = [
+                Cliente.objects.create(nombre='Cliente', apellido=f'Benchmark {i}', documento=f'BM-{i:06d}')
+                for i in range(max(1, options['clientes']))
+            ]
+
+        ahora = timezone.now()
+        items = options['items']
+        lote = (
+            VentaLote(
+                f'benchmark-{i}', clientes[i % len(clientes)].pk,
+                [(productos[(i * 7 + j * 13) % len(productos)].pk, 1 + j % 3) for j in range(items)],
+                fecha=ahora - timedelta(days=i % max(1, options['dias']), minutes=i % 1440),
+            )
+            for i in range(options['ventas'])
+        )
+        for parte in en_lotes(lote, 500):
+            registrar_lote(parte, usuario='benchmark')
+
+        return {'productos': productos, 'clientes': clientes, 'desde': ahora - timedelta(days=options['dias'])}
+
+    def casos(self, datos, options):
+        """``{nombre: (método, url, datos, status esperado)}``."""
+        from ventas.forms import ItemVentaFormSet
+
+        productos, cliente = datos['productos'], datos['clientes'][0]
+        prefijo = ItemVentaFormSet().prefix
+        venta = {
+            'cliente': cliente.pk,
+            f'{prefijo}-TOTAL_FORMS': options['items'],
+            f'{prefijo}-INITIAL_FORMS': 0,
+            f'{prefijo}-MIN_NUM_FORMS': 0,
+            f'{prefijo}-MAX_NUM_FORMS': 1000,
+        }
+        for i, producto in enumerate(productos[:options['items']]):
+            venta[f'{prefijo}-{i}-producto'] = producto.pk
+            venta[f'{prefijo}-{i}-cantidad'] = 1
+        rango = {'desde': timezone.localdate(datos['desde']).strftime('%d/%m/%Y')}
+        return {
+            'venta_crear': ('post', reverse('ventas:venta_create'), venta, 302),
+            'productos_buscar': ('get', reverse('productos:producto_list'), {'q': BUSQUEDA}, 200),
+            'ventas_por_dia': ('get', reverse('ventas:ventas_por_dia'), rango, 200),
+            'ventas_por_producto': ('get', reverse('ventas:ventas_por_producto'), rango, 200),
+            'movimiento_crear': (
+                'post', reverse('productos:movimiento_create', args=[productos[-1].pk]),
+                {'tipo': 'entrada', 'cantidad': 1, 'motivo': 'Benchmark'}, 302,
+            ),
+        }
+
+    def medir_casos(self, datos, options):
+        from django.contrib.auth.models import User
+
+        client = Client()
+        client.force_login(User.objects.create_superuser('benchmark', password=None))
+        casos = self.casos(datos, options)
+        resultados = {}
+        self.stdout.write(f'{"caso":<22}{"p50 ms":>10}{"p95 ms":>10}{"media ms":>10}')
+        for nombre in options['casos'] or self.CASOS:
+            metodo, url, parametros, esperado = casos[nombre]
+            tiempos = []
+            for i in range(options['calentamiento'] + options['repeticiones']):
+                if not options['con_cache']:
+                    cache.clear()
+                inicio = time.perf_counter()
+                response = getattr(client, metodo)(url, parametros)
+                duracion = time.perf_counter() - inicio
+                if response.status_code != esperado:
+                    raise CommandError(f'{nombre}: {metodo.upper()} {url} respondió {response.status_code}.')
+                if i >= options['calentamiento']:
+                    tiempos.append(duracion * 1000)
+            percentiles = statistics.quantiles(tiempos, n=100, method='inclusive')
+            resultados[nombre] = {
+                'p50_ms': round(statistics.median(tiempos), 3),
+                'p95_ms': round(percentiles[94], 3),
+                'media_ms': round(statistics.fmean(tiempos), 3),
+                'repeticiones': len(tiempos),
+            }
+            r = resultados[nombre]
+            self.stdout.write(f'{nombre:<22}{r["p50_ms"]:>10.2f}{r["p95_ms"]:>10.2f}{r["media_ms"]:>10.2f}')
+        return resultados
+
+    def leer_base(self, ruta):
+        try:
+            return json.loads(Path(ruta).read_text())
+        except (OSError, ValueError) as error:
+            raise CommandError(f'No se pudo leer la línea base {ruta}: {error}')
+
+    def comparar(self, base, actual, umbral):
+        if base.get('parametros') != actual['parametros'] or base.get('motor') != actual['motor']:
+            self.stdout.write(self.style.WARNING(
+                'La línea base se midió con otros parámetros o con otro motor de base de datos; '
+                'la comparación es orientativa.'
+            ))
+        regresiones = []
+        self.stdout.write(f'{"caso":<22}{"p50":>18}{"p95":>18}')
+        for nombre, actuales in actual['casos'].items():
+            anteriores = base.get('casos', {}).get(nombre)
+            if anteriores is None:
+                self.stdout.write(f'{nombre:<22}{"(sin línea base)":>36}')
+                continue
+            columnas = []
+            empeora = False
+            for metrica in ('p50_ms', 'p95_ms'):
+                cambio = actuales[metrica] / anteriores[metrica] - 1 if anteriores[metrica] else 0.0
+                empeora = empeora or cambio > umbral
+                columnas.append(f'{anteriores[metrica]:.1f}→{actuales[metrica]:.1f} {cambio:+.0%}')
+            linea = f'{nombre:<22}{columnas[0]:>18}{columnas[1]:>18}'
+            if empeora:
+                regresiones.append(nombre)
+                linea = self.style.ERROR(linea)
+            self.stdout.write(linea)
+        if regresiones:
+            raise CommandError(
+                f'Regresión de más de {umbral:.0%} en: {", ".join(regresiones)}.'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Sin regresiones de más de {umbral:.0%}.'))
@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import sys
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.exportar import en_lotes
+from ventas.comprobantes import datos_de_ventas, guardar_comprobante, renderizar_pdf, ruta_comprobante
+from ventas.filtros import rango_de_dias
+from ventas.models import Venta
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera en un ZIP los comprobantes PDF de las ventas de un rango de días. '
+        'Los PDF que faltan en el caché de disco se dibujan en paralelo en un pool '
+        'de procesos y quedan guardados; el ZIP se escribe a medida que avanza.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat, help='Primer día (AAAA-MM-DD), inclusive.')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Último día (AAAA-MM-DD), inclusive.')
+        parser.add_argument(
+            '--salida', default='comprobantes.zip',
+            help='Archivo ZIP a generar; "-" lo escribe en la salida estándar. Por defecto comprobantes.zip.',
+        )
+        parser.add_argument(
+            '--procesos', type=int, default=os.cpu_count() or 1,
+            help='Procesos que dibujan PDF en paralelo. Por defecto, uno por CPU.',
+        )
+        parser.add_argument(
+            '--lote', type=int, default=500,
+            help='Ventas que se leen de la base y se reparten por vez. Por defecto 500.',
+        )
+
+    def handle(self, *args, **options):
+        desde, hasta = options['desde'], options['hasta']
+        if desde and hasta and desde > hasta:
+            raise CommandError('--desde debe ser anterior o igual a --hasta.')
+
+        ids = (
+            Venta.objects.filter(rango_de_dias(desde, hasta))
+            .order_by('fecha', 'id')
+            .values_list('pk', flat=True)
+            .iterator(chunk_size=options['lote'])
+        )
+        a_stdout = options['salida'] == '-'
+        destino = sys.stdout.buffer if a_stdout else open(options['salida'], 'wb')
+        total = generados = 0
+        # spawn: los procesos hijos no heredan conexiones a la base ni hilos
+        contexto = multiprocessing.get_context('spawn')
+        procesos = max(1, options['procesos'])
+        try:
+            with ProcessPoolExecutor(procesos, mp_context=contexto) as pool, \
+                    zipfile.ZipFile(destino, 'w', compression=zipfile.ZIP_STORED) as archivo:
+                for lote in en_lotes(ids, max(1, options['lote'])):
+                    datos = datos_de_ventas(Venta.objects.filter(pk__in=lote))
+                    pendientes = [d for d in datos if not ruta_comprobante(d['codigo']).exists()]
+                    pdfs = pool.map(renderizar_pdf, pendientes, chunksize=max(1, len(pendientes) // (4 * procesos)))
+                    for dato, pdf in zip(pendientes, pdfs):
+                        guardar_comprobante(dato['codigo'], pdf)
+                    # Los PDF ya están comprimidos: se guardan sin recomprimir
+                    for dato in datos:
+                        archivo.write(ruta_comprobante(dato['codigo']), arcname=f"{dato['codigo']}.pdf")
+                    total += len(datos)
+                    generados += len(pendientes)
+        finally:
+            if not a_stdout:
+                destino.close()
+
+        if not a_stdout:
+            self.stdout.write(self.style.SUCCESS(
+                f'{total} comprobantes en {options["salida"]} ({generados} generados, {total - generados} del caché).'
+            ))
@@ -0,0 +1,82 @@
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from inventario.cache import invalidar
+from ventas.models import ItemVenta, Venta, VentaDiaria, VentaProductoDiaria
+from ventas.services import VENTAS
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye desde cero los resúmenes de ventas por día (VentaDiaria y '
+        'VentaProductoDiaria), procesando las ventas por bloques de días. Útil después de cargar o '
+        'eliminar ventas por fuera de la aplicación (admin, loaddata, SQL).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias-por-bloque', type=int, default=31,
+            help='Cantidad de días que se agregan en cada transacción. Por defecto 31.',
+        )
+
+    def handle(self, *args, **options):
+        paso = timedelta(days=max(1, options['dias_por_bloque']))
+        rango = Venta.objects.aggregate(desde=Min('fecha'), hasta=Max('fecha'))
+        if rango['desde'] is None:
+            VentaDiaria.objects.all().delete()
+            VentaProductoDiaria.objects.all().delete()
+            self.stdout.write(self.style.SUCCESS('No hay ventas; resumen vaciado.'))
+            return
+
+        primero = timezone.localdate(rango['desde'])
+        ultimo = timezone.localdate(rango['hasta'])
+        # Días fuera del rango de ventas existentes ya no tienen nada que resumir
+        VentaDiaria.objects.exclude(dia__range=(primero, ultimo)).delete()
+        VentaProductoDiaria.objects.exclude(dia__range=(primero, ultimo)).delete()
+
+        filas = 0
+        dia = primero
+        while dia <= ultimo:
+            fin = min(dia + paso, ultimo + timedelta(days=1))
+            # Rango semiabierto [inicio, fin) en la zona horaria actual
+            inicio_dt = timezone.make_aware(datetime.combine(dia, time.min))
+            fin_dt = timezone.make_aware(datetime.combine(fin, time.min))
+            por_cliente = (
+                Venta.objects.filter(fecha__gte=inicio_dt, fecha__lt=fin_dt)
+                .order_by()
+                .annotate(dia=TruncDate('fecha'))
+                .values('dia', 'cliente_id')
+                .annotate(cantidad=Count('pk'), total=Sum('total'))
+            )
+            por_producto = (
+                ItemVenta.objects.filter(venta__fecha__gte=inicio_dt, venta__fecha__lt=fin_dt)
+                .order_by()
+                .annotate(dia=TruncDate('venta__fecha'))
+                .values('dia', 'producto_id')
+                .annotate(unidades=Sum('cantidad'), total=Sum('subtotal'))
+            )
+            with transaction.atomic():
+                VentaDiaria.objects.filter(dia__gte=dia, dia__lt=fin).delete()
+                VentaProductoDiaria.objects.filter(dia__gte=dia, dia__lt=fin).delete()
+                creadas = VentaDiaria.objects.bulk_create([
+                    VentaDiaria(dia=r['dia'], cliente_id=r['cliente_id'], cantidad=r['cantidad'], total=r['total'])
+                    for r in por_cliente
+                ], batch_size=1000)
+                creadas_producto = VentaProductoDiaria.objects.bulk_create([
+                    VentaProductoDiaria(dia=r['dia'], producto_id=r['producto_id'], unidades=r['unidades'], total=r['total'])
+                    for r in por_producto
+                ], batch_size=1000)
+            filas += len(creadas) + len(creadas_producto)
+            self.stdout.write(
+                f'{dia} → {fin - timedelta(days=1)}: {len(creadas)} filas por cliente, '
+                f'{len(creadas_producto)} por producto'
+            )
+            dia = fin
+
+        invalidar(VENTAS)
+        self.stdout.write(self.style.SUCCESS(f'Resúmenes diarios reconstruidos: {filas} filas.'))
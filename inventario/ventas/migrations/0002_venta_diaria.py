@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def poblar_resumen(apps, schema_editor):
+    """Carga el resumen con las ventas ya existentes (un solo agregado)."""
+    Venta = apps.get_model('ventas', 'Venta')
+    VentaDiaria = apps.get_model('ventas', 'VentaDiaria')
+    resumen = (
+        Venta.objects.order_by()
+        .annotate(dia=TruncDate('fecha'))
+        .values('dia', 'cliente_id')
+        .annotate(cantidad=Count('pk'), total=Sum('total'))
+    )
+    VentaDiaria.objects.bulk_create([
+        VentaDiaria(dia=r['dia'], cliente_id=r['cliente_id'], cantidad=r['cantidad'], total=r['total'])
+        for r in resumen.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0001_initial'),
+        ('ventas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('cantidad', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='clientes.cliente')),
+            ],
+            options={
+                'verbose_name': 'Venta diaria',
+                'verbose_name_plural': 'Ventas diarias',
+                'constraints': [models.UniqueConstraint(fields=('dia', 'cliente'), name='venta_diaria_dia_cliente_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
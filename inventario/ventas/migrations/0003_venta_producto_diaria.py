@@ -0,0 +1,49 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+
+
+def poblar_resumen(apps, schema_editor):
+    """Carga el resumen por producto con los items ya existentes."""
+    ItemVenta = apps.get_model('ventas', 'ItemVenta')
+    VentaProductoDiaria = apps.get_model('ventas', 'VentaProductoDiaria')
+    resumen = (
+        ItemVenta.objects.order_by()
+        .annotate(dia=TruncDate('venta__fecha'))
+        .values('dia', 'producto_id')
+        .annotate(unidades=Sum('cantidad'), total=Sum('subtotal'))
+    )
+    VentaProductoDiaria.objects.bulk_create([
+        VentaProductoDiaria(dia=r['dia'], producto_id=r['producto_id'], unidades=r['unidades'], total=r['total'])
+        for r in resumen.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0002_producto_stock_no_negativo'),
+        ('ventas', '0002_venta_diaria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaProductoDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('unidades', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Venta diaria por producto',
+                'verbose_name_plural': 'Ventas diarias por producto',
+                'constraints': [models.UniqueConstraint(fields=('dia', 'producto'), name='venta_producto_diaria_dia_producto_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_resumen, migrations.RunPython.noop),
+    ]
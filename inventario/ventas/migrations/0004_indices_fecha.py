@@ -0,0 +1,31 @@
+# Generated by Django 5.2.6 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+from inventario.db import AgregarIndiceConcurrente
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción
+    atomic = False
+
+    dependencies = [
+        ('clientes', '0002_busqueda'),
+        ('productos', '0005_producto_imagen_storage'),
+        ('ventas', '0003_venta_producto_diaria'),
+    ]
+
+    operations = [
+        AgregarIndiceConcurrente(
+            model_name='itemventa',
+            index=models.Index(fields=['producto', 'venta'], name='itemventa_producto_venta_idx'),
+        ),
+        AgregarIndiceConcurrente(
+            model_name='venta',
+            index=models.Index(fields=['fecha'], name='venta_fecha_idx'),
+        ),
+        AgregarIndiceConcurrente(
+            model_name='venta',
+            index=models.Index(fields=['cliente', 'fecha'], name='venta_cliente_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+"""Completa el historial de movimientos con las ventas anteriores a que
+quedaran registradas como salidas.
+
+Las ventas viejas descontaban stock sin dejar movimiento: se crea una
+``salida`` por item (``motivo = "Venta <codigo>"``, con la fecha de la
+venta), salvo para las ventas que ya lo tienen. Se recorren las ventas de a
+``LOTE`` y cada lote se escribe antes de leer el siguiente.
+
+Es lo único que se puede reconstruir con certeza. Los ajustes viejos
+guardaban ``abs(diferencia)`` y el signo no se puede leer de la fila, y el
+stock pudo haberse editado a mano: esas diferencias no se inventan acá, las
+informa ``reconcile_stock`` y las corrige ``--reparar`` cuando lo decide
+quien lo ejecuta.
+"""
+from django.db import migrations
+
+LOTE = 1000
+
+
+def _registrar_salidas(MovimientoStock, ItemVenta, ventas):
+    motivos = {pk: (f'Venta {codigo}', fecha) for pk, codigo, fecha in ventas}
+    registradas = set(
+        MovimientoStock.objects.filter(tipo='salida', motivo__in=[m for m, _ in motivos.values()])
+        .values_list('motivo', flat=True)
+    )
+    pendientes = {pk: venta for pk, venta in motivos.items() if venta[0] not in registradas}
+    if not pendientes:
+        return
+    items = ItemVenta.objects.filter(venta_id__in=pendientes).order_by('pk').values_list(
+        'venta_id', 'producto_id', 'cantidad',
+    )
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(
+            producto_id=producto_id, tipo='salida', cantidad=cantidad,
+            motivo=pendientes[venta_id][0], fecha=pendientes[venta_id][1], usuario='Sistema',
+        )
+        for venta_id, producto_id, cantidad in items
+    ], batch_size=LOTE)
+
+
+def completar_historial(apps, schema_editor):
+    MovimientoStock = apps.get_model('productos', 'MovimientoStock')
+    Venta = apps.get_model('ventas', 'Venta')
+    ItemVenta = apps.get_model('ventas', 'ItemVenta')
+
+    lote = []
+    for venta in Venta.objects.order_by('pk').values_list('pk', 'codigo', 'fecha').iterator(chunk_size=LOTE):
+        lote.append(venta)
+        if len(lote) == LOTE:
+            _registrar_salidas(MovimientoStock, ItemVenta, lote)
+            lote = []
+    if lote:
+        _registrar_salidas(MovimientoStock, ItemVenta, lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_producto_imagen_storage'),
+        ('ventas', '0005_venta_clave_idempotencia'),
+    ]
+
+    operations = [
+        # Sólo agrega filas y una segunda pasada no duplica nada: revertir no
+        # necesita deshacerlas
+        migrations.RunPython(completar_historial, migrations.RunPython.noop),
+    ]
@@ -6,23 +6,35 @@ from productos.models import Producto
 from clientes.models import Cliente
 
 
+def generar_codigo():
+    return uuid.uuid4().hex[:10].upper()
+
+
 class Venta(models.Model):
     codigo = models.CharField("Código", max_length=20, unique=True, blank=True)
     cliente = models.ForeignKey(Cliente, on_delete=models.PROTECT, related_name='ventas')
     fecha = models.DateTimeField(default=timezone.now)
     total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    # Clave que envía la terminal (POS) para que reintentar un lote no
+    # duplique ventas; vacía en las ventas cargadas desde el formulario
+    clave_idempotencia = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
 
     class Meta:
         verbose_name = 'Venta'
         verbose_name_plural = 'Ventas'
         ordering = ['-fecha']
+        indexes = [
+            # Listado y filtros por rango de fechas (ver ventas.filtros)
+            models.Index(fields=['fecha'], name='venta_fecha_idx'),
+            models.Index(fields=['cliente', 'fecha'], name='venta_cliente_fecha_idx'),
+        ]
 
     def __str__(self):
         return f"{self.codigo} - {self.cliente} - {self.total}"
 
     def save(self, *args, **kwargs):
         if not self.codigo:
-            self.codigo = uuid.uuid4().hex[:10].upper()
+            self.codigo = generar_codigo()
         super().save(*args, **kwargs)
 
 
@@ -36,9 +48,58 @@ class ItemVenta(models.Model):
     class Meta:
         verbose_name = 'Item de Venta'
         verbose_name_plural = 'Items de Venta'
+        indexes = [
+            # Ventas de un producto (ranking por producto, borrado forzado)
+            models.Index(fields=['producto', 'venta'], name='itemventa_producto_venta_idx'),
+        ]
 
     def __str__(self):
         return f"{self.producto.nombre} x {self.cantidad} = {self.subtotal}"
 from django.db import models
 
 # Create your models here.
+
+
+class VentaDiaria(models.Model):
+    """Resumen de ventas por día y cliente.
+
+    Se actualiza en la misma transacción que registra cada venta (ver
+    ``ventas.services``) y se puede reconstruir con
+    ``manage.py rebuild_sales_rollup``.
+    """
+    dia = models.DateField()
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='+')
+    cantidad = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Venta diaria'
+        verbose_name_plural = 'Ventas diarias'
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'cliente'], name='venta_diaria_dia_cliente_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.dia} - {self.cliente_id} - {self.total}"
+
+
+class VentaProductoDiaria(models.Model):
+    """Resumen de unidades e importe vendidos por día y producto.
+
+    Igual que ``VentaDiaria``: se acumula al registrar cada venta y se puede
+    reconstruir con ``manage.py rebuild_sales_rollup``.
+    """
+    dia = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='+')
+    unidades = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Venta diaria por producto'
+        verbose_name_plural = 'Ventas diarias por producto'
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'producto'], name='venta_producto_diaria_dia_producto_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.dia} - {self.producto_id} - {self.unidades} - {self.total}"
@@ -0,0 +1,222 @@
+"""Registro de ventas.
+
+``registrar_venta`` concentra todo lo que ocurre al confirmar una venta para
+que la vista sólo se ocupe de formularios y mensajes. ``registrar_lote`` hace
+lo mismo para muchas ventas a la vez (sincronización de terminales POS).
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from inventario.cache import invalidar
+from inventario.db import acumular
+from inventario.metricas import contar_movimientos, contar_ventas
+from productos.models import MovimientoStock
+from productos.services import descontar_stock
+from .models import Venta, ItemVenta, VentaDiaria, VentaProductoDiaria, generar_codigo
+
+# Grupo de caché de los gráficos de ventas (ver inventario.cache)
+VENTAS = 'ventas'
+
+
+def registrar_venta(cliente, lineas, usuario='Sistema'):
+    """Crea una venta con sus items y descuenta el stock de forma atómica.
+
+    ``lineas`` es una lista de ``(producto_id, cantidad)``; un mismo producto
+    puede aparecer más de una vez. El precio se toma de la fila bloqueada del
+    producto, no de lo que envió el cliente. Cada item deja una "salida" en el
+    historial de movimientos, con un solo ``bulk_create`` por venta, y la venta
+    se suma a los resúmenes diarios (``VentaDiaria`` y ``VentaProductoDiaria``)
+    en la misma transacción.
+
+    Lanza ``productos.services.StockInsuficienteError`` si no alcanza el stock;
+    en ese caso no se escribe nada.
+    """
+    cantidades = defaultdict(int)
+    for producto_id, cantidad in lineas:
+        cantidades[producto_id] += cantidad
+
+    with transaction.atomic():
+        productos = descontar_stock(cantidades)
+
+        venta = Venta(cliente=cliente)
+        items = []
+        total = Decimal('0.00')
+        for producto_id, cantidad in lineas:
+            precio = productos[producto_id].precio
+            subtotal = Decimal(cantidad) * precio
+            items.append(ItemVenta(
+                producto_id=producto_id,
+                cantidad=cantidad,
+                precio_unitario=precio,
+                subtotal=subtotal,
+            ))
+            total += subtotal
+
+        venta.total = total
+        venta.save()
+        for item in items:
+            item.venta = venta
+        ItemVenta.objects.bulk_create(items)
+        _registrar_efectos([venta], items, usuario)
+
+    return venta
+
+
+def _registrar_efectos(ventas, items, usuario):
+    """Movimientos de stock, resúmenes diarios e invalidación de caché para
+    ventas ya insertadas. Un ``bulk_create`` y un INSERT por resumen, sin
+    importar cuántas ventas sean."""
+    ventas_por_id = {venta.pk: venta for venta in ventas}
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(
+            producto_id=item.producto_id,
+            tipo='salida',
+            cantidad=item.cantidad,
+            motivo=f"Venta {ventas_por_id[item.venta_id].codigo}",
+            fecha=ventas_por_id[item.venta_id].fecha,
+            usuario=usuario,
+        )
+        for item in items
+    ])
+    acumular(VentaDiaria, ['dia', 'cliente'], [
+        {'dia': timezone.localdate(venta.fecha), 'cliente': venta.cliente_id, 'cantidad': 1, 'total': venta.total}
+        for venta in ventas
+    ], ['cantidad', 'total'])
+    acumular(VentaProductoDiaria, ['dia', 'producto'], [
+        {
+            'dia': timezone.localdate(ventas_por_id[item.venta_id].fecha),
+            'producto': item.producto_id,
+            'unidades': item.cantidad,
+            'total': item.subtotal,
+        }
+        for item in items
+    ], ['unidades', 'total'])
+    invalidar(VENTAS)
+    contar_ventas(len(ventas))
+    contar_movimientos('salida', len(items))
+
+
+class VentaLote:
+    """Una venta de un lote: ``lineas`` como en ``registrar_venta``."""
+
+    def __init__(self, clave, cliente_id, lineas, fecha=None):
+        self.clave = clave
+        self.cliente_id = cliente_id
+        self.lineas = lineas
+        self.fecha = fecha or timezone.now()
+        # Se completan al registrar
+        self.venta = None
+        self.duplicada = False
+
+
+def registrar_lote(lote, usuario='Sistema'):
+    """Registra muchas ventas en una transacción, sin duplicar reintentos.
+
+    ``lote`` es una lista de ``VentaLote``. Las claves que ya existen (un
+    reintento del mismo lote, o la misma clave repetida dentro del lote) no
+    vuelven a registrarse: quedan con ``duplicada = True`` y ``venta``
+    apuntando a la venta original. Para el resto se descuenta el stock de
+    todos los productos con un único bloqueo + UPDATE (``descontar_stock``) y
+    se insertan ventas, items, movimientos y resúmenes con un ``bulk_create``
+    / INSERT por tabla.
+
+    Es todo o nada: si a algún producto no le alcanza el stock lanza
+    ``StockInsuficienteError`` y no se registra ninguna venta del lote.
+    Devuelve ``lote`` con ``venta`` y ``duplicada`` completos.
+    """
+    try:
+        return _registrar_lote(lote, usuario)
+    except IntegrityError:
+        # Otra petición registró alguna de las claves entre la consulta de
+        # existentes y el INSERT: al repetir, esas ventas salen como duplicadas.
+        return _registrar_lote(lote, usuario)
+
+
+def _registrar_lote(lote, usuario):
+    with transaction.atomic():
+        existentes = {
+            venta.clave_idempotencia: venta
+            for venta in Venta.objects.filter(clave_idempotencia__in={v.clave for v in lote})
+            .only('pk', 'codigo', 'clave_idempotencia')
+        }
+        nuevas = []
+        for entrada in lote:
+            entrada.venta = existentes.get(entrada.clave)
+            entrada.duplicada = entrada.venta is not None
+            if not entrada.duplicada:
+                entrada.venta = Venta(
+                    codigo=generar_codigo(),
+                    cliente_id=entrada.cliente_id,
+                    fecha=entrada.fecha,
+                    clave_idempotencia=entrada.clave,
+                )
+                existentes[entrada.clave] = entrada.venta
+                nuevas.append(entrada)
+        if not nuevas:
+            return lote
+
+        cantidades = defaultdict(int)
+        for entrada in nuevas:
+            for producto_id, cantidad in entrada.lineas:
+                cantidades[producto_id] += cantidad
+        productos = descontar_stock(cantidades)
+
+        items_por_venta = []
+        for entrada in nuevas:
+            items = []
+            for producto_id, cantidad in entrada.lineas:
+                precio = productos[producto_id].precio
+                items.append(ItemVenta(
+                    producto_id=producto_id,
+                    cantidad=cantidad,
+                    precio_unitario=precio,
+                    subtotal=Decimal(cantidad) * precio,
+                ))
+            entrada.venta.total = sum((item.subtotal for item in items), Decimal('0.00'))
+            items_por_venta.append(items)
+
+        # PostgreSQL y SQLite (>= 3.35) devuelven los ids del bulk_create
+        ventas = Venta.objects.bulk_create([entrada.venta for entrada in nuevas])
+        items = []
+        for venta, items_venta in zip(ventas, items_por_venta):
+            for item in items_venta:
+                item.venta = venta
+            items.extend(items_venta)
+        ItemVenta.objects.bulk_create(items)
+        _registrar_efectos(ventas, items, usuario)
+    return lote
+
+
+def descontar_de_resumenes(ventas):
+    """Resta de los resúmenes diarios las ventas indicadas (antes de eliminarlas).
+
+    ``ventas`` es un queryset de ``Venta``; se agrupa en la base por día y
+    cliente/producto, así que el costo no depende de cuántas ventas sean.
+    """
+    filas = (
+        ventas.order_by()
+        .annotate(dia=TruncDate('fecha'))
+        .values('dia', 'cliente_id')
+        .annotate(cantidad=Count('pk'), total=Sum('total'))
+    )
+    acumular(VentaDiaria, ['dia', 'cliente'], [
+        {'dia': f['dia'], 'cliente': f['cliente_id'], 'cantidad': -f['cantidad'], 'total': -f['total']}
+        for f in filas
+    ], ['cantidad', 'total'])
+    items = (
+        ItemVenta.objects.filter(venta__in=ventas)
+        .order_by()
+        .annotate(dia=TruncDate('venta__fecha'))
+        .values('dia', 'producto_id')
+        .annotate(unidades=Sum('cantidad'), total=Sum('subtotal'))
+    )
+    acumular(VentaProductoDiaria, ['dia', 'producto'], [
+        {'dia': f['dia'], 'producto': f['producto_id'], 'unidades': -f['unidades'], 'total': -f['total']}
+        for f in items
+    ], ['unidades', 'total'])
+    invalidar(VENTAS)
@@ -1,3 +1,646 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from unittest import mock
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import close_old_connections, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from clientes.models import Cliente
+from inventario.cache import obtener_o_calcular
+from inventario.pagination import _encode_cursor
+from productos.models import MovimientoStock, Producto
+from productos.services import StockInsuficienteError
+from .filtros import inicio_del_dia
+from .forms import ItemVentaFormSet
+from .management.commands.benchmark import Command as BenchmarkCommand
+from .models import ItemVenta, Venta, VentaDiaria, VentaProductoDiaria
+from .services import registrar_venta
+
+
+class RegistrarVentaTests(TestCase):
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='100')
+        self.p1 = Producto.objects.create(nombre='Yerba', descripcion='1kg', precio=Decimal('10.00'), stock=5)
+        self.p2 = Producto.objects.create(nombre='Azúcar', descripcion='1kg', precio=Decimal('2.50'), stock=3)
+
+    def test_descuenta_stock_y_calcula_total(self):
+        venta = registrar_venta(self.cliente, [(self.p1.pk, 2), (self.p2.pk, 3), (self.p1.pk, 1)])
+        self.p1.refresh_from_db()
+        self.p2.refresh_from_db()
+        self.assertEqual(self.p1.stock, 2)
+        self.assertEqual(self.p2.stock, 0)
+        self.assertEqual(venta.total, Decimal('37.50'))
+        self.assertEqual(venta.items.count(), 3)
+        salidas = MovimientoStock.objects.filter(tipo='salida', motivo=f'Venta {venta.codigo}')
+        self.assertEqual(sorted(salidas.values_list('cantidad', flat=True)), [1, 2, 3])
+
+    def test_stock_insuficiente_no_escribe_nada(self):
+        with self.assertRaises(StockInsuficienteError) as ctx:
+            registrar_venta(self.cliente, [(self.p1.pk, 1), (self.p2.pk, 4)])
+        self.assertEqual([p.pk for p, _ in ctx.exception.faltantes], [self.p2.pk])
+        self.p1.refresh_from_db()
+        self.assertEqual(self.p1.stock, 5)
+        self.assertFalse(Venta.objects.exists())
+
+    def test_descuento_usa_un_solo_update(self):
+        with CaptureQueriesContext(connection) as ctx:
+            registrar_venta(self.cliente, [(self.p1.pk, 1), (self.p2.pk, 1)])
+        updates = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "productos_producto"')]
+        self.assertEqual(len(updates), 1)
+
+    def test_vista_muestra_error_de_stock(self):
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='add_venta'))
+        self.client.force_login(user)
+        response = self.client.post(reverse('ventas:venta_create'), {
+            'cliente': self.cliente.pk,
+            'items-TOTAL_FORMS': '1',
+            'items-INITIAL_FORMS': '0',
+            'items-0-producto': self.p2.pk,
+            'items-0-cantidad': '4',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Stock insuficiente para: Azúcar: 3 disponibles')
+        self.p2.refresh_from_db()
+        self.assertEqual(self.p2.stock, 3)
+
+    def test_producto_que_no_es_un_id(self):
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='add_venta'))
+        self.client.force_login(user)
+        response = self.client.post(reverse('ventas:venta_create'), {
+            'cliente': self.cliente.pk,
+            'items-TOTAL_FORMS': '1',
+            'items-INITIAL_FORMS': '0',
+            'items-0-producto': '²',
+            'items-0-cantidad': '1',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('producto', response.context['formset'].forms[0].errors)
+        self.assertFalse(Venta.objects.exists())
+
+    def test_formset_valida_todas_las_filas_con_una_consulta(self):
+        formset = ItemVentaFormSet({
+            'items-TOTAL_FORMS': '3',
+            'items-INITIAL_FORMS': '0',
+            'items-0-producto': self.p1.pk,
+            'items-0-cantidad': '1',
+            'items-1-producto': self.p2.pk,
+            'items-1-cantidad': '2',
+            'items-2-producto': '999999',
+            'items-2-cantidad': '1',
+        })
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertFalse(formset.is_valid())
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(formset.forms[1].cleaned_data['producto'], self.p2)
+        self.assertIn('producto', formset.forms[2].errors)
+
+    def test_formulario_no_incluye_el_catalogo_y_el_buscador_responde(self):
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='add_venta'))
+        self.client.force_login(user)
+        self.assertNotContains(self.client.get(reverse('ventas:venta_create')), 'Azúcar')
+
+        data = self.client.get(reverse('ventas:buscar_productos'), {'q': 'azucar'}).json()
+        self.assertEqual(data['results'], [{
+            'id': self.p2.pk, 'sku': self.p2.sku, 'nombre': 'Azúcar',
+            'precio': str(self.p2.precio), 'stock': 3,
+        }])
+
+    def test_vendedor_sin_permiso_de_clientes_busca_clientes(self):
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='add_venta'))
+        self.client.force_login(user)
+        self.assertContains(self.client.get(reverse('ventas:venta_create')), reverse('ventas:buscar_clientes'))
+        self.assertEqual(self.client.get(reverse('clientes:cliente_buscar'), {'q': 'x'}).status_code, 302)
+
+        data = self.client.get(reverse('ventas:buscar_clientes'), {'q': self.cliente.documento}).json()
+        self.assertEqual([c['id'] for c in data['results']], [self.cliente.pk])
+
+
+class VentasConcurrentesTests(TransactionTestCase):
+    """Muchas ventas simultáneas sobre el mismo producto no deben sobrevender."""
+
+    hilos = 12
+
+    def test_sin_sobreventa_ni_actualizaciones_perdidas(self):
+        cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='100')
+        otro = Producto.objects.create(nombre='Otro', descripcion='-', precio=Decimal('1.00'), stock=100)
+        producto = Producto.objects.create(nombre='Yerba', descripcion='1kg', precio=Decimal('10.00'), stock=7)
+
+        barrera = threading.Barrier(self.hilos)
+        resultados = []
+        errores = []
+
+        def vender(i):
+            try:
+                barrera.wait()
+                # Mitad de las ventas bloquean los productos en orden inverso
+                # al de la otra mitad, para ejercitar el orden de bloqueo.
+                lineas = [(producto.pk, 1), (otro.pk, 1)] if i % 2 else [(otro.pk, 1), (producto.pk, 1)]
+                registrar_venta(cliente, lineas)
+                resultados.append('ok')
+            except StockInsuficienteError:
+                resultados.append('sin_stock')
+            except Exception as e:  # pragma: no cover - se reporta abajo
+                errores.append(e)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        threads = [threading.Thread(target=vender, args=(i,)) for i in range(self.hilos)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errores, [])
+        producto.refresh_from_db()
+        otro.refresh_from_db()
+        vendidas = resultados.count('ok')
+        self.assertEqual(vendidas, 7)
+        self.assertEqual(producto.stock, 0)
+        self.assertEqual(otro.stock, 100 - vendidas)
+        self.assertEqual(Venta.objects.count(), vendidas)
+        self.assertEqual(ItemVenta.objects.filter(producto=producto).count(), vendidas)
+
+
+class ResumenDiarioTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('vendedor', password='x')
+        self.user.user_permissions.add(Permission.objects.get(codename='view_venta'))
+        self.ana = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='100')
+        self.beto = Cliente.objects.create(nombre='Beto', apellido='Gómez', documento='200')
+        self.producto = Producto.objects.create(nombre='Yerba', descripcion='1kg', precio=Decimal('10.00'), stock=50)
+
+    def test_resumen_se_actualiza_y_alimenta_el_grafico(self):
+        registrar_venta(self.ana, [(self.producto.pk, 2)])
+        registrar_venta(self.ana, [(self.producto.pk, 1)])
+        registrar_venta(self.beto, [(self.producto.pk, 3)])
+        fila = VentaDiaria.objects.get(cliente=self.ana)
+        self.assertEqual((fila.cantidad, fila.total), (2, Decimal('30.00')))
+
+        self.client.force_login(self.user)
+        hoy = timezone.localdate()
+        response = self.client.get(reverse('ventas:ventas_por_dia'))
+        self.assertEqual(response.json(), [{'date': hoy.isoformat(), 'total': 60.0}])
+        response = self.client.get(reverse('ventas:ventas_por_dia'), {'cliente': self.beto.pk})
+        self.assertEqual(response.json(), [{'date': hoy.isoformat(), 'total': 30.0}])
+
+    def test_rebuild_reproduce_el_resumen(self):
+        registrar_venta(self.ana, [(self.producto.pk, 2)])
+        ayer = registrar_venta(self.beto, [(self.producto.pk, 1)])
+        Venta.objects.filter(pk=ayer.pk).update(fecha=ayer.fecha - timedelta(days=1))
+        VentaDiaria.objects.update(total=0)
+        VentaProductoDiaria.objects.all().delete()
+
+        call_command('rebuild_sales_rollup', stdout=StringIO())
+        resumen = sorted(VentaDiaria.objects.values_list('dia', 'cliente_id', 'cantidad', 'total'))
+        hoy = timezone.localdate()
+        self.assertEqual(resumen, [
+            (hoy - timedelta(days=1), self.beto.pk, 1, Decimal('10.00')),
+            (hoy, self.ana.pk, 1, Decimal('20.00')),
+        ])
+        self.assertEqual(
+            sorted(VentaProductoDiaria.objects.values_list('dia', 'unidades')),
+            [(hoy - timedelta(days=1), 1), (hoy, 2)],
+        )
+
+    def test_ranking_por_producto_desde_el_resumen(self):
+        otro = Producto.objects.create(nombre='Azúcar', descripcion='1kg', precio=Decimal('2.00'), stock=50)
+        registrar_venta(self.ana, [(self.producto.pk, 1), (otro.pk, 10)])
+        registrar_venta(self.beto, [(self.producto.pk, 3)])
+        self.assertEqual(
+            sorted(VentaProductoDiaria.objects.values_list('producto_id', 'unidades', 'total')),
+            [(self.producto.pk, 4, Decimal('40.00')), (otro.pk, 10, Decimal('20.00'))],
+        )
+
+        self.client.force_login(self.user)
+        url = reverse('ventas:ventas_por_producto')
+        self.assertEqual(self.client.get(url).json(), [
+            {'product': 'Yerba', 'total': 40.0},
+            {'product': 'Azúcar', 'total': 20.0},
+        ])
+        self.assertEqual(self.client.get(url, {'limite': 1}).json(), [{'product': 'Yerba', 'total': 40.0}])
+        self.assertEqual(self.client.get(url, {'cliente': self.ana.pk}).json(), [
+            {'product': 'Azúcar', 'total': 20.0},
+            {'product': 'Yerba', 'total': 10.0},
+        ])
+
+
+class GraficosCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='view_venta'))
+        self.client.force_login(user)
+        self.ana = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='100')
+        self.producto = Producto.objects.create(nombre='Yerba', descripcion='1kg', precio=Decimal('10.00'), stock=50)
+        registrar_venta(self.ana, [(self.producto.pk, 2)])
+        self.url = reverse('ventas:ventas_por_dia')
+
+    def get(self, params=None, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, params or {}, headers=headers)
+        return response, [q['sql'] for q in ctx.captured_queries if 'ventas_' in q['sql']]
+
+    def test_cache_por_filtros_normalizados_con_etag(self):
+        response, consultas = self.get({'desde': 'no-es-fecha'})
+        self.assertEqual(len(consultas), 1)
+        # Filtro inválido = sin filtro: misma entrada
+        repetida, consultas = self.get()
+        self.assertEqual(consultas, [])
+        self.assertEqual(repetida.content, response.content)
+        repetida, consultas = self.get({'cliente': '²'})
+        self.assertEqual(consultas, [])
+        self.assertEqual(repetida.content, response.content)
+        revalidada, _ = self.get(if_none_match=response['ETag'])
+        self.assertEqual(revalidada.status_code, 304)
+
+        registrar_venta(self.ana, [(self.producto.pk, 1)])
+        nueva, consultas = self.get(if_none_match=response['ETag'])
+        self.assertEqual(nueva.status_code, 200)
+        self.assertEqual(nueva.json()[0]['total'], 30.0)
+
+    def test_un_solo_calculo_para_pedidos_simultaneos(self):
+        # Otro worker tiene el candado y publica el resultado al rato
+        cache.add('clave:calculando', 1)
+        threading.Timer(0.1, cache.set, ['clave', 'calculado por otro']).start()
+        valor = obtener_o_calcular('clave', lambda: self.fail('no debía calcular'))
+        self.assertEqual(valor, 'calculado por otro')
+
+
+class VentaDetalleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='view_venta'))
+        self.client.force_login(user)
+        cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='100')
+        productos = [
+            Producto.objects.create(nombre=f'Producto {i}', descripcion='-', precio=Decimal('1.00'), stock=10)
+            for i in range(5)
+        ]
+        self.venta = registrar_venta(cliente, [(p.pk, 1) for p in productos])
+        self.url = reverse('ventas:venta_detail', args=[self.venta.pk])
+
+    def get(self, **headers):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url, headers=headers)
+        return response, [q['sql'] for q in ctx.captured_queries if 'ventas_' in q['sql']]
+
+    def test_detalle_sin_n_mas_1_y_cacheado(self):
+        response, consultas = self.get()
+        self.assertContains(response, 'Producto 4')
+        # La venta (con cliente) y los items (con productos)
+        self.assertEqual(len(consultas), 2)
+        repetida, consultas = self.get()
+        self.assertEqual(len(consultas), 1)
+        self.assertEqual(repetida.content, response.content)
+
+    def test_revalidacion_responde_304(self):
+        response, _ = self.get()
+        revalidada, consultas = self.get(if_none_match=response['ETag'])
+        self.assertEqual(revalidada.status_code, 304)
+        self.assertEqual(len(consultas), 1)
+        revalidada, _ = self.get(if_modified_since=response['Last-Modified'])
+        self.assertEqual(revalidada.status_code, 304)
+
+    def test_nueva_version_del_codigo_invalida_etag_y_fragmento(self):
+        response, _ = self.get()
+        with mock.patch('ventas.views.version_paginas', return_value=('otra', 2 ** 31)):
+            nueva, consultas = self.get(if_none_match=response['ETag'], if_modified_since=response['Last-Modified'])
+        self.assertEqual(nueva.status_code, 200)
+        self.assertNotEqual(nueva['ETag'], response['ETag'])
+        # El fragmento se vuelve a armar: se leen los items otra vez
+        self.assertEqual(len(consultas), 2)
+
+
+class VentaLoteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user('caja1', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='add_venta'))
+        self.client.force_login(user)
+        self.cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='100')
+        self.p1 = Producto.objects.create(nombre='Yerba', descripcion='1kg', precio=Decimal('10.00'), stock=500)
+        self.p2 = Producto.objects.create(nombre='Azúcar', descripcion='1kg', precio=Decimal('2.50'), stock=500)
+        self.url = reverse('ventas:venta_lote')
+
+    def lote(self, cantidad, desde=0):
+        return {'ventas': [
+            {
+                'clave': f'caja1-{i}',
+                'cliente': self.cliente.pk,
+                'fecha': '2025-03-10T10:00:00',
+                'items': [{'producto': self.p1.pk, 'cantidad': 1}, {'producto': self.p2.pk, 'cantidad': 2}],
+            }
+            for i in range(desde, desde + cantidad)
+        ]}
+
+    def post(self, datos):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(self.url, datos, content_type='application/json')
+        return response, len([q for q in ctx.captured_queries if 'SAVEPOINT' not in q['sql']])
+
+    def test_lote_registra_ventas_y_reintento_no_duplica(self):
+        response, _ = self.post(self.lote(3))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Venta.objects.count(), 3)
+        self.assertEqual(ItemVenta.objects.count(), 6)
+        self.p1.refresh_from_db()
+        self.assertEqual(self.p1.stock, 497)
+        self.assertEqual(VentaDiaria.objects.get().total, Decimal('45.00'))
+        venta = Venta.objects.get(clave_idempotencia='caja1-0')
+        self.assertEqual(venta.total, Decimal('15.00'))
+        self.assertEqual(timezone.localdate(venta.fecha), date(2025, 3, 10))
+
+        # Reintento con una venta nueva: sólo se registra esa
+        reintento, _ = self.post(self.lote(4))
+        self.assertEqual(reintento.status_code, 201)
+        self.assertEqual([v['duplicada'] for v in reintento.json()['ventas']], [True, True, True, False])
+        self.assertEqual(reintento.json()['ventas'][0]['codigo'], response.json()['ventas'][0]['codigo'])
+        self.assertEqual(Venta.objects.count(), 4)
+        self.p1.refresh_from_db()
+        self.assertEqual(self.p1.stock, 496)
+
+    def test_consultas_no_dependen_del_tamano_del_lote(self):
+        _, pocas = self.post(self.lote(2))
+        _, muchas = self.post(self.lote(40, desde=2))
+        self.assertEqual(pocas, muchas)
+        self.assertEqual(Venta.objects.count(), 42)
+
+    def test_stock_insuficiente_rechaza_todo_el_lote(self):
+        datos = self.lote(2)
+        datos['ventas'][1]['items'] = [{'producto': self.p1.pk, 'cantidad': 500}]
+        response, _ = self.post(datos)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['faltantes'], [{'producto': self.p1.pk, 'solicitado': 501, 'disponible': 500}])
+        self.assertFalse(Venta.objects.exists())
+        self.p1.refresh_from_db()
+        self.assertEqual(self.p1.stock, 500)
+
+    def test_lote_mal_formado(self):
+        datos = self.lote(3)
+        datos['ventas'][1]['items'][0]['cantidad'] = 0
+        datos['ventas'][2]['cliente'] = 999
+        response, _ = self.post(datos)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(response.json()['errores']), ['1', '2'])
+        self.assertFalse(Venta.objects.exists())
+
+    def test_producto_inexistente_es_un_error_del_pedido(self):
+        datos = self.lote(2)
+        datos['ventas'][1]['items'][1]['producto'] = 999999
+        response, _ = self.post(datos)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errores'], {'1': ['No existe el producto 999999.']})
+
+
+class ExportarVentasTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='view_venta'))
+        self.client.force_login(user)
+        self.ana = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='AR-100')
+        otro = Cliente.objects.create(nombre='Juan', apellido='Gómez', documento='AR-200')
+        self.producto = Producto.objects.create(nombre='Yerba', sku='YER-1', descripcion='1kg', precio=Decimal('10.00'), stock=50)
+        self.venta = registrar_venta(self.ana, [(self.producto.pk, 2)])
+        registrar_venta(otro, [(self.producto.pk, 1)])
+
+    def test_csv_respeta_los_filtros_del_listado(self):
+        response = self.client.get(reverse('ventas:venta_exportar'), {'cliente': 'AR-100'})
+        self.assertTrue(response.streaming)
+        filas = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode('utf-8-sig'))))
+        self.assertEqual(filas[0][0], 'Código')
+        self.assertEqual([f[0] for f in filas[1:]], [self.venta.codigo])
+        self.assertEqual(filas[1][2:], ['AR-100', 'Pérez', 'Ana', '20.00'])
+
+    def test_items_en_xlsx(self):
+        response = self.client.get(reverse('ventas:item_venta_exportar'), {'cliente': 'AR-100', 'formato': 'xlsx'})
+        self.assertIn('.xlsx', response['Content-Disposition'])
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as libro:
+            self.assertIsNone(libro.testzip())
+            hoja = ElementTree.fromstring(libro.read('xl/worksheets/sheet1.xml'))
+        ns = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+        filas = [
+            [''.join(c.itertext()) for c in fila.iter(f'{ns}c')]
+            for fila in hoja.iter(f'{ns}row')
+        ]
+        self.assertEqual(len(filas), 2)
+        self.assertEqual(filas[1][0], self.venta.codigo)
+        self.assertEqual(filas[1][2:5], ['YER-1', 'Yerba', '2'])
+
+
+class ComprobantesTests(TestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajuste = override_settings(COMPROBANTES_DIR=self.directorio)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        self.cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='100')
+        self.producto = Producto.objects.create(nombre='Yerba', descripcion='1kg', precio=Decimal('10.00'), stock=50)
+
+    def test_pdf_se_genera_una_vez(self):
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='view_venta'))
+        self.client.force_login(user)
+        venta = registrar_venta(self.cliente, [(self.producto.pk, 2)])
+        url = reverse('ventas:venta_comprobante', args=[venta.pk])
+
+        response = self.client.get(url)
+        contenido = b''.join(response.streaming_content)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(contenido.startswith(b'%PDF'))
+        ruta = os.path.join(self.directorio, venta.codigo[:2], f'{venta.codigo}.pdf')
+        self.assertTrue(os.path.exists(ruta))
+
+        # La segunda vez se sirve del disco: sólo se busca la venta
+        with CaptureQueriesContext(connection) as ctx:
+            repetida = self.client.get(url)
+        self.assertEqual(b''.join(repetida.streaming_content), contenido)
+        self.assertEqual(len([q for q in ctx.captured_queries if 'ventas_' in q['sql']]), 1)
+
+    def test_exportar_rango_a_zip(self):
+        dentro = [registrar_venta(self.cliente, [(self.producto.pk, 1)]) for _ in range(3)]
+        fuera = registrar_venta(self.cliente, [(self.producto.pk, 1)])
+        Venta.objects.filter(pk=fuera.pk).update(fecha=timezone.now() - timedelta(days=10))
+        salida = os.path.join(self.directorio, 'lote.zip')
+        hoy = timezone.localdate()
+        call_command(
+            'exportar_comprobantes', desde=hoy, hasta=hoy,
+            salida=salida, procesos=2, lote=2, stdout=StringIO(),
+        )
+        with zipfile.ZipFile(salida) as archivo:
+            self.assertEqual(sorted(archivo.namelist()), sorted(f'{v.codigo}.pdf' for v in dentro))
+            self.assertTrue(archivo.read(f'{dentro[0].codigo}.pdf').startswith(b'%PDF'))
+
+
+class VentaListPaginacionTests(TestCase):
+    def test_orden_por_fecha_descendente_con_desempate(self):
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='view_venta'))
+        cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='100')
+        ahora = timezone.now()
+        for i in range(8):
+            # Pares de ventas con la misma fecha
+            Venta.objects.create(cliente=cliente, fecha=ahora - timedelta(hours=i // 2))
+        esperado = list(Venta.objects.order_by('-fecha', 'id').values_list('pk', flat=True))
+
+        self.client.force_login(user)
+        url = reverse('ventas:venta_list')
+        primera = self.client.get(url).context['page_obj']
+        segunda = self.client.get(url, {'cursor': primera.next_cursor}).context['page_obj']
+        self.assertEqual([v.pk for v in primera] + [v.pk for v in segunda], esperado)
+        self.assertFalse(segunda.has_next())
+        volver = self.client.get(url, {'cursor': segunda.previous_cursor}).context['page_obj']
+        self.assertEqual([v.pk for v in volver], esperado[:5])
+
+        # Un cursor adulterado no es un error: vuelve a la primera página
+        response = self.client.get(url, {'cursor': _encode_cursor('n', ['nope', 1])})
+        self.assertEqual([v.pk for v in response.context['page_obj']], esperado[:5])
+
+    def test_filtro_por_cliente_resuelve_con_una_consulta(self):
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='view_venta'))
+        ana = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='AR-100')
+        gomez = Cliente.objects.create(nombre='Ana', apellido='Gómez', documento='AR-1001')
+        venta = Venta.objects.create(cliente=ana)
+        Venta.objects.create(cliente=gomez)
+        self.client.force_login(user)
+        url = reverse('ventas:venta_list')
+
+        # El documento exacto desempata aunque otro documento empiece igual
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {'cliente': 'AR-100'})
+        self.assertEqual([v.pk for v in response.context['ventas']], [venta.pk])
+        self.assertEqual(sum(q['sql'].endswith('LIMIT 2') for q in ctx.captured_queries), 1)
+
+        response = self.client.get(url, {'cliente': 'perez'})
+        self.assertEqual([v.pk for v in response.context['ventas']], [venta.pk])
+        response = self.client.get(url, {'cliente': 'ana'})
+        self.assertIn('Varios clientes coinciden', response.content.decode())
+        # Parece un número pero no es un id
+        response = self.client.get(url, {'cliente': '²'})
+        self.assertContains(response, 'Cliente no encontrado')
+
+    @override_settings(TIME_ZONE='America/Argentina/Buenos_Aires')
+    def test_filtro_por_fechas_es_un_rango_sobre_la_columna(self):
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='view_venta'))
+        self.client.force_login(user)
+        cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='100')
+        dia = date(2025, 3, 10)
+        # Límites del día en hora local (en UTC caen el día siguiente)
+        ultima = Venta.objects.create(cliente=cliente, fecha=inicio_del_dia(dia) + timedelta(hours=23, minutes=59))
+        Venta.objects.create(cliente=cliente, fecha=inicio_del_dia(dia + timedelta(days=1)))
+        primera = Venta.objects.create(cliente=cliente, fecha=inicio_del_dia(dia))
+        Venta.objects.create(cliente=cliente, fecha=inicio_del_dia(dia) - timedelta(seconds=1))
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('ventas:venta_list'), {'desde': '10/03/2025', 'hasta': '10/03/2025'})
+        self.assertEqual([v.pk for v in response.context['ventas']], [ultima.pk, primera.pk])
+        self.assertFalse(any('cast_date' in q['sql'] for q in ctx.captured_queries))
+
+    def test_pagina_no_crece_con_la_cantidad_de_clientes(self):
+        user = User.objects.create_user('vendedor', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='view_venta'))
+        self.client.force_login(user)
+        url = reverse('ventas:venta_list')
+
+        def medir():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            return len(ctx.captured_queries), response
+
+        for i in range(5):
+            Venta.objects.create(cliente=Cliente.objects.create(nombre='N', apellido=f'A{i}', documento=f'D{i}'))
+        consultas, _ = medir()
+        Cliente.objects.bulk_create([
+            Cliente(nombre='N', apellido=f'B{i}', documento=f'E{i}') for i in range(200)
+        ])
+        Venta.objects.create(cliente=Cliente.objects.get(documento='E0'))
+        despues, response = medir()
+        self.assertEqual(despues, consultas)
+        # Sólo aparecen los clientes de las ventas listadas
+        self.assertNotContains(response, 'E199')
+
+
+class BenchmarkComparacionTests(TestCase):
+    def resultado(self, p50, p95):
+        return {'motor': 'sqlite', 'parametros': {'ventas': 10}, 'casos': {'ventas_por_dia': {'p50_ms': p50, 'p95_ms': p95}}}
+
+    def test_regresion_por_encima_del_umbral(self):
+        comando = BenchmarkCommand(stdout=StringIO())
+        comando.comparar(self.resultado(10, 20), self.resultado(11, 23), umbral=0.2)
+        with self.assertRaisesMessage(CommandError, 'ventas_por_dia'):
+            comando.comparar(self.resultado(10, 20), self.resultado(10, 25), umbral=0.2)
+
+    def test_mide_sin_los_middleware_de_medicion(self):
+        stack = ['inventario.middleware.RendimientoMiddleware', 'inventario.metricas.MetricasMiddleware']
+        with override_settings(MIDDLEWARE=[*stack, *settings.MIDDLEWARE]):
+            middleware = BenchmarkCommand().middleware()
+        self.assertFalse(set(stack) & set(middleware))
+        self.assertIn('django.contrib.sessions.middleware.SessionMiddleware', middleware)
+
+
+class CompletarHistorialTests(TestCase):
+    """Migración 0006: salidas de las ventas anteriores a registrarlas."""
+
+    def test_agrega_las_salidas_y_no_toca_lo_demas(self):
+        from importlib import import_module
+        from django.apps import apps
+        from productos.services import saldos_por_producto
+
+        migracion = import_module('ventas.migrations.0006_historial_movimientos')
+        cliente = Cliente.objects.create(nombre='Ana', apellido='Pérez', documento='100')
+        # Stock inicial 10, ajuste a 6 (guardado como 4), tres ventas de 1 sin movimiento
+        yerba = Producto.objects.create(nombre='Yerba', descripcion='1kg', precio=Decimal('10.00'), stock=3)
+        MovimientoStock.objects.create(producto=yerba, tipo='entrada', cantidad=10, usuario='x')
+        ajuste = MovimientoStock.objects.create(producto=yerba, tipo='ajuste', cantidad=4, usuario='x')
+        ventas = [Venta.objects.create(cliente=cliente) for _ in range(3)]
+        for venta in ventas:
+            ItemVenta.objects.create(venta=venta, producto=yerba, cantidad=1, precio_unitario=10, subtotal=10)
+        # Una venta que ya tiene su salida no se duplica
+        MovimientoStock.objects.create(
+            producto=yerba, tipo='salida', cantidad=1, motivo=f'Venta {ventas[1].codigo}', usuario='x',
+        )
+
+        with mock.patch.object(migracion, 'LOTE', 2):
+            migracion.completar_historial(apps, None)
+
+        self.assertEqual(
+            sorted(MovimientoStock.objects.filter(tipo='salida').values_list('motivo', flat=True)),
+            sorted(f'Venta {venta.codigo}' for venta in ventas),
+        )
+        # El ajuste viejo queda como estaba y la diferencia la informa reconcile_stock
+        ajuste.refresh_from_db()
+        self.assertEqual(ajuste.cantidad, 4)
+        self.assertEqual(MovimientoStock.objects.count(), 5)
+        self.assertEqual(dict(saldos_por_producto()), {yerba.pk: 11})
+        salida = StringIO()
+        call_command('reconcile_stock', stdout=salida)
+        self.assertIn(f'#{yerba.pk} Yerba: stock=3 movimientos=11', salida.getvalue())
+
+        # Una segunda pasada no duplica las salidas
+        migracion.completar_historial(apps, None)
+        self.assertEqual(MovimientoStock.objects.filter(tipo='salida').count(), 3)
@@ -5,8 +5,14 @@ app_name = 'ventas'
 
 urlpatterns = [
     path('', views.VentaListView.as_view(), name='venta_list'),
+    path('exportar/', views.VentaExportarView.as_view(), name='venta_exportar'),
+    path('items/exportar/', views.ItemVentaExportarView.as_view(), name='item_venta_exportar'),
     path('por-dia/', views.VentasPorDiaJSONView.as_view(), name='ventas_por_dia'),
     path('por-producto/', views.VentasPorProductoJSONView.as_view(), name='ventas_por_producto'),
+    path('productos/buscar/', views.ProductoBuscarJSONView.as_view(), name='buscar_productos'),
+    path('clientes/buscar/', views.ClienteBuscarJSONView.as_view(), name='buscar_clientes'),
     path('nueva/', views.VentaCreateView.as_view(), name='venta_create'),
+    path('lote/', views.VentaLoteView.as_view(), name='venta_lote'),
     path('<int:pk>/', views.VentaDetailView.as_view(), name='venta_detail'),
+    path('<int:pk>/comprobante.pdf', views.VentaComprobanteView.as_view(), name='venta_comprobante'),
 ]
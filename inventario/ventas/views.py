@@ -1,27 +1,38 @@
-from decimal import Decimal
-
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
 from django.views import View
 from django.views.generic import ListView, DetailView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from inventario.mixins import FriendlyPermissionRequiredMixin
-from django.db import transaction
-from django.db.models import Q, Sum
+from inventario.cache import clave_versionada, respuesta_json_cacheada
+from inventario.exportar import EXPORTAR_LOTE, respuesta_exportacion
+from inventario.pagination import KeysetPaginationMixin
+from inventario.version import version_paginas
+from django.db.models import Sum
 from django.contrib import messages
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 
-from .models import Venta, ItemVenta
+from .models import Venta, ItemVenta, VentaDiaria, VentaProductoDiaria
 from productos.models import Producto
+from productos.search import ORDEN_BUSQUEDA as ORDEN_BUSQUEDA_PRODUCTOS, buscar_productos
+from productos.services import StockInsuficienteError
+from .comprobantes import obtener_comprobante
+from .filtros import rango_de_dias
 from .forms import VentaForm, ItemVentaFormSet
+from .services import VENTAS, registrar_venta
+from clientes.search import ORDEN_BUSQUEDA as ORDEN_BUSQUEDA_CLIENTES, buscar_clientes
+from clientes.views import ClienteBuscarView
 from django.shortcuts import get_object_or_404
 
 
-class VentaListView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, ListView):
+class VentaListView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, KeysetPaginationMixin, ListView):
     permission_required = 'ventas.view_venta'
     model = Venta
     template_name = 'ventas/venta_list.html'
     context_object_name = 'ventas'
     paginate_by = 5
+    keyset_ordering = ('-fecha', 'id')
 
     def get_queryset(self):
         """Filter by date range (dd/mm/yyyy) and by cliente id from GET params.
@@ -31,7 +42,7 @@ class VentaListView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, ListVie
         - hasta: end date in dd/mm/YYYY
         - cliente: Cliente id
         """
-        qs = super().get_queryset()
+        qs = super().get_queryset().select_related('cliente')
         desde = self.request.GET.get('desde')
         hasta = self.request.GET.get('hasta')
         cliente = self.request.GET.get('cliente')
@@ -46,8 +57,8 @@ class VentaListView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, ListVie
             import re
 
             cid = None
-            # plain numeric id
-            if cliente.isdigit():
+            # plain numeric id (isdigit() alone also accepts '²', which int() rejects)
+            if cliente.isascii() and cliente.isdigit():
                 cid = int(cliente)
             else:
                 m = re.match(r"^(\d+)\s*-\s*", cliente)
@@ -60,13 +71,16 @@ class VentaListView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, ListVie
             if cid:
                 qs = qs.filter(cliente_id=cid)
             else:
-                # try to find matching clients by name/apellido/documento
-                candidates = ClienteModel.objects.filter(
-                    Q(nombre__icontains=cliente) | Q(apellido__icontains=cliente) | Q(documento__icontains=cliente)
+                # Una sola consulta indexada: alcanza con saber si hay 0, 1 o más
+                candidatos = list(
+                    buscar_clientes(ClienteModel.objects.all(), cliente)
+                    .order_by(*ORDEN_BUSQUEDA_CLIENTES)
+                    .values_list('pk', 'prioridad')[:2]
                 )
-                if candidates.count() == 1:
-                    qs = qs.filter(cliente_id=candidates.first().pk)
-                elif candidates.count() == 0:
+                # Un documento exacto (único) gana aunque también coincidan otros nombres
+                if len(candidatos) == 1 or (candidatos and candidatos[0][1] == 0):
+                    qs = qs.filter(cliente_id=candidatos[0][0])
+                elif not candidatos:
                     messages.error(self.request, 'Cliente no encontrado')
                 else:
                     messages.error(self.request, 'Varios clientes coinciden; seleccione el correcto de la lista')
@@ -75,14 +89,14 @@ class VentaListView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, ListVie
         if desde:
             try:
                 d = datetime.strptime(desde, '%d/%m/%Y').date()
-                qs = qs.filter(fecha__date__gte=d)
+                qs = qs.filter(rango_de_dias(desde=d))
             except ValueError:
                 messages.error(self.request, 'Formato de fecha "desde" inválido. Use dd/mm/aaaa')
 
         if hasta:
             try:
                 h = datetime.strptime(hasta, '%d/%m/%Y').date()
-                qs = qs.filter(fecha__date__lte=h)
+                qs = qs.filter(rango_de_dias(hasta=h))
             except ValueError:
                 messages.error(self.request, 'Formato de fecha "hasta" inválido. Use dd/mm/aaaa')
 
@@ -90,114 +104,163 @@ class VentaListView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, ListVie
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # provide clients for the filter select and current filter values
-        from clientes.models import Cliente
-
-        context['clientes'] = Cliente.objects.all()
+        # Los clientes del filtro se piden a clientes:cliente_buscar desde la plantilla
         context['filter_desde'] = self.request.GET.get('desde', '')
         context['filter_hasta'] = self.request.GET.get('hasta', '')
         context['filter_cliente'] = self.request.GET.get('cliente', '')
-        params = self.request.GET.copy()
-        if 'page' in params:
-            params.pop('page')
-        context['querystring'] = params.urlencode()
         return context
 
 
-class VentasPorDiaJSONView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, View):
-    """Return JSON with sales totals grouped by day for the chart.
+class VentaExportarView(VentaListView):
+    """Exporta las ventas del listado (mismos filtros) a CSV o XLSX.
 
-    Response format: [{"date": "YYYY-MM-DD", "total": 123.45}, ...]
+    GET: los filtros de ``VentaListView`` más ``formato`` (csv por defecto o
+    xlsx). Se transmite por lotes sin instanciar modelos (ver
+    ``inventario.exportar``).
     """
-    permission_required = 'ventas.view_venta'
+    nombre_archivo = 'ventas'
+    columnas = ['Código', 'Fecha', 'Documento', 'Apellido', 'Nombre', 'Total']
+
+    def get_filas(self, ventas):
+        return (
+            ventas.order_by(*self.keyset_ordering)
+            .values_list('codigo', 'fecha', 'cliente__documento', 'cliente__apellido', 'cliente__nombre', 'total')
+            .iterator(chunk_size=EXPORTAR_LOTE)
+        )
 
     def get(self, request, *args, **kwargs):
-        from django.http import JsonResponse
-        from django.db.models import DateField, DateTimeField
-        from django.db.models.functions import TruncDate
+        filas = self.get_filas(self.get_queryset())
+        return respuesta_exportacion(request, self.nombre_archivo, self.columnas, filas)
+
+
+class ItemVentaExportarView(VentaExportarView):
+    """Exporta los items de las ventas del listado (mismos filtros)."""
+    nombre_archivo = 'ventas-items'
+    columnas = ['Venta', 'Fecha', 'SKU', 'Producto', 'Cantidad', 'Precio unitario', 'Subtotal']
+
+    def get_filas(self, ventas):
+        return (
+            ItemVenta.objects.filter(venta__in=ventas.order_by().values('pk'))
+            .order_by('venta_id', 'id')
+            .values_list(
+                'venta__codigo', 'venta__fecha', 'producto__sku', 'producto__nombre',
+                'cantidad', 'precio_unitario', 'subtotal',
+            )
+            .iterator(chunk_size=EXPORTAR_LOTE)
+        )
 
-        qs = Venta.objects.all()
 
-        # Apply same filters as list view if present
-        desde = request.GET.get('desde')
-        hasta = request.GET.get('hasta')
-        cliente = request.GET.get('cliente')
+class GraficoVentasMixin:
+    """Filtros normalizados y caché compartida para los JSON de los gráficos.
 
+    ``desde``/``hasta`` (dd/mm/YYYY) y ``cliente`` (id) se normalizan antes de
+    armar la clave, así variantes equivalentes de la URL comparten entrada.
+    Las entradas se invalidan cuando se confirma una venta (grupo ``VENTAS``);
+    ver ``inventario.cache.respuesta_json_cacheada`` para ETag y single-flight.
+    """
+
+    def get_filtros(self):
         from datetime import datetime
-        if cliente:
-            if cliente.isdigit():
-                qs = qs.filter(cliente_id=int(cliente))
 
+        filtros = {'desde': None, 'hasta': None, 'cliente': None}
+        for campo in ('desde', 'hasta'):
+            valor = self.request.GET.get(campo)
+            if valor:
+                try:
+                    filtros[campo] = datetime.strptime(valor, '%d/%m/%Y').date()
+                except ValueError:
+                    pass
+        cliente = self.request.GET.get('cliente', '')
+        # isdigit() también acepta dígitos como '²', que int() rechaza
+        if cliente.isascii() and cliente.isdigit():
+            filtros['cliente'] = int(cliente)
+        return filtros
+
+    def get(self, request, *args, **kwargs):
+        filtros = self.get_filtros()
+        clave = clave_versionada(VENTAS, type(self).__name__, sorted(filtros.items()))
+        return respuesta_json_cacheada(request, clave, lambda: self.calcular(**filtros))
+
+
+class VentasPorDiaJSONView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, GraficoVentasMixin, View):
+    """Return JSON with sales totals grouped by day for the chart.
+
+    Reads the ``VentaDiaria`` rollup (one row per day and client) instead of
+    aggregating the whole ``Venta`` table on every request.
+
+    Response format: [{"date": "YYYY-MM-DD", "total": 123.45}, ...]
+    """
+    permission_required = 'ventas.view_venta'
+
+    def calcular(self, desde, hasta, cliente):
+        qs = VentaDiaria.objects.all()
+
+        # Apply same filters as list view if present
+        if cliente:
+            qs = qs.filter(cliente_id=cliente)
         if desde:
-            try:
-                d = datetime.strptime(desde, '%d/%m/%Y').date()
-                qs = qs.filter(fecha__date__gte=d)
-            except ValueError:
-                pass
+            qs = qs.filter(dia__gte=desde)
         if hasta:
-            try:
-                h = datetime.strptime(hasta, '%d/%m/%Y').date()
-                qs = qs.filter(fecha__date__lte=h)
-            except ValueError:
-                pass
+            qs = qs.filter(dia__lte=hasta)
 
         data = (
-            qs.annotate(day=TruncDate('fecha'))
-            .values('day')
-            .order_by('day')
+            qs.values('dia')
+            .order_by('dia')
             .annotate(total=Sum('total'))
         )
 
         # Build response list
         out = []
         for row in data:
-            day = row['day']
+            day = row['dia']
             total = row['total'] or 0
             out.append({'date': day.isoformat(), 'total': float(total)})
+        return out
+
 
-        return JsonResponse(out, safe=False)
+class VentasPorProductoJSONView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, GraficoVentasMixin, View):
+    """Return JSON with the top-N products by sales total.
 
+    Date ranges are served from the ``VentaProductoDiaria`` rollup, so the
+    cost depends on the number of days and products, not on ``ItemVenta``.
+    The rollup has no client dimension: when filtering by cliente the totals
+    come from that client's items.
 
-class VentasPorProductoJSONView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, View):
-    """Return JSON with sales totals grouped by product.
+    GET params: desde, hasta (dd/mm/YYYY), cliente (id), limite (default 10, max 100).
 
     Response format: [{"product": "Nombre producto", "total": 123.45}, ...]
     """
     permission_required = 'ventas.view_venta'
-
-    def get(self, request, *args, **kwargs):
-        from django.http import JsonResponse
-        from django.db.models import Sum
-
-        qs = ItemVenta.objects.select_related('producto').all()
-
-        # Apply optional filters from the list view (fecha range, cliente)
-        desde = request.GET.get('desde')
-        hasta = request.GET.get('hasta')
-        cliente = request.GET.get('cliente')
-
-        from datetime import datetime
+    limite_por_defecto = 10
+    limite_maximo = 100
+
+    def get_filtros(self):
+        filtros = super().get_filtros()
+        try:
+            limite = int(self.request.GET.get('limite', self.limite_por_defecto))
+        except ValueError:
+            limite = self.limite_por_defecto
+        filtros['limite'] = max(1, min(limite, self.limite_maximo))
+        return filtros
+
+    def calcular(self, desde, hasta, cliente, limite):
         if cliente:
-            if cliente.isdigit():
-                qs = qs.filter(venta__cliente_id=int(cliente))
-
-        if desde:
-            try:
-                d = datetime.strptime(desde, '%d/%m/%Y').date()
-                qs = qs.filter(venta__fecha__date__gte=d)
-            except ValueError:
-                pass
-        if hasta:
-            try:
-                h = datetime.strptime(hasta, '%d/%m/%Y').date()
-                qs = qs.filter(venta__fecha__date__lte=h)
-            except ValueError:
-                pass
+            qs = ItemVenta.objects.filter(
+                rango_de_dias(desde, hasta, campo='venta__fecha'), venta__cliente_id=cliente,
+            )
+            total = Sum('subtotal')
+        else:
+            qs = VentaProductoDiaria.objects.all()
+            if desde:
+                qs = qs.filter(dia__gte=desde)
+            if hasta:
+                qs = qs.filter(dia__lte=hasta)
+            total = Sum('total')
 
         data = (
             qs.values('producto__id', 'producto__nombre')
-            .annotate(total=Sum('subtotal'))
-            .order_by('-total')
+            .annotate(total=total)
+            .order_by('-total', 'producto__id')[:limite]
         )
 
         out = []
@@ -205,15 +268,114 @@ class VentasPorProductoJSONView(LoginRequiredMixin, FriendlyPermissionRequiredMi
             name = row.get('producto__nombre') or '—'
             total = row.get('total') or 0
             out.append({'product': name, 'total': float(total)})
-
-        return JsonResponse(out, safe=False)
+        return out
 
 
 class VentaDetailView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, DetailView):
+    """Detalle de una venta.
+
+    Una venta no cambia después de confirmarse, así que el cuerpo de la
+    página se cachea por ``codigo`` y la respuesta lleva ETag/Last-Modified:
+    una revisita es una consulta y un 304. La clave del fragmento y el ETag
+    incluyen la versión del código (``inventario.version``) para que un
+    cambio de plantilla se vea también en las ventas ya cacheadas. En un
+    miss los items se leen con sus productos en una sola consulta.
+    """
     permission_required = 'ventas.view_venta'
     model = Venta
     template_name = 'ventas/venta_detail.html'
     context_object_name = 'venta'
+    cache_detalle_segundos = 7 * 24 * 3600
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('cliente')
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        version, desplegado = version_paginas()
+        # La página incluye el menú del usuario: el ETag también depende de él
+        etag = f'"{self.object.codigo}-{request.user.pk}-{version}"'
+        last_modified = max(int(self.object.fecha.timestamp()), desplegado)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = self.render_to_response(self.get_context_data(object=self.object))
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Queryset perezoso: sólo se evalúa si el fragmento no está en caché
+        context['items'] = self.object.items.select_related('producto').order_by('pk')
+        context['version_paginas'] = version_paginas()[0]
+        context['cache_detalle_segundos'] = self.cache_detalle_segundos
+        return context
+
+
+class VentaComprobanteView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, DetailView):
+    """Comprobante PDF de la venta (ver ``ventas.comprobantes``).
+
+    Se genera la primera vez que se pide y después se sirve desde disco.
+    """
+    permission_required = 'ventas.view_venta'
+    model = Venta
+
+    def get_queryset(self):
+        return super().get_queryset().only('pk', 'codigo')
+
+    def get(self, request, *args, **kwargs):
+        from django.http import FileResponse
+
+        venta = self.get_object()
+        ruta = obtener_comprobante(venta)
+        response = FileResponse(open(ruta, 'rb'), content_type='application/pdf', filename=f'venta-{venta.codigo}.pdf')
+        response['Cache-Control'] = 'private, max-age=86400'
+        return response
+
+
+class ProductoBuscarJSONView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, View):
+    """Buscador de productos para el formulario de venta.
+
+    GET ``q`` (nombre, SKU o id) y ``limite`` (por defecto 10, máximo 50).
+    Usa el mismo índice de búsqueda que el listado de productos.
+
+    Response format: {"results": [{"id", "sku", "nombre", "precio", "stock"}, ...]}
+    """
+    permission_required = 'ventas.add_venta'
+    limite_por_defecto = 10
+    limite_maximo = 50
+
+    def get(self, request, *args, **kwargs):
+        from django.http import JsonResponse
+
+        q = request.GET.get('q', '').strip()
+        try:
+            limite = int(request.GET.get('limite', self.limite_por_defecto))
+        except ValueError:
+            limite = self.limite_por_defecto
+        limite = max(1, min(limite, self.limite_maximo))
+
+        if not q:
+            return JsonResponse({'results': []})
+        productos = (
+            buscar_productos(Producto.objects.only('pk', 'sku', 'nombre', 'precio', 'stock'), q)
+            .order_by(*ORDEN_BUSQUEDA_PRODUCTOS)[:limite]
+        )
+        return JsonResponse({'results': [
+            {'id': p.pk, 'sku': p.sku, 'nombre': p.nombre, 'precio': str(p.precio), 'stock': p.stock}
+            for p in productos
+        ]})
+
+
+class ClienteBuscarJSONView(ClienteBuscarView):
+    """Buscador de clientes para el formulario de venta.
+
+    El mismo autocompletado que ``clientes:cliente_buscar`` pero con el
+    permiso de crear ventas: quien puede vender tiene que poder elegir el
+    cliente aunque no pueda ver el listado de clientes.
+    """
+    permission_required = 'ventas.add_venta'
 
 
 class VentaCreateView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, View):
@@ -229,62 +391,175 @@ class VentaCreateView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, View)
         venta_form = VentaForm(request.POST)
         formset = ItemVentaFormSet(request.POST)
         if venta_form.is_valid() and formset.is_valid():
-            # Validate stock availability before performing any writes
+            # Basic per-row validation before touching the database
             invalid = False
-            shortages = []
+            lineas = []
+            item_forms = []
             for item_form in formset:
                 if item_form.cleaned_data and not item_form.cleaned_data.get('DELETE', False):
                     producto = item_form.cleaned_data.get('producto')
                     cantidad = item_form.cleaned_data.get('cantidad')
-                    # basic validation
                     if cantidad is None or cantidad <= 0:
                         item_form.add_error('cantidad', 'La cantidad debe ser mayor que 0.')
                         invalid = True
                     elif producto is None:
                         item_form.add_error('producto', 'Seleccione un producto válido.')
                         invalid = True
-                    elif cantidad > producto.stock:
-                        item_form.add_error('cantidad', f'Sólo hay {producto.stock} unidades disponibles de {producto.nombre}.')
-                        shortages.append(f"{producto.nombre}: {producto.stock} disponibles")
-                        invalid = True
+                    else:
+                        lineas.append((producto.pk, cantidad))
+                        item_forms.append(item_form)
 
             if invalid:
-                # Add a friendly alert message if there are shortages
-                if shortages:
-                    messages.error(request, 'Stock insuficiente para: ' + '; '.join(shortages))
-                # re-render with errors
                 return render(request, self.template_name, {'venta_form': venta_form, 'formset': formset})
 
-            with transaction.atomic():
-                venta = venta_form.save(commit=False)
-                venta.total = Decimal('0.00')
-                venta.save()
+            # Stock is checked and decremented atomically in the database;
+            # the availability read here is the one taken under lock.
+            try:
+                venta = registrar_venta(
+                    venta_form.cleaned_data['cliente'],
+                    lineas,
+                    usuario=request.user.username if request.user.is_authenticated else 'Sistema',
+                )
+            except StockInsuficienteError as e:
+                disponibles = {p.pk: p for p, _ in e.faltantes}
+                for item_form, (producto_id, _) in zip(item_forms, lineas):
+                    if producto_id in disponibles:
+                        p = disponibles[producto_id]
+                        item_form.add_error('cantidad', f'Sólo hay {p.stock} unidades disponibles de {p.nombre}.')
+                messages.error(request, 'Stock insuficiente para: ' + '; '.join(
+                    f"{p.nombre}: {p.stock} disponibles" for p, _ in e.faltantes
+                ))
+                return render(request, self.template_name, {'venta_form': venta_form, 'formset': formset})
+
+            return redirect('ventas:venta_detail', pk=venta.pk)
+
+        # invalid - re-render with forms (no frontend price JS required)
+        return render(request, self.template_name, {'venta_form': venta_form, 'formset': formset})
 
-                total = Decimal('0.00')
-                for item_form in formset:
-                    if item_form.cleaned_data and not item_form.cleaned_data.get('DELETE', False):
-                        producto = item_form.cleaned_data['producto']
-                        cantidad = item_form.cleaned_data['cantidad']
-                        # precio_unitario is taken from the Producto model to avoid client edits
-                        precio = producto.precio
-                        subtotal = (Decimal(cantidad) * Decimal(precio))
 
-                        item = item_form.save(commit=False)
-                        item.venta = venta
-                        item.precio_unitario = precio
-                        item.subtotal = subtotal
-                        item.save()
+class VentaLoteView(LoginRequiredMixin, FriendlyPermissionRequiredMixin, View):
+    """Alta de ventas en lote para terminales POS (p. ej. al sincronizar
+    después de un corte).
 
-                        # decrement stock (safe because we validated availability)
-                        producto.stock = producto.stock - cantidad
-                        producto.save()
+    POST JSON::
 
-                        total += subtotal
+        {"ventas": [{"clave": "caja1-000123", "cliente": 7,
+                     "fecha": "2025-03-10T18:20:00-03:00",
+                     "items": [{"producto": 5, "cantidad": 2}, ...]}, ...]}
 
-                venta.total = total
-                venta.save()
+    ``clave`` (hasta 64 caracteres) identifica la venta en la terminal:
+    reenviar el mismo lote no duplica ventas. ``fecha`` es opcional (ISO
+    8601; por defecto, ahora). La sesión debe tener el permiso
+    ``ventas.add_venta`` y el pedido, el token CSRF (header ``X-CSRFToken``).
 
-                return redirect('ventas:venta_detail', pk=venta.pk)
+    Respuestas:
+    - 201/200: {"ventas": [{"clave", "id", "codigo", "duplicada"}, ...]}
+      (201 si se registró al menos una venta nueva).
+    - 400: {"errores": {"<índice>": ["..."]}} si el lote está mal formado;
+      no se registra nada.
+    - 409: {"error", "faltantes": [{"producto", "solicitado", "disponible"}]}
+      si no alcanza el stock; no se registra nada.
+    """
+    permission_required = 'ventas.add_venta'
+    maximo_por_lote = 5000
 
-        # invalid - re-render with forms (no frontend price JS required)
-        return render(request, self.template_name, {'venta_form': venta_form, 'formset': formset})
+    def leer_lote(self, datos):
+        """Valida el JSON y devuelve ``(lote, errores)``."""
+        from django.utils.dateparse import parse_datetime
+        from django.utils import timezone
+        from clientes.models import Cliente
+        from .services import VentaLote
+
+        ventas = datos.get('ventas') if isinstance(datos, dict) else None
+        if not isinstance(ventas, list) or not ventas:
+            return [], {'ventas': ['Se espera una lista "ventas" no vacía.']}
+        if len(ventas) > self.maximo_por_lote:
+            return [], {'ventas': [f'Máximo {self.maximo_por_lote} ventas por lote.']}
+
+        lote, indices, errores = [], [], {}
+        for indice, venta in enumerate(ventas):
+            problemas = []
+            if not isinstance(venta, dict):
+                errores[str(indice)] = ['Cada venta debe ser un objeto.']
+                continue
+            clave = venta.get('clave')
+            if not isinstance(clave, str) or not 0 < len(clave) <= 64:
+                problemas.append('"clave" es obligatoria (texto de hasta 64 caracteres).')
+            cliente = venta.get('cliente')
+            if not isinstance(cliente, int) or isinstance(cliente, bool):
+                problemas.append('"cliente" debe ser el id del cliente.')
+            fecha = None
+            if venta.get('fecha') is not None:
+                try:
+                    fecha = parse_datetime(str(venta['fecha']))
+                except ValueError:
+                    fecha = None
+                if fecha is None:
+                    problemas.append('"fecha" debe tener formato ISO 8601.')
+                elif timezone.is_naive(fecha):
+                    fecha = timezone.make_aware(fecha)
+            lineas = []
+            items = venta.get('items')
+            if not isinstance(items, list) or not items:
+                problemas.append('"items" debe ser una lista no vacía.')
+            else:
+                for item in items:
+                    producto = item.get('producto') if isinstance(item, dict) else None
+                    cantidad = item.get('cantidad') if isinstance(item, dict) else None
+                    if (not isinstance(producto, int) or not isinstance(cantidad, int)
+                            or isinstance(cantidad, bool) or cantidad <= 0):
+                        problemas.append('Cada item necesita "producto" (id) y "cantidad" mayor que 0.')
+                        break
+                    lineas.append((producto, cantidad))
+            if problemas:
+                errores[str(indice)] = problemas
+            else:
+                lote.append(VentaLote(clave, cliente, lineas, fecha))
+                indices.append(indice)
+
+        # Todos los clientes y todos los productos del lote en una consulta
+        # cada uno. Un producto inexistente es un error del pedido (400), no
+        # falta de stock (409): la terminal no debe reintentarlo.
+        existentes = set(
+            Cliente.objects.filter(pk__in={v.cliente_id for v in lote}).values_list('pk', flat=True)
+        )
+        productos = Producto.objects.only('pk').in_bulk({p for v in lote for p, _ in v.lineas})
+        for indice, venta in zip(indices, lote):
+            problemas = []
+            if venta.cliente_id not in existentes:
+                problemas.append(f'No existe el cliente {venta.cliente_id}.')
+            faltantes = sorted({p for p, _ in venta.lineas if p not in productos})
+            if faltantes:
+                problemas.append(f'No existe el producto {", ".join(map(str, faltantes))}.')
+            if problemas:
+                errores[str(indice)] = problemas
+        return lote, errores
+
+    def post(self, request, *args, **kwargs):
+        import json
+        from django.http import JsonResponse
+        from .services import registrar_lote
+
+        try:
+            datos = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'errores': {'ventas': ['JSON inválido.']}}, status=400)
+        lote, errores = self.leer_lote(datos)
+        if errores:
+            return JsonResponse({'errores': errores}, status=400)
+
+        try:
+            registrar_lote(lote, usuario=request.user.username)
+        except StockInsuficienteError as e:
+            return JsonResponse({
+                'error': str(e),
+                'faltantes': [
+                    {'producto': p.pk, 'solicitado': solicitado, 'disponible': p.stock}
+                    for p, solicitado in e.faltantes
+                ],
+            }, status=409)
+
+        return JsonResponse({'ventas': [
+            {'clave': v.clave, 'id': v.venta.pk, 'codigo': v.venta.codigo, 'duplicada': v.duplicada}
+            for v in lote
+        ]}, status=201 if any(not v.duplicada for v in lote) else 200)